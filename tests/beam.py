@@ -0,0 +1,111 @@
+import os
+import multiprocessing
+import tempfile
+import numpy as np
+import zgoubidoo
+from zgoubidoo.commands import Beam, Marker
+from zgoubidoo.input import ZGOUBI_IMAX
+
+_ = zgoubidoo.ureg
+
+kinematics = zgoubidoo.Kinematics(230 * _.MeV)
+
+# The slices of a beam are balanced against the number of parallel Zgoubi runs
+beam = Beam('BUNCH', kinematics=kinematics).from_twiss_parameters(2 * ZGOUBI_IMAX + 1,
+                                                                  seed=1,
+                                                                  lazy=True,
+                                                                  BETAX=1.0, BETAY=1.0,
+                                                                  EMITX=1e-6, EMITY=1e-6,
+                                                                  )
+assert beam.slices == -(-3 // multiprocessing.cpu_count()) * multiprocessing.cpu_count()
+n_procs = multiprocessing.cpu_count() + 2
+zi = zgoubidoo.Input('BEAM', line=[beam, Marker('END')])
+zgoubidoo.Zgoubi(n_procs=n_procs)(zi)
+assert len(zi.paths) == n_procs
+assert beam.workers is None
+zi.cleanup()
+beam.workers = 2
+assert beam.slices == 4
+
+# Seeded lazy distributions do not depend on the number of slices (nor on the number of workers)
+distributions = []
+for workers, slices in ((1, None), (3, None), (None, 7)):
+    b = Beam('BUNCH', kinematics=kinematics, workers=workers, slices=slices)
+    b.from_twiss_parameters(2 * ZGOUBI_IMAX + 1, seed=42, lazy=True, BETAX=1.0, BETAY=1.0, EMITX=1e-6, EMITY=1e-6)
+    particles = []
+    for i in range(b.slices):
+        b.SLICE = i
+        particles.append(b.active_slice.values)
+    assert (b.distribution.values == np.concatenate(particles)).all()
+    distributions.append(b.distribution.values)
+assert len(distributions[0]) == 2 * ZGOUBI_IMAX + 1
+assert all((d == distributions[0]).all() for d in distributions[1:])
+
+# Memory-mapped .npy distributions, the slices are views on the mapped array
+with tempfile.TemporaryDirectory() as path:
+    particles = np.arange(50.0).reshape(10, 5)
+    np.save(os.path.join(path, 'beam.npy'), particles)
+    beam = Beam('BUNCH', kinematics=kinematics, slices=3).from_file('beam.npy', path=path)
+    assert isinstance(beam._distribution, np.memmap)
+    for i in range(beam.slices):
+        beam.SLICE = i
+        assert np.shares_memory(beam.active_slice.values, beam._distribution)
+        assert (beam.active_slice.values == particles[beam.offsets[i]:beam.offsets[i + 1]]).all()
+        assert list(beam.active_slice.columns) == ['Y', 'T', 'Z', 'P', 'D']
+    assert (Beam.generate_from_file('beam.npy', path=path, n=4) == particles[:4]).all()
+    del beam
+
+    # Arrow distributions are converted slice by slice (pyarrow is optional)
+    try:
+        import pyarrow
+    except ModuleNotFoundError:
+        pyarrow = None
+    if pyarrow is None:
+        try:
+            Beam.generate_from_file('beam.arrow', path=path)
+            assert False
+        except zgoubidoo.commands.beam.ZgoubidooBeamException:
+            pass
+    else:
+        table = pyarrow.table({c: particles[:, i] for i, c in enumerate(('Y', 'T', 'Z', 'P', 'D'))})
+        with pyarrow.OSFile(os.path.join(path, 'beam.arrow'), 'wb') as sink:
+            with pyarrow.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        beam = Beam('BUNCH', kinematics=kinematics, slices=3).from_file('beam.arrow', path=path)
+        for i in range(beam.slices):
+            beam.SLICE = i
+            assert (beam.active_slice.values == particles[beam.offsets[i]:beam.offsets[i + 1]]).all()
+        assert len(Beam.generate_from_file('beam.arrow', path=path, n=4)) == 4
+        del beam
+
+
+def invariants(coordinates, BETAX=1.0, ALPHAX=0.0, BETAY=1.0, ALPHAY=0.0, EMITX=1.0, EMITY=1.0, **kwargs):
+    """Normalized Courant-Snyder invariants (in units of sigma squared) of the particles in both planes."""
+    j = []
+    for i, (beta, alpha, emit) in enumerate(((BETAX, ALPHAX, EMITX), (BETAY, ALPHAY, EMITY))):
+        x, px = coordinates[:, 2 * i], coordinates[:, 2 * i + 1]
+        j.append(((1 + alpha ** 2) / beta * x ** 2 + 2 * alpha * x * px + beta * px ** 2) / emit)
+    return np.stack(j, axis=1)
+
+
+# Moments and cuts of the beam distributions
+twiss = {'BETAX': 2.0, 'ALPHAX': 0.5, 'BETAY': 8.0, 'ALPHAY': -1.0, 'EMITX': 1e-6, 'EMITY': 2e-6, 'DPPRMS': 1e-3}
+for distribution in Beam.DISTRIBUTIONS:
+    coordinates = Beam.generate_from_twiss_parameters(100000, distribution, rng=np.random.default_rng(0), **twiss)
+    assert coordinates.shape == (100000, 5)
+    j = invariants(coordinates, **twiss)
+    if distribution in ('gaussian', 'kv', 'waterbag'):
+        for i, plane in enumerate(('X', 'Y')):
+            sigma = np.cov(coordinates[:, 2 * i:2 * i + 2].T)
+            assert np.isclose(np.sqrt(np.linalg.det(sigma)), twiss[f'EMIT{plane}'], rtol=2e-2)
+            assert np.isclose(sigma[0, 0], twiss[f'BETA{plane}'] * twiss[f'EMIT{plane}'], rtol=2e-2)
+        assert np.isclose(coordinates[:, 4].std(), 1e-3, rtol=2e-2)
+    if distribution == 'kv':
+        assert np.allclose(j.sum(axis=1), 4.0)
+    if distribution == 'waterbag':
+        assert j.sum(axis=1).max() <= 6.0 and j.sum(axis=1).max() > 5.9
+    if distribution == 'truncated_gaussian':
+        assert j.max() <= 9.0 and j.max() > 8.9
+        assert np.abs(coordinates[:, 4]).max() <= 3e-3
+    if distribution == 'halo':
+        assert j.min() >= 9.0 and j.max() <= 25.0
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import zgoubidoo
+from zgoubidoo.physics.chromaticity import chromaticity, _PARTICLES, _COORDINATES
+
+_ = zgoubidoo.ureg
+
+# One-turn matrices with known tunes, chromaticities, dispersion and momentum compaction
+Q1, Q2, XI1, XI2, ALPHA, LENGTH = 0.23, 0.31, -3.0, 1.5, 0.02, 100.0
+
+
+def one_turn(dpp):
+    m = np.identity(5)
+    for p, q, xi, beta in ((0, Q1, XI1, 5.0), (2, Q2, XI2, 8.0)):
+        mu = 2 * np.pi * (q + xi * dpp)
+        m[p:p + 2, p:p + 2] = [[np.cos(mu), beta * np.sin(mu)], [-np.sin(mu) / beta, np.cos(mu)]]
+    m[0, 4], m[1, 4] = 0.3, 0.01
+    return m
+
+
+class Results:
+    """Results of the `Objet5` runs, the tracks of the particles at the end of the sequence are given by the map."""
+    def __init__(self, mappings, compact):
+        self.mappings = mappings
+        self.compact = compact
+
+    def print(self):
+        pass
+
+    def get_tracks(self, parameters, labels, columns):
+        dpp = parameters[0]['BUNCH.DR'] - 1.0
+        initial = np.zeros((len(_PARTICLES), 5))
+        initial[:, 4] = dpp
+        initial[1 + np.arange(5), np.arange(5)] += 1e-5
+        initial[6 + np.arange(5), np.arange(5)] -= 1e-5
+        final = (initial - initial[0]) @ one_turn(dpp).T + initial[0]
+        tracks = pd.DataFrame(np.hstack([final, initial]), columns=_COORDINATES)
+        tracks['S'] = LENGTH * (1 + ALPHA * dpp)
+        tracks['LET'] = pd.Categorical(_PARTICLES, categories=_PARTICLES + ['K']) if self.compact else _PARTICLES
+        tracks['KEX'] = 1
+        return tracks.iloc[::-1]
+
+
+class Zgoubi:
+    def __init__(self, compact):
+        self.compact = compact
+
+    def __call__(self, zgoubi_input, mappings):
+        self.mappings = mappings
+        return self
+
+    def collect(self):
+        return Results(self.mappings, self.compact)
+
+
+class Sequence:
+    name = 'RING'
+    sequence = []
+    particle = zgoubidoo.commands.Proton()
+    kinematics = zgoubidoo.Kinematics(230 * _.MeV, kinetic=True)
+
+
+# The fits provide the chromatic quantities, with plain and compact (categorical) tracks
+for compact in (False, True):
+    sequence = Sequence()
+    sequence.zgoubi = Zgoubi(compact)
+    c = chromaticity(sequence, closed_orbits=False)
+    assert len(sequence.zgoubi.mappings) == 11
+    assert np.allclose([m['BUNCH.DR'] for m in sequence.zgoubi.mappings], 1.0 + np.linspace(-5e-3, 5e-3, 11))
+    assert np.allclose(c.tunes.values.astype(float), [Q1, Q2])
+    assert np.allclose(c.chromaticity.values.astype(float), [XI1, XI2], rtol=1e-4)
+    assert np.isclose(c.momentum_compaction, ALPHA)
+    m = one_turn(0.0)
+    assert np.allclose(c.table.loc[5, ['DY', 'DYP']].values.astype(float),
+                       np.linalg.solve(np.identity(2) - m[:2, :2], m[:2, 4]))
+    assert np.allclose(c.table.loc[5, ['BETA11', 'BETA22']].values.astype(float), [5.0, 8.0])
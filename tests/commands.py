@@ -0,0 +1,93 @@
+import zgoubidoo
+from zgoubidoo.commands import Faiscnl, Objet2, Quadrupole, TranslationRotation
+
+_ = zgoubidoo.ureg
+
+# Parameters are stored as magnitudes in the units of their default value and serialized from them
+q = Quadrupole('Q', XL=0.5 * _.m, B0=0.2 * _.tesla, R0=5 * _.mm)
+assert q._attributes['XL'] == 50.0 and q._attributes['R0'] == 0.5 and q._attributes['B0'] == 2.0
+assert q.XL == 50 * _.cm
+assert '5.000000000000e+01 5.000000000000e-01 2.000000000000e+00' in str(q)
+q.XL_ = 30
+assert q.XL == 30 * _.cm and '3.000000000000e+01 5.000000000000e-01' in str(q)
+t = TranslationRotation('T', TX=5 * _.cm)
+assert t._attributes['TX'] == 0.05 and '5.000000000000e-02 0.000000000000e+00' in str(t)
+try:
+    Quadrupole('Q', XL=1 * _.tesla)
+    assert False
+except zgoubidoo.commands.ZgoubidooException:
+    pass
+
+# Additional parameters definitions override the defaults, in the canonical units
+q = Quadrupole('Q', '', {'XL': (0.2 * _.m, 'Magnet length')})
+assert q._attributes['XL'] == 20.0 and q.XL == 20 * _.cm
+
+# Copy-on-write clones share the serialization until either of them is modified
+qf = Quadrupole('QF', XL=50 * _.cm, B0=0.01 * _.tesla)
+qf_clone = qf.clone()
+assert str(qf_clone) == str(qf)
+qf_clone.B0 = 0.02 * _.tesla
+assert str(qf_clone) != str(qf)
+assert abs(qf.B0.to('tesla').magnitude - 0.01) < 1e-12
+
+# Non-parameter attributes
+fai = Faiscnl('FAI')
+fai_clone = fai.clone()
+assert 'zgoubi.fai' in str(fai_clone)
+fai_clone.binary = True
+assert 'b_zgoubi.fai' in str(fai_clone)
+assert 'b_zgoubi.fai' not in str(fai)
+
+# Particles of the objets
+objet = Objet2('BUNCH', BORO=1 * _.tesla * _.m)
+objet.add([[1.0, 2.0, 0.0, 0.0, 0.0, 1.0, 1.0]])
+objet_clone = objet.clone()
+reference = str(objet)
+assert str(objet_clone) == reference
+objet_clone.clear()
+assert str(objet_clone) != reference
+assert str(objet) == reference
+objet_clone.add([[3.0, 4.0, 0.0, 0.0, 0.0, 1.0, 1.0]])
+assert str(objet_clone) != reference
+assert str(objet) == reference
+
+# Clones do not share the particles buffer, even once their parameters have been modified
+objet = Objet2('BUNCH')
+for y in range(3):
+    objet.add([[y, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0]])
+objet_clone = objet.clone()
+objet.BORO = 2 * _.tesla * _.m
+objet_clone.LABEL2 = 'CLONE'
+objet.add([[10.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0]])
+objet_clone.add([[20.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0]])
+assert objet.PARTICULES[:, 0].tolist() == [0.0, 1.0, 2.0, 10.0]
+assert objet_clone.PARTICULES[:, 0].tolist() == [0.0, 1.0, 2.0, 20.0]
+
+# Retention policy of the results and outputs
+qf.retain(2)
+assert qf.results.retention == 2 and qf.output.retention is None
+qf.retain(output_retention=0)
+assert qf.results.retention == 2 and qf.output.retention == 0
+qf.retain(None)
+for i in range(3):
+    qf.results.append(({'QF.B0': float(i)}, i))
+    qf.output.append(({'QF.B0': float(i)}, i))
+assert len(qf.results) == 3 and len(qf.output) == 0
+
+# Every run is kept, the access by mapping provides the most recent run, unless the replacement is requested
+qd = Quadrupole('QD')
+for i in range(3):
+    qd.results.append((None, i))
+    qd.results.append(({'QD.B0': 1.0}, i))
+assert len(qd.results) == 6 and qd.results[None] == 2 and qd.results[{'QD.B0': 1.0}] == 2
+qd.results.clear()
+qd.retain(replace=True)
+for i in range(3):
+    qd.results.append(({'QD.B0': 1.0}, i))
+assert len(qd.results) == 1 and qd.results[0] == ({'QD.B0': 1.0}, 2)
+
+# Retention policy set on the whole input, with the evicted results spilled to another store
+spilled = []
+zi = zgoubidoo.Input('RETAIN', line=[qd]).retain(1, spill=lambda m, r: spilled.append((m, r)))
+qd.results.append(({'QD.B0': 2.0}, 3))
+assert spilled == [({'QD.B0': 1.0}, 2)] and qd.results.retention == 1 and qd.output.retention is None
@@ -21,3 +21,15 @@ zi += qf
 zi += qd
 
 zi.line
+
+t = zi.table
+t['B0'] = [0.02, -0.02] * _.tesla
+assert abs(qf.B0.to('tesla').magnitude - 0.02) < 1e-12
+assert abs(qd.B0.to('tesla').magnitude + 0.02) < 1e-12
+
+# Integer parameters are written back as integers (identical serialization)
+reference = str(qf)
+t['IL'] = 0
+assert qf.IL == 0 and isinstance(qf.IL, int)
+t['IL'] = 2
+assert str(qf) == reference
@@ -0,0 +1,79 @@
+import numpy as np
+import zgoubidoo
+from zgoubidoo.commands import Objet5, Quadrupole, Drift, Marker, Fit
+from zgoubidoo.optics import LinearOptics, match
+
+_ = zgoubidoo.ureg
+
+
+def quadrupole(k, length):
+    """Analytic 4x4 transfer matrix of a thick quadrupole (focusing in the horizontal plane if k > 0)."""
+    def plane(k):
+        if k > 0:
+            w = np.sqrt(k)
+            return np.array([[np.cos(w * length), np.sin(w * length) / w],
+                             [-w * np.sin(w * length), np.cos(w * length)]])
+        if k < 0:
+            w = np.sqrt(-k)
+            return np.array([[np.cosh(w * length), np.sinh(w * length) / w],
+                             [w * np.sinh(w * length), np.cosh(w * length)]])
+        return np.array([[1.0, length], [0.0, 1.0]])
+    r = np.zeros((4, 4))
+    r[:2, :2] = plane(k)
+    r[2:, 2:] = plane(-k)
+    return r
+
+
+# Linear model of a FODO cell against the analytic matrices
+kinematics = zgoubidoo.Kinematics(230 * _.MeV, kinetic=True)
+brho = kinematics.brho.to('tesla * meter').magnitude
+fodo = zgoubidoo.Input('FODO', [
+    Objet5('BUNCH', BORO=kinematics.brho),
+    Quadrupole('QF', XL=20 * _.cm, B0=2 * _.kilogauss, R0=10 * _.cm),
+    Drift('D1', XL=1 * _.m),
+    Quadrupole('QD', XL=20 * _.cm, B0=-2 * _.kilogauss, R0=10 * _.cm),
+    Drift('D2', XL=1 * _.m),
+    Marker('END'),
+])
+k = 0.2 / 0.1 / brho
+r = quadrupole(0.0, 1.0) @ quadrupole(-k, 0.2) @ quadrupole(0.0, 1.0) @ quadrupole(k, 0.2)
+optics = LinearOptics(fodo, kinematics, slices=10)
+tm = optics.transfer_matrix()
+assert len(tm) == 4 * 10 + 2
+assert np.isclose(tm['S'].iloc[-1], 2.4)
+assert optics.ends.tolist() == [0, 10, 20, 30, 40, 41]
+assert tm['LABEL1'].values[optics.ends].tolist() == [e.LABEL1 for e in fodo.line]
+assert np.allclose(tm.iloc[-1][[f"R{i}{j}" for i in range(1, 5) for j in range(1, 5)]].values.astype(float),
+                   r.flatten())
+assert np.allclose(tm.iloc[-1][['R55', 'R66']].values.astype(float), 1.0)
+
+# Periodic Twiss parameters against the analytic one-turn matrix
+twiss = optics.twiss()
+for plane, m in ((1, r[:2, :2]), (2, r[2:, 2:])):
+    mu = np.arccos((m[0, 0] + m[1, 1]) / 2)
+    mu = 2 * np.pi - mu if m[0, 1] < 0 else mu
+    assert np.isclose(twiss[f"BETA{plane}{plane}"].iloc[-1], m[0, 1] / np.sin(mu))
+    assert np.isclose(twiss[f"ALPHA{plane}{plane}"].iloc[-1], (m[0, 0] - m[1, 1]) / 2 / np.sin(mu))
+    assert np.isclose(twiss[f"MU{plane}"].iloc[-1], mu)
+
+# Parametric scans against the nominal model
+scan = optics.scan([{'QF.B0': b * _.kilogauss} for b in (1.5, 2.0, 2.5)])
+nominal = scan.iloc[len(twiss):2 * len(twiss)]
+assert np.allclose(nominal['BETA11'].values, twiss['BETA11'].values)
+
+# Matching on the linear model recovers known strengths
+target = optics.matrices([{'QF.B0': 3 * _.kilogauss, 'QD.B0': -2.5 * _.kilogauss}])[0, -1]
+qf, qd = fodo[1], fodo[3]
+fit = Fit('FIT',
+          PARAMS=[Fit.Parameter(fodo, qf, Quadrupole.PARAMETERS['B0'], range=[0, 5]),
+                  Fit.Parameter(fodo, qd, Quadrupole.PARAMETERS['B0'], range=[-5, 0]),
+                  ],
+          CONSTRAINTS=[Fit.FirstOrderTransportCoefficientsConstraint(fodo, 'END', 1, 2, target[0, 1]),
+                       Fit.FirstOrderTransportCoefficientsConstraint(fodo, 'END', 3, 4, target[2, 3]),
+                       ],
+          )
+seeded = match(fodo, fit, kinematics)
+assert np.isclose(qf.B0.m_as('kilogauss'), 3.0, atol=1e-3) and np.isclose(qd.B0.m_as('kilogauss'), -2.5, atol=1e-3)
+assert np.allclose(seeded.PARAMS[0]['DV'], [2.85, 3.15], atol=1e-3)
+assert np.allclose(seeded.PARAMS[1]['DV'], [-2.625, -2.375], atol=1e-3)
+assert fit.PARAMS[0]['DV'] == [0, 5]
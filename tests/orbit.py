@@ -0,0 +1,39 @@
+import numpy as np
+import zgoubidoo.physics.orbit
+from zgoubidoo.physics.orbit import find_closed_orbits, HorizontalPlane
+
+# One-turn linear map, with a closed orbit proportional to the momentum offset, the orbits with DPP = 5% are lost
+M = np.array([[0.5, 2.0, 0.0, 0.0], [-0.3, 0.8, 0.0, 0.0], [0.0, 0.0, 0.7, 1.5], [0.0, 0.0, -0.2, 1.0]])
+B = np.array([1e-2, 2e-3, -1e-3, 5e-4])
+calls = []
+
+
+def track_rays(sequence, rays, dpp, slices=None):
+    calls.append(len(rays))
+    final = rays @ M.T + dpp[:, None] * B
+    final[np.isclose(dpp, 0.05)] = np.nan
+    return final
+
+
+track_rays_zgoubi = zgoubidoo.physics.orbit._track_rays
+zgoubidoo.physics.orbit._track_rays = track_rays
+
+# Closed orbits of all the momenta, each Newton iteration is a single tracking of all the rays
+dpp = np.array([-0.02, 0.0, 0.02, 0.05])
+orbits = find_closed_orbits(None, dpp=dpp)
+expected = np.linalg.solve(np.identity(4) - M, B[:, None] * dpp[:-1]).T
+assert np.allclose(orbits[['Y', 'T', 'Z', 'P']].values[:-1], expected, atol=1e-9)
+assert orbits['CONVERGED'].tolist() == [True, True, True, False]
+assert np.isnan(orbits.loc[3, 'Y'])
+assert np.allclose(orbits.loc[0, [f"R{i}{j}" for i in range(1, 5) for j in range(1, 5)]].values.astype(float),
+                   M.flatten())
+assert calls[0] == 4 * 5 and len(calls) == orbits['ITERATIONS'].max() + 1
+
+# Search in the horizontal plane only, the vertical coordinates are kept at their guess
+orbits = find_closed_orbits(None, dpp=0.01, guess=np.array([0.0, 0.0, 1e-3, 0.0]), plane=HorizontalPlane)
+assert orbits.loc[0, 'CONVERGED'] and orbits.loc[0, 'Z'] == 1e-3
+assert 'R33' not in orbits.columns and np.isclose(orbits.loc[0, 'R12'], M[0, 1])
+assert np.allclose(orbits.loc[0, ['Y', 'T']].values.astype(float),
+                   np.linalg.solve(np.identity(2) - M[:2, :2], 0.01 * B[:2] + M[:2, 2:] @ [1e-3, 0.0]))
+
+zgoubidoo.physics.orbit._track_rays = track_rays_zgoubi
@@ -0,0 +1,210 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import zgoubidoo
+from zgoubidoo.output import OUTPUT_SCHEMAS
+
+
+def records(kind, particles, labels, label_size=10):
+    """Synthetic records of a .plt or .fai file (one record per particle and per label)."""
+    schema = OUTPUT_SCHEMAS[kind]
+    length = sum(np.dtype(t).itemsize for _, t in schema.records if t != 'label') + 2 * label_size
+    data = np.zeros(particles * len(labels), dtype=schema.record_dtype(length))
+    data['_HEAD'] = data['_TAIL'] = length
+    data['# KEX'] = 1
+    data['IT'] = np.tile(np.arange(1, particles + 1), len(labels))
+    data['NOEL'] = np.repeat(np.arange(1, len(labels) + 1), particles)
+    data['KLEY'] = b'MARKER    '
+    data['LABEL1'] = np.repeat([label.ljust(label_size).encode() for label in labels], particles)
+    data['LABEL2'] = b'L2'.ljust(label_size)
+    data['LET'] = b'A'
+    for i, c in enumerate(('Y-DY', 'T', 'Z', 'P', 'S')):
+        data[c] = np.arange(len(data)) * 0.5 + i
+    return data
+
+
+def steps(kind, particles, labels, passes, n_steps):
+    """Synthetic records of a tracking file: several passes, all the particles through each element in turn, with
+    several steps per element; the last particle is lost in the last element."""
+    data = np.tile(np.repeat(records(kind, particles, labels), n_steps), passes)
+    data['IPASS'] = np.repeat(np.arange(1, passes + 1), len(data) // passes)
+    data['# KEX'] = np.where((data['IT'] == particles) & (data['NOEL'] == len(labels)), -1, 1)
+    data['Y-DY'] = np.arange(len(data))
+    return data
+
+
+def write_binary(filename, data):
+    """Write records as a Fortran unformatted sequential file (Zgoubi's binary output files)."""
+    with open(filename, 'wb') as f:
+        for _ in range(4):
+            f.write(np.int32(6).tobytes() + b'HEADER' + np.int32(6).tobytes())
+        f.write(data.tobytes())
+
+
+def write_text(filename, data):
+    """Write records as a Zgoubi text output file."""
+    names = [n for n in data.dtype.names if not n.startswith('_')]
+    with open(filename, 'w') as f:
+        f.write("# COORDINATES\n# \n")
+        f.write(', '.join(names) + "\n")
+        f.write(' '.join('.' for _ in names) + "\n")
+        for record in data:
+            f.write(' '.join(
+                f"'{record[n].decode()}'" if data.dtype[n].kind == 'S' else repr(record[n].item()) for n in names
+            ) + "\n")
+
+
+def results(kind, slices, data, path):
+    """Results of the runs of a beam sharded in slices (one binary file per run, in a sub-directory of path)."""
+    runs = []
+    for i in range(slices):
+        os.makedirs(os.path.join(path, str(i)))
+        write_binary(os.path.join(path, str(i), f"b_zgoubi.{kind}"), data)
+        runs.append({'mapping': {'BUNCH.SLICE': i, 'BUNCH.OFFSET': i * data['IT'].max()},
+                     'path': os.path.join(path, str(i)),
+                     })
+    return zgoubidoo.zgoubi.ZgoubiResults(runs)
+
+
+def expected(frame, labels=None, kex=None, ipass=None, particles=None, step=1, columns=None, key='IT'):
+    """Selection of the lines of a complete frame, as expected from the selection options of the readers."""
+    mask = frame.groupby(key).cumcount().values % step == 0
+    for c, v in (('LABEL1', labels), ('KEX', kex), ('IPASS', ipass), (key, particles)):
+        if v is not None:
+            mask &= frame[c].isin(np.atleast_1d(v)).values
+    frame = frame[mask].reset_index(drop=True)
+    return frame[[c for c in frame.columns if c in columns]] if columns is not None else frame
+
+
+SELECTIONS = [
+    {'labels': 'Q2'},
+    {'labels': ['Q1', 'Q3'], 'columns': ['Y-DY', 'S']},
+    {'kex': -1},
+    {'ipass': 2, 'particles': [1, 3]},
+    {'particles': 2, 'step': 3},
+    {'labels': 'Q3', 'ipass': [1], 'step': 2, 'columns': ['LABEL1', 'Y-DY', 'KEX']},
+]
+"""Selections of the lines (and columns) of the tracking files."""
+
+# Selection of particles of a sharded beam (global identifiers), only the relevant runs are read
+with tempfile.TemporaryDirectory() as path:
+    r = results('plt', 3, records('plt', 4, ['Q1', 'Q2']), path)
+    read = []
+    iter_output_file = zgoubidoo.zgoubi.iter_output_file
+
+    def recording_iter_output_file(filename, path, **kwargs):
+        read.append(path)
+        return iter_output_file(filename, path, **kwargs)
+
+    zgoubidoo.zgoubi.iter_output_file = recording_iter_output_file
+    tracks = r.get_tracks(particles=[2, 11], columns=['Y-DY'])
+    zgoubidoo.zgoubi.iter_output_file = iter_output_file
+    assert sorted(tracks['ID'].unique()) == [2, 11]
+    assert len(tracks) == 4
+    assert read == [r[0]['path'], r[2]['path']]
+
+# Text and binary files provide identical frames
+with tempfile.TemporaryDirectory() as path:
+    for kind in ('plt', 'fai'):
+        data = records(kind, 3, ['Q1', 'Q2'])
+        write_text(os.path.join(path, f"zgoubi.{kind}"), data)
+        write_binary(os.path.join(path, f"b_zgoubi.{kind}"), data)
+        text = getattr(zgoubidoo.output, f"read_{kind}_file")(path=path)
+        binary = getattr(zgoubidoo.output, f"read_binary_{kind}_file")(path=path)
+        assert 'KEX' in text.columns
+        assert text['LABEL2'].iloc[0] == 'L2'
+        pd.testing.assert_frame_equal(text, binary)
+
+# Selection of the columns and of the lines, whatever the chunk size and the format of the files
+with tempfile.TemporaryDirectory() as path:
+    data = steps('plt', 3, ['Q1', 'Q2', 'Q3'], 2, 4)
+    write_text(os.path.join(path, 'zgoubi.plt'), data)
+    write_binary(os.path.join(path, 'b_zgoubi.plt'), data)
+    full = zgoubidoo.output.read_plt_file(path=path)
+    assert len(full) == 3 * 3 * 2 * 4
+    for selection in SELECTIONS:
+        reference = expected(full, **selection)
+        assert len(reference) > 0
+        for reader in (zgoubidoo.output.read_plt_file, zgoubidoo.output.read_binary_plt_file):
+            pd.testing.assert_frame_equal(reader(path=path, **selection), reference)
+            chunks = list(zgoubidoo.output.iter_output_file(reader.__defaults__[0], path, kind='plt', chunksize=5,
+                                                            **selection))
+            pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), reference)
+    try:
+        zgoubidoo.output.read_plt_file(path=path, columns=['FOO'])
+        assert False
+    except zgoubidoo.output.ZgoubidooOutputException:
+        pass
+
+# Selection of the tracks of a sharded beam, the particles being selected by their global identifiers
+with tempfile.TemporaryDirectory() as path:
+    r = results('plt', 2, steps('plt', 3, ['Q1', 'Q2', 'Q3'], 2, 4), path)
+    full = r.get_tracks()
+    assert sorted(full['ID'].unique()) == [1, 2, 3, 4, 5, 6]
+    for selection in SELECTIONS:
+        if 'particles' in selection:
+            selection = {**selection, 'particles': [p + 3 for p in np.atleast_1d(selection['particles'])]}
+        columns = selection.get('columns')
+        tracks = r.get_tracks(**selection)
+        reference = expected(full, key='ID', **{**selection, 'columns': None})
+        if columns is not None:
+            reference = reference[[c for c in tracks.columns]]
+            assert set(columns) < set(tracks.columns)
+        pd.testing.assert_frame_equal(tracks.reset_index(drop=True), reference, check_categorical=False)
+    assert r.get_tracks() is full
+
+# Compact representation of the tracks on request only
+with tempfile.TemporaryDirectory() as path:
+    r = results('plt', 3, records('plt', 4, ['Q1', 'Q2']), path)
+    tracks = r.get_tracks(columns=['Y-DY', 'LABEL1', 'KEX'])
+    assert tracks['LABEL1'].dtype == object and tracks['KEX'].dtype == np.int64
+    assert tracks['BUNCH.SLICE'].dtype == np.int64
+    tracks = r.get_tracks(columns=['Y-DY', 'LABEL1', 'KEX'], compact=True)
+    assert tracks['LABEL1'].dtype.name == 'category' and tracks['KEX'].dtype == np.int8
+    assert tracks['BUNCH.SLICE'].dtype.name == 'category'
+
+# The byte-offset index provides the same selections as the full scan, it is saved and rebuilt if the file changes
+with tempfile.TemporaryDirectory() as path:
+    data = steps('plt', 3, ['Q1', 'Q2', 'Q3'], 2, 4)
+    for filename, writer in (('zgoubi.plt', write_text), ('b_zgoubi.plt', write_binary)):
+        writer(os.path.join(path, filename), data)
+        for selection in SELECTIONS:
+            for chunksize in (None, 5):
+                pd.testing.assert_frame_equal(
+                    pd.concat(zgoubidoo.output.iter_output_file(filename, path, kind='plt', index=True,
+                                                                chunksize=chunksize, **selection), ignore_index=True),
+                    pd.concat(zgoubidoo.output.iter_output_file(filename, path, kind='plt', **selection),
+                              ignore_index=True),
+                )
+        index = zgoubidoo.output.OutputIndex.load(os.path.join(path, filename))
+        assert index is not None and len(index.segments) == 3 * 3 * 2
+        assert index.segments['ROWS'].tolist() == [4] * 18
+        assert index.select(LABEL1='Q2', IPASS=2)['RANK'].tolist() == [16, 16, 16]
+        writer(os.path.join(path, filename), data[:len(data) // 2])
+        assert zgoubidoo.output.OutputIndex.load(os.path.join(path, filename)) is None
+        tracks = zgoubidoo.output.read_output_file(filename, path, kind='plt', labels='Q2', index=True)
+        assert len(tracks) == 3 * 4 and (tracks['IPASS'] == 1).all()
+        assert len(zgoubidoo.output.OutputIndex.load(os.path.join(path, filename)).segments) == 9
+
+# Compressed text and binary files provide the same frames
+with tempfile.TemporaryDirectory() as path:
+    for kind in ('plt', 'fai'):
+        data = records(kind, 3, ['Q1', 'Q2'])
+        write_text(os.path.join(path, f"zgoubi.{kind}"), data)
+        write_binary(os.path.join(path, f"b_zgoubi.{kind}"), data)
+        reference = getattr(zgoubidoo.output, f"read_{kind}_file")(path=path)
+        for filename in zgoubidoo.Zgoubi.ZGOUBI_COMPRESSED_FILES:
+            if filename.endswith(kind):
+                zgoubidoo.output.compress_file(filename, path, method='gzip')
+        assert zgoubidoo.output.locate_output_file(f"b_zgoubi.{kind}", path).endswith('.gz')
+        text = getattr(zgoubidoo.output, f"read_{kind}_file")(path=path)
+        binary = getattr(zgoubidoo.output, f"read_binary_{kind}_file")(path=path)
+        pd.testing.assert_frame_equal(text, reference)
+        pd.testing.assert_frame_equal(binary, reference)
+with tempfile.TemporaryDirectory() as path:
+    r = results('plt', 3, records('plt', 4, ['Q1', 'Q2']), path)
+    for run in r:
+        zgoubidoo.output.compress_file('b_zgoubi.plt', run['path'], method='gzip')
+    tracks = r.get_tracks(particles=[2, 11], labels='Q2', columns=['Y-DY'], index=True)
+    assert sorted(tracks['ID'].unique()) == [2, 11] and len(tracks) == 2
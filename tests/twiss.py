@@ -1,8 +1,172 @@
+import numpy as np
+import pandas as pd
 import zgoubidoo
 from zgoubidoo.commands import FakeDrift, Quadrupole, Proton, Objet5
 
 _ = zgoubidoo.ureg
 
+# Alignment of the tracks: the compiled kernel, the NumPy path and np.interp agree
+rng = np.random.default_rng(0)
+labels = ['Q1', 'D1', 'Q2']
+particles = zgoubidoo.twiss._PARTICLES
+coordinates = zgoubidoo.twiss._COORDINATES
+frames = []
+for i, label in enumerate(labels):
+    for p in particles:
+        n = rng.integers(3, 8)
+        frames.append(pd.DataFrame({'LET': p, 'LABEL1': label, 'X': i + np.sort(rng.random(n)),
+                                    **{c: rng.standard_normal(n) for c in coordinates}}))
+tracks = pd.concat(frames, ignore_index=True)
+aligned = {jit: zgoubidoo.twiss.align_tracks(tracks, jit=jit) for jit in (True, False)}
+assert zgoubidoo.twiss._compiled_interpolate_tracks_kernel
+assert np.allclose(aligned[True][0], aligned[False][0])
+reference = tracks[tracks['LET'] == 'O'].sort_values('X')
+for i, p in enumerate(particles):
+    track = tracks[tracks['LET'] == p].sort_values('X')
+    for j, c in enumerate(coordinates):
+        assert np.allclose(aligned[False][0][i, :, j], np.interp(reference['X'], track['X'], track[c]))
+by_element = {jit: zgoubidoo.twiss.align_tracks_by_element(tracks, labels + ['Q1'], jit=jit) for jit in (True, False)}
+for a, b in zip(by_element[True], by_element[False]):
+    assert np.allclose(a, b)
+data, x, element, step = by_element[False]
+for k, label in enumerate(labels + ['Q1']):
+    reference = tracks[(tracks['LET'] == 'O') & (tracks['LABEL1'] == label)]
+    assert np.allclose(x[element == k], reference['X']) and (step[element == k] == np.arange(len(reference))).all()
+    for i, p in enumerate(particles):
+        track = tracks[(tracks['LET'] == p) & (tracks['LABEL1'] == label)]
+        for j, c in enumerate(coordinates):
+            assert np.allclose(data[i, element == k, j], np.interp(reference['X'], track['X'], track[c]))
+
+
+def quadrupole(k, length):
+    """Transfer matrix (6x6) of a thick quadrupole (drift for k = 0)."""
+    m = np.identity(6)
+    for p, kk in ((0, k), (2, -k)):
+        if kk > 0:
+            w = np.sqrt(kk)
+            m[p:p + 2, p:p + 2] = [[np.cos(w * length), np.sin(w * length) / w],
+                                   [-w * np.sin(w * length), np.cos(w * length)]]
+        elif kk < 0:
+            w = np.sqrt(-kk)
+            m[p:p + 2, p:p + 2] = [[np.cosh(w * length), np.sinh(w * length) / w],
+                                   [w * np.sinh(w * length), np.cosh(w * length)]]
+        else:
+            m[p, p + 1] = length
+    return m
+
+
+def skew_quadrupole(k):
+    """Transfer matrix (6x6) of a thin skew quadrupole."""
+    m = np.identity(6)
+    m[1, 2] = m[3, 0] = -k
+    return m
+
+
+def step_by_step(elements, steps=10, skews=None):
+    """Step-by-step transfer matrix (DataFrame with the R columns) of a sequence of (k, length) elements, optionally
+    with thin skew quadrupoles at the entrance of the elements."""
+    matrices, m = [], np.identity(6)
+    for i, (k, length) in enumerate(elements):
+        m = skew_quadrupole(skews[i] if skews is not None else 0.0) @ m
+        for _ in range(steps):
+            m = quadrupole(k, length / steps) @ m
+            matrices.append(m)
+    matrices = np.array(matrices)
+    return pd.DataFrame({f"R{i + 1}{j + 1}": matrices[:, i, j] for i in range(6) for j in range(6)})
+
+
+fodo_elements = [(1.2, 0.5), (0.0, 1.0), (-1.2, 0.5), (0.0, 1.0)]
+
+# Batched Twiss computation
+matrices = [step_by_step([(k * s, length) for k, length in fodo_elements]) for s in (0.8, 1.0, 1.2)]
+batch = zgoubidoo.twiss.compute_twiss_batch(zgoubidoo.twiss.stack_transfer_matrices(matrices),
+                                            mappings=[{'QF.K1': s} for s in (0.8, 1.0, 1.2)])
+for s, m in zip((0.8, 1.0, 1.2), matrices):
+    reference = zgoubidoo.twiss.compute_twiss(m.copy())
+    twiss = batch[batch['QF.K1'] == s]
+    for c in ('BETA11', 'BETA22', 'ALPHA11', 'ALPHA22', 'GAMMA11', 'GAMMA22', 'MU1', 'MU2', 'DET1', 'DET2',
+              'DISP1', 'DISP2', 'DISP3', 'DISP4'):
+        assert np.allclose(twiss[c].values, reference[c].values, equal_nan=True), c
+
+# Coupled optics parametrizations reduce to the uncoupled Twiss parameters (unequal tunes)
+m = step_by_step([(1.2, 0.5), (0.0, 1.0), (-1.3, 0.5), (0.0, 1.0)])
+uncoupled = zgoubidoo.twiss.compute_twiss(m.copy())
+teng = zgoubidoo.twiss.compute_teng_twiss(m.copy())
+ripken = zgoubidoo.twiss.compute_ripken_twiss(m.copy())
+for mode, plane in ((1, 'X'), (2, 'Y')):
+    assert np.allclose(teng[f"TENG_BETA{mode}"], uncoupled[f"BETA{mode}{mode}"])
+    assert np.allclose(teng[f"TENG_MU{mode}"], uncoupled[f"MU{mode}"])
+    assert np.allclose(ripken[f"RIPKEN_BETA{mode}{plane}"], uncoupled[f"BETA{mode}{mode}"])
+    assert np.allclose(ripken[f"RIPKEN_MU{mode}"], uncoupled[f"MU{mode}"])
+
+# Coupled optics with tr A - tr D changing sign along the line: the normal modes are not swapped
+m = step_by_step([(1.2, 0.5), (0.0, 1.0), (-1.2, 0.5), (0.0, 1.0)], skews=[0.2, 0.0, -0.3, 0.0])
+teng = zgoubidoo.twiss.compute_teng_twiss(m.copy())
+ripken = zgoubidoo.twiss.compute_ripken_twiss(m.copy())
+r = zgoubidoo.twiss.stack_transfer_matrices([m])[0, :, :4, :4]
+turns = r @ r[-1] @ np.linalg.inv(r)
+c = np.stack([teng[[f"TENG_C{i}1", f"TENG_C{i}2"]].values for i in (1, 2)], axis=1)
+g = teng['TENG_G'].values[:, None, None] * np.identity(2)
+c_conjugate = np.stack([np.stack([c[:, 1, 1], -c[:, 0, 1]], axis=-1), np.stack([-c[:, 1, 0], c[:, 0, 0]], axis=-1)],
+                       axis=-2)
+v = np.block([[g, c], [-c_conjugate, g]])
+u = np.linalg.inv(v) @ turns @ v
+assert np.allclose(u[:, :2, 2:], 0.0) and np.allclose(u[:, 2:, :2], 0.0)
+assert np.allclose(np.trace(u[:, :2, :2], axis1=1, axis2=2), np.trace(u[0, :2, :2]))
+tunes = np.sort(np.abs(np.angle(np.linalg.eigvals(r[-1])))[::2])
+assert np.allclose(np.sort(teng[['TENG_MU1', 'TENG_MU2']].values[-1]), tunes)
+assert np.allclose(np.sort(ripken[['RIPKEN_MU1', 'RIPKEN_MU2']].values[-1]), tunes)
+assert (ripken[['RIPKEN_MU1', 'RIPKEN_MU2']].values[0] > 0).all()
+
+# Second-order transfer map of a known quadratic map (coefficients ramped linearly along the element)
+rng = np.random.default_rng(0)
+r_map = np.identity(5) + 0.1 * rng.standard_normal((5, 5))
+t_map = np.triu(0.1 * rng.standard_normal((5, 5, 5)))  # T_ijk for j <= k only
+objet = zgoubidoo.twiss.generate_second_order_objet(PY=0.1, PT=0.1, PZ=0.1, PP=0.1, PD=1e-3, BORO=1 * _.tesla * _.m)
+assert objet.IMAX == 51
+rays = objet.PARTICULES
+initial = np.column_stack([rays[:, 0] * 1e-2, rays[:, 1] * 1e-3, rays[:, 2] * 1e-2, rays[:, 3] * 1e-3, rays[:, 5] - 1])
+tracks = []
+for x in (0.0, 0.5, 1.0):
+    final = initial + x * (initial @ (r_map - np.identity(5)).T + np.einsum('ijk,nj,nk->ni', t_map, initial, initial))
+    tracks.append(pd.DataFrame({
+        'LABEL1': 'E1',
+        'IT': np.arange(1, 52),
+        'X': x,
+        **dict(zip(['Y-DY', 'T', 'Z', 'P', 'D-1'], final.T)),
+        **dict(zip(['Yo', 'To', 'Zo', 'Po', 'Do-1'], initial.T)),
+    }))
+tracks = pd.concat(tracks, ignore_index=True)
+beamline = zgoubidoo.Input('SECOND_ORDER', line=[objet, FakeDrift('E1', XL=1 * _.m)])
+m = zgoubidoo.twiss.compute_second_order_transfer_matrix(beamline, tracks)
+assert len(m) == 3 and np.allclose(m['S'], [0.0, 0.5, 1.0])
+for i in range(5):
+    for j in range(5):
+        assert np.allclose(m[f"R{i + 1}{j + 1}"], np.identity(5)[i, j] + m['S'] * (r_map[i, j] - np.identity(5)[i, j]))
+        for k in range(j, 5):
+            assert np.allclose(m[f"T{i + 1}{j + 1}{k + 1}"], m['S'] * t_map[i, j, k])
+
+# Sigma matrix propagated through a drift and a thin lens with dispersion, against R S0 R^T
+sigma_init = {'s11': 4e-6, 's12': -1e-6, 's22': 1e-6, 's33': 2e-6, 's44': 3e-6, 'dpprms': 1e-3}
+s0 = np.diag([4e-6, 1e-6, 2e-6, 3e-6, 1e-6])
+s0[0, 1] = s0[1, 0] = -1e-6
+drift, lens = np.identity(5), np.identity(5)
+drift[0, 1] = drift[2, 3] = 2.0
+lens[1, 0], lens[3, 2], lens[1, 4] = -0.5, 0.5, 0.1
+r = np.array([drift, lens @ drift, drift @ lens @ drift])
+sigma = zgoubidoo.twiss.compute_sigma_matrix(
+    pd.DataFrame({f"R{i + 1}{j + 1}": r[:, i, j] for i in range(5) for j in range(5)}), sigma_init)
+for k, m in enumerate(r):
+    reference = m @ s0 @ m.T
+    assert np.allclose([sigma[f"S{i + 1}{j + 1}"].iloc[k] for i in range(5) for j in range(i, 5)],
+                       reference[np.triu_indices(5)], rtol=1e-12, atol=0.0)
+    assert np.isclose(sigma['SIGMA_Y'].iloc[k], np.sqrt(reference[0, 0]))
+    assert np.isclose(sigma['EMIT2'].iloc[k], np.sqrt(np.linalg.det(s0[2:4, 2:4])))
+assert np.isclose(sigma['EMIT1'].iloc[0], np.sqrt(np.linalg.det(s0[:2, :2])))
+assert sigma['EMIT1'].iloc[2] > sigma['EMIT1'].iloc[0]
+assert np.allclose(zgoubidoo.twiss.propagate_sigma_matrix(np.stack([r, r[::-1]]), s0[:4, :4])[1, 0, :4, :4],
+                   r[2, :4, :4] @ s0[:4, :4] @ r[2, :4, :4].T)
+
 qf = Quadrupole(
     XL=50 * _.cm,
     B0=0.01 * _.tesla,
@@ -34,3 +198,4 @@ zgoubidoo.survey(fodo)
 
 r = zgoubidoo.twiss.compute_transfer_matrix(fodo, out.tracks)
 twiss = zgoubidoo.twiss.compute_twiss(r)
+sigma = zgoubidoo.twiss.compute_sigma_matrix(r, {'s11': 1e-6, 's22': 1e-6, 's33': 1e-6, 's44': 1e-6, 'dpprms': 1e-3})
@@ -47,9 +47,11 @@ from . import commands
 from . import physics
 from . import vis
 from . import twiss
+from . import optics
 from . import physics
-from .input import Input, InputValidator, ZgoubiInputException, ParametricMapping
-from .output import read_fai_file, read_plt_file, read_matrix_file, read_srloss_file
+from .input import Input, InputTable, InputValidator, ZgoubiInputException, ParametricMapping
+from .output import iter_output_file, read_fai_file, read_plt_file, read_matrix_file, read_srloss_file, compress_file, \
+    read_binary_fai_file, read_binary_plt_file
 from .zgoubi import Zgoubi, ZgoubiResults, ZgoubiException
 from .survey import survey
 from .frame import Frame, ZgoubidooFrameException
@@ -2,10 +2,12 @@
 
 """
 from __future__ import annotations
-from typing import Optional, Union
+from typing import Callable, Optional, Tuple, Union
 import os
+import multiprocessing
 import numpy as np
 import pandas as pd
+from scipy.special import ndtr as _ndtr, ndtri as _ndtri
 from zgoubidoo import _Q
 from zgoubidoo.commands import CommandType as _CommandType
 from zgoubidoo.commands import Command as _Command
@@ -16,6 +18,10 @@ from zgoubidoo.commands import ObjetType as _ObjetType
 from zgoubidoo.kinematics import Kinematics as _Kinematics
 from ..input import ParametricMapping as _ParametricMapping
 from ..input import MappedParametersListType as _MappedParametersListType
+from ..input import ZGOUBI_IMAX as _ZGOUBI_IMAX
+
+BEAM_BLOCK_SIZE: int = 1000
+"""Number of particles generated with each random stream of a lazy distribution (see `Beam.block_rng`)."""
 
 
 class ZgoubidooBeamException(Exception):
@@ -37,6 +43,7 @@ class Beam(_Command, metaclass=BeamType):
     PARAMETERS = {
         'OBJET': ('Objet2', 'Active objet representation.'),
         'SLICE': (0, "Active slice identifier. Note: this is the number of slices, but the active slice number."),
+        'OFFSET': (0, "Global index of the first particle of the active slice."),
         'REFERENCE': (0, ""),
     }
     """Parameters of the command, with their default value, their description and optinally an index used by other 
@@ -53,7 +60,8 @@ class Beam(_Command, metaclass=BeamType):
                   particle: _ParticuleType = _Proton,
                   objet: _ObjetType = _Objet2,
                   kinematics: Union[_Kinematics, float, _Q] = None,
-                  slices: int = 1,
+                  slices: Optional[int] = None,
+                  workers: Optional[int] = None,
                   *args,
                   **kwargs):
         """
@@ -63,7 +71,10 @@ class Beam(_Command, metaclass=BeamType):
             particle:
             objet:
             kinematics:
-            slices:
+            slices: number of slices (Zgoubi runs) used to track the beam; automatically determined if None (see
+                    `slices`).
+            workers: number of parallel Zgoubi runs used to balance the slices; if None, the number of parallel runs of
+                     the `Zgoubi` instance running the beam is used (the number of CPUs outside of a run, see `workers`).
             *args:
             **kwargs:
 
@@ -75,8 +86,12 @@ class Beam(_Command, metaclass=BeamType):
         if not isinstance(kinematics, _Kinematics):
             kinematics = _Kinematics(kinematics)
         self._kinematics: _Kinematics = kinematics
-        self._slices: int = slices
+        self._slices: Optional[int] = slices
+        self._workers: Optional[int] = workers
         self._distribution: Optional[pd.DataFrame] = None
+        self._generator: Optional[Callable[[int, np.random.Generator], np.ndarray]] = None
+        self._seed: Optional[np.random.SeedSequence] = None
+        self._n: int = 0
         self._initialize_distribution(distribution, *args, **kwargs)
 
     def _initialize_distribution(self, distribution: pd.DataFrame = None, *args, **kwargs):
@@ -85,6 +100,7 @@ class Beam(_Command, metaclass=BeamType):
         Args:
             distribution:
         """
+        self._generator = None
         if distribution is not None:
             self._distribution = distribution
         else:
@@ -98,6 +114,60 @@ class Beam(_Command, metaclass=BeamType):
         if self._distribution.shape[0] == 0:
             raise ZgoubidooBeamException("Trying to initialize a beam distribution with invalid number of particles.")
 
+    def _initialize_generator(self,
+                              generator: Callable[[int, np.random.Generator], np.ndarray],
+                              n: int,
+                              seed: Optional[Union[int, np.random.SeedSequence]] = None):
+        """Set a lazy distribution: the particles of each slice are generated when the slice becomes active.
+
+        The particles are generated by blocks of `BEAM_BLOCK_SIZE` particles, each block using its own random stream
+        derived from the seed (see `block_rng`), so that the particles depend neither on the order in which the slices
+        are generated nor on the number of slices.
+
+        Args:
+            generator: a callable generating a given number of particles using a given random generator.
+            n: the total number of particles.
+            seed: the seed (or seed sequence) of the distribution; a random seed is used if None.
+        """
+        if int(n) <= 0:
+            raise ZgoubidooBeamException("Trying to initialize a beam distribution with invalid number of particles.")
+        self._distribution = None
+        self._generator = generator
+        self._n = int(n)
+        self._seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+    def block_rng(self, i: int) -> np.random.Generator:
+        """Random generator of a given block of particles of a lazy distribution.
+
+        Args:
+            i: the block number (the block holds the particles i * `BEAM_BLOCK_SIZE` to (i + 1) * `BEAM_BLOCK_SIZE`).
+
+        Returns:
+            a generator seeded with the i-th child of the seed sequence of the distribution.
+        """
+        return np.random.default_rng(np.random.SeedSequence(entropy=self._seed.entropy,
+                                                            spawn_key=(*self._seed.spawn_key, i),
+                                                            pool_size=self._seed.pool_size,
+                                                            ))
+
+    def _generate(self, start: int, stop: int) -> np.ndarray:
+        """Generate the particles start to stop (excluded) of a lazy distribution (see `block_rng`)."""
+        first, last = start // BEAM_BLOCK_SIZE, -(-stop // BEAM_BLOCK_SIZE)
+        particles = np.concatenate([
+            self._generator(min(BEAM_BLOCK_SIZE, self._n - i * BEAM_BLOCK_SIZE), self.block_rng(i))
+            for i in range(first, last)
+        ] or [np.zeros((0, 5))])
+        return particles[start - first * BEAM_BLOCK_SIZE:stop - first * BEAM_BLOCK_SIZE]
+
+    def _n_particles(self) -> Optional[int]:
+        """Total number of particles of the beam (None if the beam has no distribution)."""
+        if self._generator is not None:
+            return self._n
+        try:
+            return len(self._distribution)
+        except TypeError:
+            return None
+
     def clear(self) -> Beam:
         """
 
@@ -105,33 +175,67 @@ class Beam(_Command, metaclass=BeamType):
 
         """
         self._distribution = None
+        self._generator = None
         return self
 
     @property
-    def slices(self):
-        """Number of slices."""
-        return self._slices
+    def slices(self) -> int:
+        """Number of slices.
+
+        Unless set explicitely, the beam is sharded automatically: a single slice is used if the distribution does not
+        exceed `ZGOUBI_IMAX` particles, otherwise the number of slices is the smallest multiple of the number of
+        workers such that no slice exceeds `ZGOUBI_IMAX` particles.
+        """
+        if self._slices is not None:
+            return self._slices
+        if self._n_particles() is None:
+            return 1
+        shards = int(np.ceil(self._n_particles() / _ZGOUBI_IMAX))
+        if shards <= 1:
+            return 1
+        workers = self.workers or multiprocessing.cpu_count()
+        return int(np.ceil(shards / workers)) * workers
 
     @slices.setter
     def slices(self, n):
         self._slices = n
 
     @property
-    def active_slice(self):
+    def workers(self) -> Optional[int]:
+        """Number of parallel Zgoubi runs used to balance the slices (None if not set explicitely).
+
+        Unless set explicitely, the number of parallel runs of the `Zgoubi` instance is used when the beam is run.
         """
+        return self._workers
 
-        Args:
-            n:
+    @workers.setter
+    def workers(self, n: Optional[int]):
+        self._workers = n
 
-        Returns:
+    @property
+    def offsets(self) -> np.ndarray:
+        """Global index of the first particle of each slice (slices are balanced within one particle)."""
+        return (np.arange(self.slices + 1) * (self._n_particles() or 0)) // self.slices
 
+    @property
+    def active_slice(self):
+        """The particles of the active slice (see `SLICE`).
+
+        Returns:
+            a DataFrame with the particles of the slice, None if the slice is empty.
         """
-        try:
-            n_tot = len(self._distribution)
-        except TypeError:
+        offsets = self.offsets
+        if self._generator is not None:
+            d = pd.DataFrame(self._generate(int(offsets[self.SLICE]), int(offsets[self.SLICE + 1])))
+        elif isinstance(self._distribution, np.ndarray):
+            # Zero-copy view (e.g. on a memory-mapped array, only the pages of the slice are read)
+            d = pd.DataFrame(self._distribution[offsets[self.SLICE]:offsets[self.SLICE + 1]], copy=False)
+        elif hasattr(self._distribution, 'to_pandas'):  # Arrow table: only the slice is converted
+            d = self._distribution.slice(offsets[self.SLICE], offsets[self.SLICE + 1] - offsets[self.SLICE]).to_pandas()
+        elif self._distribution is not None:
+            d = self._distribution.iloc[offsets[self.SLICE]:offsets[self.SLICE + 1]]
+        else:
             return None
-        n_slices = int(np.floor(n_tot / self._slices))
-        d = self._distribution.iloc[self.SLICE * n_slices:(self.SLICE + 1) * n_slices]
         d.columns = ['Y', 'T', 'Z', 'P', 'D']
         if len(d) == 0:
             return None
@@ -159,14 +263,21 @@ class Beam(_Command, metaclass=BeamType):
             return _ParametricMapping(
                 [
                     {
-                        f"{self.LABEL1}.SLICE": list(range(0, self._slices))
+                        f"{self.LABEL1}.SLICE": list(range(0, self.slices)),
+                        f"{self.LABEL1}.OFFSET": [int(o) for o in self.offsets[:-1]],
                     },
                 ]
             ).combinations
 
     @property
     def distribution(self) -> pd.DataFrame:
-        """The beam distribution."""
+        """The beam distribution (for a lazy distribution, all the slices are generated)."""
+        if self._generator is not None:
+            return pd.DataFrame(self._generate(0, self._n))
+        if isinstance(self._distribution, np.ndarray):
+            return pd.DataFrame(self._distribution, copy=False)
+        if hasattr(self._distribution, 'to_pandas'):
+            return self._distribution.to_pandas()
         return self._distribution
 
     @property
@@ -180,48 +291,96 @@ class Beam(_Command, metaclass=BeamType):
         return self._kinematics
 
     def from_file(self, file: str, n: int = None, path: str = '.') -> Beam:
-        """
+        """Initialize a beam from a distribution file (see `generate_from_file`).
 
         Args:
-            file:
-            n:
-            path:
+            file: the file name.
+            n: the number of particles to read (all of them if None).
+            path: the path to the file.
 
         Returns:
-
+            the beam itself (to allow method chaining).
         """
         self._initialize_distribution(Beam.generate_from_file(file, path, n))
         return self
 
-    def from_5d_sigma_matrix(self, n, **kwargs) -> Beam:
+    def from_5d_sigma_matrix(self,
+                             n,
+                             seed: Optional[Union[int, np.random.SeedSequence]] = None,
+                             lazy: bool = False,
+                             **kwargs) -> Beam:
         """
         Initialize a beam with a 5D particle distribution from a Sigma matrix.
 
         Args:
-            n:
-            **kwargs:
+            n: the number of particles.
+            seed: seed of the random generator (for reproducible distributions).
+            lazy: if True the particles of each slice are only generated when the slice is tracked, using independent
+                  random streams derived from the seed (one per block of `BEAM_BLOCK_SIZE` particles, the distribution
+                  does not depend on the number of slices).
+            **kwargs: see `generate_from_5d_sigma_matrix`.
 
         Returns:
-
+            the beam itself (to allow method chaining).
         """
-        distribution = Beam.generate_from_5d_sigma_matrix(n, **kwargs)
-        self._initialize_distribution(pd.DataFrame(distribution))
+        if lazy:
+            self._initialize_generator(
+                lambda m, rng: Beam.generate_from_5d_sigma_matrix(m, rng=rng, **kwargs),
+                n,
+                seed,
+            )
+        else:
+            rng = np.random.default_rng(seed) if seed is not None else None
+            distribution = Beam.generate_from_5d_sigma_matrix(n, rng=rng, **kwargs)
+            self._initialize_distribution(pd.DataFrame(distribution))
         return self
 
-    def from_twiss_parameters(self, n, **kwargs) -> Beam:
+    def from_twiss_parameters(self,
+                              n,
+                              seed: Optional[Union[int, np.random.SeedSequence]] = None,
+                              lazy: bool = False,
+                              distribution: str = 'gaussian',
+                              truncation: float = 3.0,
+                              halo: Tuple[float, float] = (3.0, 5.0),
+                              **kwargs) -> Beam:
         """
         Initialize a beam with a 5D particle distribution from Twiss parameters.
 
         Args:
-            n:
-            **kwargs:
+            n: the number of particles.
+            seed: seed of the random generator (see `from_5d_sigma_matrix`).
+            lazy: lazy generation of the slices (see `from_5d_sigma_matrix`).
+            distribution: type of transverse distribution, one of 'gaussian', 'kv', 'waterbag', 'truncated_gaussian' or
+                          'halo' (see `generate_from_twiss_parameters`).
+            truncation: truncation (in units of sigma) of the truncated gaussian distribution.
+            halo: inner and outer radii (in units of sigma) of the halo distribution.
+            **kwargs: the Twiss parameters, emittances (rms) and momentum offset and spread (X, PX, Y, PY, DPP, DPPRMS,
+                      BETAX, ALPHAX, BETAY, ALPHAY, EMITX, EMITY).
 
         Returns:
-
+            the beam itself (to allow method chaining).
         """
         keys = {'X', 'PX', 'Y', 'PY', 'DPP', 'DPPRMS', 'BETAX', 'ALPHAX', 'BETAY', 'ALPHAY', 'EMITX', 'EMITY'}
         if any([k not in keys for k in kwargs.keys()]):
             raise ZgoubidooBeamException("Invalid argument for a twiss distribution.")
+        if distribution != 'gaussian':
+            if distribution not in Beam.DISTRIBUTIONS:
+                raise ZgoubidooBeamException(f"Invalid distribution type '{distribution}'.")
+
+            def generator(m: int, rng: np.random.Generator) -> np.ndarray:
+                """Generate the particles of a slice."""
+                return Beam.generate_from_twiss_parameters(m,
+                                                           distribution=distribution,
+                                                           truncation=truncation,
+                                                           halo=halo,
+                                                           rng=rng,
+                                                           **kwargs)
+            if lazy:
+                self._initialize_generator(generator, n, seed)
+            else:
+                self._initialize_distribution(pd.DataFrame(generator(n, np.random.default_rng(seed))))
+            return self
+
         betax = kwargs.get('BETAX', 1)
         alphax = kwargs.get('ALPHAX', 0)
         gammax = (1+alphax**2)/betax
@@ -230,6 +389,8 @@ class Beam(_Command, metaclass=BeamType):
         gammay = (1 + alphay ** 2) / betay
 
         self.from_5d_sigma_matrix(n,
+                                  seed=seed,
+                                  lazy=lazy,
                                   x=kwargs.get('X', 0),
                                   px=kwargs.get('PX', 0),
                                   y=kwargs.get('Y', 0),
@@ -245,20 +406,127 @@ class Beam(_Command, metaclass=BeamType):
                                   )
         return self
 
+    DISTRIBUTIONS: Tuple[str, ...] = ('gaussian', 'kv', 'waterbag', 'truncated_gaussian', 'halo')
+    """Types of transverse distributions supported by `generate_from_twiss_parameters`."""
+
     @staticmethod
-    def generate_from_file(file: str, path: str = '.', n: Optional[int] = None) -> pd.DataFrame:
+    def generate_from_twiss_parameters(n: int,
+                                       distribution: str = 'gaussian',
+                                       truncation: float = 3.0,
+                                       halo: Tuple[float, float] = (3.0, 5.0),
+                                       rng: Optional[np.random.Generator] = None,
+                                       **kwargs) -> np.ndarray:
+        """
+        Generate a 5D particle distribution from Twiss parameters.
+
+        The transverse coordinates are first generated in normalized phase space (unit rms per coordinate for the
+        'gaussian', 'kv' and 'waterbag' distributions), then transformed with the Courant-Snyder parameters; exactly `n`
+        particles are generated with a fixed number of array operations (no rejection sampling):
+
+            - 'gaussian': gaussian distribution in both planes;
+            - 'kv': Kapchinskij-Vladimirskij distribution (uniform on the surface of a 4D hyper-ellipsoid);
+            - 'waterbag': uniform distribution in a 4D hyper-ellipsoid;
+            - 'truncated_gaussian': gaussian distribution truncated at `truncation` sigma in each plane (sampled by
+              inversion of the radial distribution);
+            - 'halo': hollow distribution, uniform between `halo[0]` and `halo[1]` sigma in each plane.
+
+        The momentum offset is gaussian (truncated at `truncation` sigma for the truncated gaussian distribution).
+
+        Args:
+            n: the number of particles.
+            distribution: the type of distribution (see above).
+            truncation: truncation in units of sigma ('truncated_gaussian' only).
+            halo: inner and outer radii in units of sigma ('halo' only).
+            rng: the random generator (a new default generator is used if None).
+            **kwargs: the Twiss parameters (see `from_twiss_parameters`).
+
+        Returns:
+            an array of shape (n, 5) with the coordinates x, px, y, py and dpp of each particle.
+
+        Examples:
+            >>> Beam.generate_from_twiss_parameters(1000, 'kv', rng=np.random.default_rng(0), EMITX=1e-6, EMITY=1e-6).shape
+            (1000, 5)
+        """
+        rng = rng or np.random.default_rng()
+        n = int(n)
+        if distribution == 'gaussian':
+            u = rng.standard_normal((n, 4))
+        elif distribution in ('kv', 'waterbag'):
+            u = rng.standard_normal((n, 4))
+            u /= np.linalg.norm(u, axis=1)[:, np.newaxis]
+            if distribution == 'kv':
+                u *= 2.0  # <u_i^2> = R^2 / 4 on the 3-sphere
+            else:
+                u *= np.sqrt(6.0) * rng.random(n)[:, np.newaxis] ** 0.25  # <u_i^2> = R^2 / 6 in the 4-ball
+        elif distribution in ('truncated_gaussian', 'halo'):
+            if distribution == 'truncated_gaussian':
+                r = np.sqrt(-2 * np.log(1 - rng.random((n, 2)) * (1 - np.exp(-truncation ** 2 / 2))))
+            else:
+                r = np.sqrt(halo[0] ** 2 + rng.random((n, 2)) * (halo[1] ** 2 - halo[0] ** 2))
+            phi = 2 * np.pi * rng.random((n, 2))
+            u = np.stack([r[:, 0] * np.cos(phi[:, 0]),
+                          r[:, 0] * np.sin(phi[:, 0]),
+                          r[:, 1] * np.cos(phi[:, 1]),
+                          r[:, 1] * np.sin(phi[:, 1]),
+                          ], axis=1)
+        else:
+            raise ZgoubidooBeamException(f"Invalid distribution type '{distribution}'.")
+
+        if distribution == 'truncated_gaussian':
+            bound = _ndtr(truncation)
+            d = _ndtri((1 - bound) + rng.random(n) * (2 * bound - 1))
+        else:
+            d = rng.standard_normal(n)
+
+        coordinates = np.empty((n, 5))
+        for i, plane in enumerate(('X', 'Y')):
+            beta = kwargs.get(f'BETA{plane}', 1)
+            alpha = kwargs.get(f'ALPHA{plane}', 0)
+            emit = kwargs.get(f'EMIT{plane}', 0)
+            coordinates[:, 2 * i] = kwargs.get(plane, 0) + np.sqrt(emit * beta) * u[:, 2 * i]
+            coordinates[:, 2 * i + 1] = kwargs.get(f'P{plane}', 0) \
+                + np.sqrt(emit / beta) * (u[:, 2 * i + 1] - alpha * u[:, 2 * i])
+        coordinates[:, 4] = kwargs.get('DPP', 0) + kwargs.get('DPPRMS', 0) * d
+        return coordinates
+
+    @staticmethod
+    def generate_from_file(file: str,
+                           path: str = '.',
+                           n: Optional[int] = None,
+                           ) -> Union[pd.DataFrame, np.ndarray, 'pyarrow.Table']:
         """
         Read a beam distribution from file.
 
+        The format is inferred from the file extension:
+
+            - `.npy`: NumPy array of shape (n, 5), opened memory-mapped (the slices of the beam are views on the
+              mapped array, only the data of the slice being tracked is read from disk);
+            - `.arrow`, `.feather` or `.ipc`: Arrow IPC file with 5 columns, opened memory-mapped (requires `pyarrow`);
+            - anything else: CSV file.
+
         Args:
-            file:
-            path:
-            n:
+            file: the file name.
+            path: the path to the file.
+            n: the number of particles to read (all of them if None).
 
         Returns:
+            the distribution (a DataFrame, a memory-mapped array or an Arrow table).
 
+        Raises:
+            ZgoubidooBeamException if the format requires an optional dependency that is not available.
         """
-        return pd.read_csv(os.path.join(path, file))[:n]
+        filename = os.path.join(path, file)
+        extension = os.path.splitext(file)[1].lower()
+        if extension == '.npy':
+            return np.load(filename, mmap_mode='r')[:n]
+        if extension in ('.arrow', '.feather', '.ipc'):
+            try:
+                import pyarrow
+            except ModuleNotFoundError:
+                raise ZgoubidooBeamException("Reading Arrow distribution files requires 'pyarrow'.")
+            table = pyarrow.ipc.open_file(pyarrow.memory_map(filename, 'r')).read_all()
+            return table.slice(0, n) if n is not None else table
+        return pd.read_csv(filename)[:n]
 
     @staticmethod
     def generate_from_5d_sigma_matrix(n: int,
@@ -283,6 +551,7 @@ class Beam(_Command, metaclass=BeamType):
                                       s45: float = 0,
                                       dpprms: float = 0,
                                       matrix=None,
+                                      rng: Optional[np.random.Generator] = None,
                                       ):
         """
 
@@ -309,18 +578,22 @@ class Beam(_Command, metaclass=BeamType):
             s45:
             dpprms:
             matrix:
+            rng: the random generator to be used (the global NumPy generator is used if None).
 
         Returns:
 
         """
-        # For performance considerations, see
-        # https://software.intel.com/en-us/blogs/2016/06/15/faster-random-number-generation-in-intel-distribution-for-python
-        try:
-            import numpy.random_intel
-            generator = numpy.random_intel.multivariate_normal
-        except ModuleNotFoundError:
-            import numpy.random
-            generator = numpy.random.multivariate_normal
+        if rng is not None:
+            generator = rng.multivariate_normal
+        else:
+            # For performance considerations, see
+            # https://software.intel.com/en-us/blogs/2016/06/15/faster-random-number-generation-in-intel-distribution-for-python
+            try:
+                import numpy.random_intel
+                generator = numpy.random_intel.multivariate_normal
+            except ModuleNotFoundError:
+                import numpy.random
+                generator = numpy.random.multivariate_normal
 
         s21 = s12
         s31 = s13
@@ -4,16 +4,21 @@ Commands controlling Zgoubi's control flow, geometry, tracking options, etc.
 TODO
 """
 from __future__ import annotations
-from typing import Any, Tuple, Dict, Mapping, List, Union, Iterable
+from typing import Any, Callable, Tuple, Dict, Mapping, List, Union, Iterable, Iterator, Optional
+from dataclasses import dataclass
+import functools
+import numbers as _numbers
 import uuid
+import numpy as _np
 import pandas as _pd
 import parse as _parse
 from pint import UndefinedUnitError as _UndefinedUnitError
+from pint import DimensionalityError as _DimensionalityError
 from .patchable import Patchable as _Patchable
 from .. import ureg as _ureg
 from .. import _Q
 from ..frame import Frame as _Frame
-from ..units import _radian, _degree, _m, _cm, _mm
+from ..units import _radian, _degree, _m, _cm, _mm, conversion_factor as _conversion_factor
 from ..utils import fortran_float
 import zgoubidoo
 
@@ -28,6 +33,240 @@ class ZgoubidooException(Exception):
         self.message = m
 
 
+@dataclass(frozen=True)
+class ParameterSchema:
+    """Compiled definition of a command parameter.
+
+    The schema is computed once per command class (see `CommandType`) from the `PARAMETERS` definition. Parameters with
+    a default value carrying units are stored as plain magnitudes expressed in the units of that default value (the
+    'canonical' units); the schema holds everything required to perform the unit checks and conversions without
+    re-building Pint quantities on every access.
+    """
+    default: Any
+    """Default value of the parameter, as given in the command definition."""
+
+    units: Optional[_ureg.Unit] = None
+    """Canonical units of the parameter (the units of its default value), None for parameters without units."""
+
+    dimensionality: Optional[Any] = None
+    """Dimensionality of the default value, None if it cannot be determined (e.g. strings or lists)."""
+
+    @classmethod
+    def compile(cls, definition: Any) -> ParameterSchema:
+        """Compile the schema of a parameter from its definition in a `PARAMETERS` dictionary.
+
+        Args:
+            definition: the parameter definition (tuple of default value, description and optional index).
+
+        Returns:
+            the compiled parameter schema.
+        """
+        try:
+            default = definition[0]
+        except (TypeError, IndexError, KeyError):
+            default = definition
+        dimensionality = None
+        if isinstance(default, _Q):
+            dimensionality = default.dimensionality
+        elif isinstance(default, _numbers.Number) and not isinstance(default, bool):
+            dimensionality = _ureg.dimensionless.dimensionality
+        if not isinstance(default, _Q) or not isinstance(default.magnitude, _numbers.Number):
+            return cls(default=default, dimensionality=dimensionality)
+        return cls(default=default, units=default.units, dimensionality=dimensionality)
+
+    @property
+    def dimensionless(self) -> bool:
+        """True if the parameter is dimensionless (angles are dimensionless)."""
+        return self.dimensionality is not None and self.dimensionality == _ureg.dimensionless.dimensionality
+
+    def canonical(self, value: Any, name: str = '') -> Any:
+        """Convert a value to its canonical representation (magnitude in the canonical units, when applicable).
+
+        Plain numbers are interpreted as dimensionless quantities (which is relevant for angles).
+
+        Args:
+            value: the value to be converted.
+            name: name of the parameter (used for error reporting).
+
+        Returns:
+            the canonical representation of the value.
+
+        Raises:
+            ZgoubidooException in case the value has an invalid dimension.
+        """
+        if self.units is None:
+            if self.dimensionality is not None and isinstance(value, _Q) \
+                    and value.dimensionality != self.dimensionality:
+                raise ZgoubidooException(f"Invalid dimension ({value.dimensionality} "
+                                         f"instead of {self.dimensionality}) "
+                                         f"for parameter {name}={value}."
+                                         )
+            if self.dimensionality is not None and not self.dimensionless and not isinstance(value, _Q):
+                raise ZgoubidooException(f"Invalid dimension ({_ureg.dimensionless.dimensionality} "
+                                         f"instead of {self.dimensionality}) "
+                                         f"for parameter {name}={value}."
+                                         )
+            return value
+        if isinstance(value, _Q):
+            units, magnitude = value.units, value.magnitude
+        else:
+            units, magnitude = _ureg.dimensionless, value
+        try:
+            return magnitude * _conversion_factor(units, self.units)
+        except _DimensionalityError:
+            raise ZgoubidooException(f"Invalid dimension ({units.dimensionality} "
+                                     f"instead of {self.dimensionality}) "
+                                     f"for parameter {name}={value}."
+                                     )
+        except TypeError:
+            return value  # Non numerical values (None, strings, etc.) are stored as such
+
+    def quantity(self, value: Any) -> Any:
+        """Build the public representation of a canonical value (a Pint quantity for parameters with units)."""
+        if self.units is not None and isinstance(value, (_numbers.Number, _np.ndarray)):
+            return _Q(value, self.units)
+        return value
+
+
+class MappedResults:
+    """Ordered store of the outputs or results of a command, indexed by the parametric mapping of each run.
+
+    Every run is appended to the store; the access by mapping provides the data of the most recent run with that
+    mapping. Successive runs with the same mapping can replace the previous entry instead (`replace`), which is
+    relevant for sweeps and fits repeating the same mappings. The store can be bounded with a retention policy: only the
+    last `retention` entries are kept (None to keep everything, 0 to keep nothing); evicted entries are passed to the
+    optional `spill` callback (e.g. to save them in another results store).
+
+    The store behaves like the list of (mapping, data) tuples it replaces, but also supports the access by mapping.
+
+    Examples:
+        >>> r = MappedResults(retention=2)
+        >>> r.append(({'Q1.B1': 1.0}, 'a'))
+        >>> r.append(({'Q1.B1': 2.0}, 'b'))
+        >>> r.append(({'Q1.B1': 3.0}, 'c'))
+        >>> len(r), r[0]
+        (2, ({'Q1.B1': 2.0}, 'b'))
+        >>> r[{'Q1.B1': 3.0}]
+        'c'
+    """
+
+    def __init__(self,
+                 retention: Optional[int] = None,
+                 spill: Optional[Callable[[Mapping[str, Union[_Q, float]], Any], None]] = None,
+                 replace: bool = False,
+                 ):
+        """
+        Args:
+            retention: the maximum number of entries to keep (None for no limit).
+            spill: a callback called with the mapping and data of each evicted entry.
+            replace: replace the entry of a previous run with the same mapping (instead of appending a new entry).
+        """
+        self._data: Dict[int, Tuple[Mapping[str, Union[_Q, float]], Any]] = dict()
+        self._index: Dict[Any, int] = dict()
+        self._counter: int = 0
+        self.retention: Optional[int] = retention
+        self.spill: Optional[Callable[[Mapping[str, Union[_Q, float]], Any], None]] = spill
+        self.replace: bool = replace
+
+    @staticmethod
+    def key(mapping: Optional[Mapping[str, Union[_Q, float]]]) -> Any:
+        """Hashable key representing a mapping."""
+        if mapping is None:
+            return None
+        try:
+            key = tuple(sorted(mapping.items()))
+            hash(key)
+            return key
+        except TypeError:
+            return repr(sorted(mapping.items()))
+
+    def append(self, item: Tuple[Mapping[str, Union[_Q, float]], Any]):
+        """Add the data of a run (replacing the data of a previous run with the same mapping if `replace` is set).
+
+        Args:
+            item: a tuple (mapping, data).
+        """
+        mapping, data = item
+        key = self.key(mapping)
+        if self.replace and key in self._index:
+            self._data.pop(self._index[key])
+        self._data[self._counter] = (mapping, data)
+        self._index[key] = self._counter
+        self._counter += 1
+        self.evict()
+
+    def __setitem__(self, mapping: Mapping[str, Union[_Q, float]], data: Any):
+        """Set the data of a mapping, replacing the data of the most recent run with that mapping."""
+        key = self.key(mapping)
+        if key in self._index:
+            self._data[self._index[key]] = (mapping, data)
+        else:
+            self.append((mapping, data))
+
+    def evict(self):
+        """Apply the retention policy."""
+        if self.retention is None:
+            return
+        while len(self._data) > max(self.retention, 0):
+            position = next(iter(self._data))
+            mapping, data = self._data.pop(position)
+            key = self.key(mapping)
+            if self._index.get(key) == position:
+                del self._index[key]
+            if self.spill is not None:
+                self.spill(mapping, data)
+
+    def __getitem__(self, item: Union[int, slice, Mapping[str, Union[_Q, float]]]) -> Any:
+        """Positional access to the (mapping, data) tuples or access to the data of a given mapping (most recent run)."""
+        if isinstance(item, (int, slice)):
+            return list(self._data.values())[item]
+        try:
+            return self._data[self._index[self.key(item)]][1]
+        except KeyError:
+            raise KeyError(item)
+
+    def __contains__(self, mapping: Mapping[str, Union[_Q, float]]) -> bool:
+        return self.key(mapping) in self._index
+
+    def __iter__(self) -> Iterator[Tuple[Mapping[str, Union[_Q, float]], Any]]:
+        return iter(list(self._data.values()))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return repr(list(self._data.values()))
+
+    @property
+    def mappings(self) -> List[Mapping[str, Union[_Q, float]]]:
+        """The mappings of the stored entries (oldest first)."""
+        return [m for m, _ in self._data.values()]
+
+    def clear(self):
+        """Remove all entries (without spilling them)."""
+        self._data.clear()
+        self._index.clear()
+
+
+def _shared_serialization(method):
+    """Decorator caching the serialization of a command for as long as its parameter store is shared with clones.
+
+    The cache is dropped as soon as the command is modified (any attribute, parameter or not, see `__setattr__`).
+
+    Only the outermost serialization method (the one of the actual class of the command) caches its result, so that
+    calls to the serialization of the parent classes are not affected.
+    """
+    @functools.wraps(method)
+    def wrapper(self):
+        cell = self.__dict__.get('_text')
+        if cell is None or type(self).__str__ is not wrapper:
+            return method(self)
+        if cell[0] is None:
+            cell[0] = method(self)
+        return cell[0]
+    return wrapper
+
+
 class CommandType(type):
     """
     Dark magic.
@@ -51,6 +290,10 @@ class CommandType(type):
         if 'post_init' in dct and len(bases) > 0:
             dct['_POST_INIT'] = [*getattr(bases[0], '_POST_INIT', {}), *dct['post_init'].__code__.co_varnames]
 
+        # Share the serialization of copy-on-write clones
+        if '__str__' in dct:
+            dct['__str__'] = _shared_serialization(dct['__str__'])
+
         # Add a default keyword
         if 'KEYWORD' not in dct:
             for b in bases:
@@ -78,6 +321,8 @@ class CommandType(type):
 
     def __init__(cls, name: str, bases: Tuple[type, ...], dct: Dict[str, Any]):
         super().__init__(name, bases, dct)
+        cls._SCHEMA = {k: ParameterSchema.compile(v) for k, v in cls.PARAMETERS.items()}
+        cls._DEFAULTS = {k: v.canonical(v.default, k) for k, v in cls._SCHEMA.items()}
         if cls.__doc__ is not None:
             cls.__doc__ = cls.__doc__.rstrip()
             cls.__doc__ += """
@@ -136,22 +381,24 @@ class Command(metaclass=CommandType):
             *params:
             **kwargs:
         """
-        self._output: List[Tuple[Mapping[str, Union[_Q, float]], List[str]]] = list()
-        self._results: List[Tuple[Mapping[str, Union[_Q, float]], _pd.DataFrame]] = list()
-        self._attributes = {}
-        for d in (Command.PARAMETERS, ) + params:
-            self._attributes = dict(self._attributes, **{k: v[0] for k, v in d.items()})
+        self._output: MappedResults = MappedResults()
+        self._results: MappedResults = MappedResults()
+        self._attributes = dict(self._DEFAULTS)
+        self._quantities: Dict[str, Any] = {}
+        for d in params:
+            for k, v in d.items():
+                self._set_parameter(k, v[0])
         for k, v in kwargs.items():
             if k not in self._POST_INIT:
                 setattr(self, k, v)
         if label1:
             if len(label1) > ZGOUBI_LABEL_LENGTH:
                 raise ZgoubidooException(f"LABEL1 '{label1}' for element {self.KEYWORD} is too long.")
-            self._attributes['LABEL1'] = label1
+            self._set_parameter('LABEL1', label1)
         if label2:
             if len(label2) > ZGOUBI_LABEL_LENGTH:
                 raise ZgoubidooException(f"LABEL2 '{label2}' for element {label1} ({self.KEYWORD}) is too long.")
-            self._attributes['LABEL2'] = label2
+            self._set_parameter('LABEL2', label2)
         if not self._attributes['LABEL1']:
             self.generate_label()
         Command.post_init(self, **kwargs)
@@ -165,7 +412,7 @@ class Command(metaclass=CommandType):
         Returns:
 
         """
-        self._attributes['LABEL1'] = '_'.join(filter(None, [
+        self._writable_attributes()['LABEL1'] = '_'.join(filter(None, [
             prefix,
             str(uuid.uuid4().hex)
         ]))[:ZGOUBI_LABEL_LENGTH]
@@ -182,17 +429,29 @@ class Command(metaclass=CommandType):
 
     def __getattr__(self, a: str) -> Any:
         """
-        TODO
+        Provides the value of a parameter of the command.
+
+        Parameters with units are stored internally as magnitudes in their canonical units (see `ParameterSchema`), the
+        corresponding Pint quantity is built once from the compiled schema and cached until the parameters are modified
+        (see `_writable_attributes`).
+
         Args:
-            a:
+            a: the name of the parameter
 
         Returns:
-
+            the value of the parameter (a Pint quantity for parameters with units), None if not defined.
         """
-        if self._attributes.get(a) is None:
+        quantity = self._quantities.get(a)
+        if quantity is not None:
+            return quantity
+        attr = self._attributes.get(a)
+        if attr is None:
             return None
-        attr = self._attributes[a]
-        if not isinstance(attr, str) and not isinstance(attr, _Q):
+        schema = self._SCHEMA.get(a)
+        if schema is not None and schema.units is not None:
+            quantity = self._quantities[a] = schema.quantity(attr)
+            return quantity
+        if not isinstance(attr, (str, _Q, _numbers.Number)):
             try:
                 _ = _Q(attr)
                 if _.dimensionless:
@@ -215,6 +474,9 @@ class Command(metaclass=CommandType):
         case the unit of the default value is implicitely used. This is useful in case it is known that the parameter's
         numerical value is expressed in Zgoubi's default units set.
 
+        The value is converted once to its canonical representation (magnitude in the units of the default value)
+        using the compiled schema of the command class.
+
         Examples:
             >>> c = Command()
             >>> c.LABEL1 = 'FOOBAR'
@@ -229,27 +491,43 @@ class Command(metaclass=CommandType):
         """
         if k.startswith('_') or not k.isupper():
             super().__setattr__(k, v)
+            self.__dict__.pop('_text', None)  # The serialization may depend on any attribute (e.g. `binary`)
         else:
             k_ = k.rstrip('_')
             if k_ not in self._attributes.keys():
                 raise ZgoubidooException(f"The parameter {k_} is not part of the {self.__class__.__name__} definition.")
+            self._set_parameter(k_, v, canonical=k.endswith('_') and isinstance(v, _numbers.Number))
 
-            default = self._retrieve_default_parameter_value(k_)
-            if isinstance(v, (int, float)) and k.endswith('_'):
-                v = _ureg.Quantity(v, _ureg.Quantity(default).units)
-            try:
-                dimension = v.dimensionality
-            except AttributeError:
-                dimension = _ureg.Quantity(1).dimensionality  # No dimension
-            try:
-                if default is not None and dimension != _ureg.Quantity(default).dimensionality:
-                    raise ZgoubidooException(f"Invalid dimension ({dimension} "
-                                             f"instead of {_ureg.Quantity(default).dimensionality}) "
-                                             f"for parameter {k_}={v}."
-                                             )
-            except (ValueError, TypeError, _UndefinedUnitError):
-                pass
-            self._attributes[k_] = v
+    def _set_parameter(self, k: str, v: Any, canonical: bool = False):
+        """Store the value of a parameter in its canonical representation (see `ParameterSchema`).
+
+        Args:
+            k: the name of the parameter
+            v: the value of the parameter
+            canonical: True if the value is already expressed in the canonical units
+        """
+        schema = self._SCHEMA.get(k)
+        if schema is not None and v is schema.default:
+            v = self._DEFAULTS[k]
+        elif not canonical:
+            v = (schema or ParameterSchema.compile(self._attributes.get(k))).canonical(v, k)
+        self._writable_attributes()[k] = v
+
+    def _writable_attributes(self) -> Dict[str, Any]:
+        """Provides the parameter store of the command, ready to be modified.
+
+        If the store is shared with clones (see `clone`) it is copied first (copy-on-write). The cached quantities (see
+        `__getattr__`) are invalidated.
+
+        Returns:
+            the (not shared) parameter store of the command.
+        """
+        if self.__dict__.get('_shared', False):
+            self.__dict__['_attributes'] = dict(self._attributes)
+            self.__dict__['_shared'] = False
+            self.__dict__.pop('_text', None)
+        self._quantities.clear()
+        return self._attributes
 
     def _retrieve_default_parameter_value(self, k: str) -> Any:
         """
@@ -262,9 +540,9 @@ class Command(metaclass=CommandType):
             the default value of the Command's parameter 'k'.
         """
         try:
-            return self.PARAMETERS[k][0]
-        except (TypeError, IndexError):
-            return self.PARAMETERS[k]
+            return self._SCHEMA[k].default
+        except KeyError:
+            return ParameterSchema.compile(self.PARAMETERS[k]).default
 
     def __repr__(self) -> str:
         return str(self)
@@ -295,6 +573,34 @@ class Command(metaclass=CommandType):
             label1 = str(uuid.uuid4().hex)[:ZGOUBI_LABEL_LENGTH]
         return self.__class__(label1=label1, label2=self.LABEL2, **self.attributes)
 
+    def clone(self) -> Command:
+        """Lightweight copy-on-write clone of the command.
+
+        Contrary to `copy.copy` the initializer is not called again and the label is preserved: the clone shares the
+        parameter store of the command (and its serialization) until either of them is modified. This is well suited
+        for periodic structures made of a large number of identical elements.
+
+        Returns:
+            a clone of the command.
+
+        Examples:
+            >>> c1 = Command('FOO')
+            >>> c2 = c1.clone()
+            >>> c2._attributes is c1._attributes
+            True
+            >>> c2.LABEL2 = 'BAR'
+            >>> c1.LABEL2, c2.LABEL2
+            ('', 'BAR')
+        """
+        self.__dict__['_shared'] = True
+        self.__dict__.setdefault('_text', [None])
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone.__dict__['_quantities'] = dict(self._quantities)
+        clone.__dict__['_output'] = MappedResults(self._output.retention, self._output.spill, self._output.replace)
+        clone.__dict__['_results'] = MappedResults(self._results.retention, self._results.spill, self._results.replace)
+        return clone
+
     @property
     def attributes(self) -> Dict[str, _ureg.Quantity]:
         """All attributes.
@@ -304,7 +610,7 @@ class Command(metaclass=CommandType):
         Returns: dictionnary with all attributes.
 
         """
-        return self._attributes
+        return {k: Command.__getattr__(self, k) for k in self._attributes.keys()}
 
     @property
     def defaults(self) -> Dict[str, _ureg.Quantity]:
@@ -314,7 +620,7 @@ class Command(metaclass=CommandType):
 
         Returns: dictionary with all default attributes.
         """
-        return {k: v for k, v in self._attributes.items() if v == self.PARAMETERS.get(k)[0]}
+        return {k: Command.__getattr__(self, k) for k, v in self._attributes.items() if v == self._DEFAULTS.get(k)}
 
     @property
     def nondefaults(self) -> Dict[str, _ureg.Quantity]:
@@ -324,28 +630,80 @@ class Command(metaclass=CommandType):
 
         Returns: dictionary with all non default attributes.
         """
-        return {k: v for k, v in self._attributes.items() if v != self.PARAMETERS.get(k)[0]}
+        return {k: Command.__getattr__(self, k) for k, v in self._attributes.items() if v != self._DEFAULTS.get(k)}
 
     @property
-    def output(self) -> List[Tuple[Mapping[str, Union[_Q, float]], List[str]]]:
+    def output(self) -> MappedResults:
         """
         Provides the outputs associated with a command after each successive Zgoubi run.
 
         Returns:
-            the output, None if no output has been previously attached.
+            the outputs (lists of lines) indexed by mapping.
         """
         return self._output
 
     @property
-    def results(self) -> List[Tuple[Mapping[str, Union[_Q, float]], _pd.DataFrame]]:
+    def results(self) -> MappedResults:
         """
         Provides the results of a Zgoubi command in the form of a Pandas DataFrame.
 
         Returns:
-            the results, None if not available, a DataFrame otherwise.
+            the results (Pandas DataFrames) indexed by mapping.
         """
         return self._results
 
+    def retain(self,
+               retention: Optional[int] = ...,
+               spill: Optional[Callable[[Mapping[str, Union[_Q, float]], Any], None]] = ...,
+               output_retention: Optional[int] = ...,
+               replace: bool = ...,
+               ) -> Command:
+        """Set the retention policy for the outputs and results attached to the command after each Zgoubi run.
+
+        By default all outputs and results are kept, which makes the memory grow when the same `Input` is run
+        repeatedly (sweeps, fits, etc.). Only the arguments which are provided are modified.
+
+        Args:
+            retention: the number of results to keep (the most recent ones, None for no limit, 0 to keep none).
+            spill: callback called with the mapping and the results evicted from the store (None for no callback).
+            output_retention: the number of raw outputs (lines of the '.res' file) to keep (None for no limit).
+            replace: replace the outputs and results of a previous run with the same mapping (see `MappedResults`).
+
+        Returns:
+            the command itself (to allow method chaining).
+
+        Examples:
+            >>> c = Command().retain(1)
+            >>> c.results.retention, c.output.retention
+            (1, None)
+        """
+        if retention is not ...:
+            self._results.retention = retention
+        if spill is not ...:
+            self._results.spill = spill
+        if output_retention is not ...:
+            self._output.retention = output_retention
+        if replace is not ...:
+            self._results.replace = self._output.replace = replace
+        self._results.evict()
+        self._output.evict()
+        return self
+
+    def get_tracks(self, results: zgoubidoo.ZgoubiResults, **selection) -> _pd.DataFrame:
+        """Provides the tracks through the command (selected by its LABEL1) from the results of Zgoubi runs.
+
+        Only the lines of the tracking output files corresponding to the command are read, using the byte-offset index
+        of the files (see `zgoubidoo.output.OutputIndex`).
+
+        Args:
+            results: the results of the Zgoubi runs
+            selection: additional selection of the columns and of the lines (see `ZgoubiResults.iter_tracks`)
+
+        Returns:
+            a DataFrame with the tracks through the command.
+        """
+        return results.get_tracks(labels=self.LABEL1, index=True, **selection)
+
     def attach_output(self,
                       outputs: List[str],
                       parameters: Mapping[str, Union[_Q, float]],
@@ -715,14 +1073,18 @@ class FaiStore(Command):
         'FNAME': ('zgoubi.fai', 'Storage file name.'),
         'LABELS': ('ALL', 'Label(s) of the element(s) at the exit of which the storage occurs (10 labels maximum).'),
         'IP': (1, 'Store every IP other pass (when using REBELOTE with NPASS ≥ IP − 1).'),
+        'binary': (False, "Binary storage format (the file name is then prefixed with 'b_')."),
     }
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
 
     def __str__(self):
+        fname = self.FNAME
+        if self.binary and not fname.lower().startswith('b_'):
+            fname = f"b_{fname}"
         return f"""
         {super().__str__().rstrip()}
-        {self.FNAME}
+        {fname}
         {self.IP}
         """
 
@@ -810,8 +1172,36 @@ class Fit(Command, metaclass=FitType):
         pass
 
     class FirstOrderTransportCoefficientsConstraint(Constraint):
-        """Constraint on the coefficients of the transfer matrix."""
-        pass
+        """Constraint on the coefficients of the transfer matrix.
+
+        The coefficients follow the Zgoubi numbering of the coordinates (Y, T, Z, P, S, D), in MKSA units; the matrix is
+        computed from the beginning of the line, which requires an appropriate object (e.g. `Objet5`).
+        """
+        def __init__(self,
+                     line: zgoubidoo.Input,
+                     place: Union[str, Command],
+                     i: int,
+                     j: int,
+                     value: float = 0.0,
+                     weight: float = 1.0,
+                     ):
+            """
+
+            Args:
+                line:
+                place:
+                i: row of the coefficient (1 to 6)
+                j: column of the coefficient (1 to 6)
+                value:
+                weight:
+            """
+            self.IC: float = 1
+            self.I: int = i
+            self.J: int = j
+            self.IR: int = line.index(place)
+            self.V: float = value
+            self.WV: float = weight
+            self.NP: int = 0
 
     class SecondOrderTransportCoefficientsConstraint(Constraint):
         """Constraint on the coefficients of the second-order transport tensor."""
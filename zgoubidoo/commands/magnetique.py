@@ -771,10 +771,10 @@ class Bend(CartesianMagnet):
         return f"""
         {super().__str__().rstrip()}
         {int(s.IL):d}
-        {s.XL.to('cm').magnitude:.12e} {s.SK.to('radian').magnitude:.12e} {_kilogauss(s.B1):.12e}
-        {s.X_E.to('cm').magnitude:.12e} {s.LAM_E.to('cm').magnitude:.12e} {s.W_E.to('radian').magnitude:.12e}
+        {_cm(s.XL):.12e} {_radian(s.SK):.12e} {_kilogauss(s.B1):.12e}
+        {_cm(s.X_E):.12e} {_cm(s.LAM_E):.12e} {_radian(s.W_E):.12e}
         6 {s.C0_E:.12e} {s.C1_E:.12e} {s.C2_E:.12e} {s.C3_E:.12e} {s.C4_E:.12e} {s.C5_E:.12e}
-        {s.X_S.to('cm').magnitude:.12e} {s.LAM_S.to('cm').magnitude:.12e} {s.W_S.to('radian').magnitude:.12e}
+        {_cm(s.X_S):.12e} {_cm(s.LAM_S):.12e} {_radian(s.W_S):.12e}
         6 {s.C0_S:.12e} {s.C1_S:.12e} {s.C2_S:.12e} {s.C3_S:.12e} {s.C4_S:.12e} {s.C5_S:.12e}
         {_cm(s.XPAS):.12e}
         {int(s.KPOS):d} {_cm(s.XCE):.12e} {_cm(s.YCE):.12e} {_radian(s.ALE):.12e}
@@ -1214,7 +1214,7 @@ class DipoleM(PolarMagnet):
             {super().__str__().rstrip()}
             {s.NFACE} {s.IC} {s.IL}
             {s.IAMAX} {s.IRMAX}
-            {s.B0.to('kilogauss').magnitude:.12e} {s.N:.12e} {s.B:.12e} {s.G:.12e}
+            {_kilogauss(s.B0):.12e} {s.N:.12e} {s.B:.12e} {s.G:.12e}
             {s.AT:.12e} {s.ACENT:.12e} {s.RM:.12e} {s.RMIN:.12e} {s.RMAX:.12e}
             {s.LAM_E:.12e} {s.XI_E:.12e}
             {s.NCE} {s.C0_E:.12e} {s.C1_E:.12e} {s.C2_E:.12e} {s.C3_E:.12e} {s.C4_E:.12e} {s.C5_E:.12e} {s.SHIFT_E:.12e}
@@ -1460,10 +1460,10 @@ class Dodecapole(CartesianMagnet):
         return f"""
         {super().__str__().rstrip()}
         {s.IL}
-        {_cm(s.XL):.12e} {_cm(s.R0):.12e} {s.B0.to('kilogauss').magnitude:.12e}
-        {s.XE.to('centimeter').magnitude:.12e} {s.LAM_E.to('centimeter').magnitude:.12e}
+        {_cm(s.XL):.12e} {_cm(s.R0):.12e} {_kilogauss(s.B0):.12e}
+        {_cm(s.XE):.12e} {_cm(s.LAM_E):.12e}
         6 {s.C0:.12e} {s.C1:.12e} {s.C2:.12e} {s.C3:.12e} {s.C4:.12e} {s.C5:.12e}
-        {s.XS.to('centimeter').magnitude:.12e} {s.LAM_S.to('centimeter').magnitude:.12e}
+        {_cm(s.XS):.12e} {_cm(s.LAM_S):.12e}
         6 {s.C0:.12e} {s.C1:.12e} {s.C2:.12e} {s.C3:.12e} {s.C4:.12e} {s.C5:.12e}
         {_cm(s.XPAS)}
         {s.KPOS} {_cm(s.XCE):.12e} {_cm(s.YCE):.12e} {_radian(s.ALE):.12e}
@@ -2094,10 +2094,10 @@ class Quadrupole(CartesianMagnet):
     """Keyword of the command used for the Zgoubi input data."""
 
     PARAMETERS = {
-        'IL': (2, 'Print field and coordinates along trajectories'),
-        'XL': (0 * _ureg.centimeter, 'Magnet length'),
-        'R0': (1.0 * _ureg.centimeter, 'Radius of the pole tips'),
-        'B0': (0 * _ureg.kilogauss, 'Field at pole tips'),
+        'IL': (2, 'Print field and coordinates along trajectories', 1),
+        'XL': (0 * _ureg.centimeter, 'Magnet length', 10),
+        'R0': (1.0 * _ureg.centimeter, 'Radius of the pole tips', 11),
+        'B0': (0 * _ureg.kilogauss, 'Field at pole tips', 12),
         'XE': (0 * _ureg.centimeter, 'Entrance face integration zone for the fringe field'),
         'LAM_E': (0 * _ureg.centimeter, 'Entrance face fringe field extent'),
         'C0_E': 0,
@@ -19,6 +19,7 @@ from .commands import Command as _Command
 from .commands import CommandType as _CommandType
 from .commands import ZgoubidooException as _ZgoubidooException
 from .. import ureg as _ureg
+from ..units import _cm, _mrad, _kilogauss_cm
 
 
 class ObjetType(_CommandType):
@@ -41,7 +42,7 @@ class Objet(_Command, metaclass=ObjetType):
     def __str__(s):
         return f"""
         {super().__str__().rstrip()}
-        {s.BORO.to("kilogauss * cm").magnitude:.12e}
+        {_kilogauss_cm(s.BORO):.12e}
         """
 
     def __init__(self, label1='', label2='', *params, **kwargs):
@@ -78,8 +79,8 @@ class Objet1(Objet):
         {super().__str__().rstrip()}
         {s.KOBJ}.0{s.K2}
         {s.IY} {s.IT} {s.IZ} {s.IP} {s.IX} {s.ID}
-        {s.PY.to('centimeter').magnitude:.12e} {s.PT.to('milliradian').magnitude:.12e} {s.PZ.to('centimeter').magnitude:.12e} {s.PP.to('milliradian').magnitude:.12e} {s.PX.to('centimeter').magnitude:.12e} {s.PD:.12e}
-        {s.YR.to('centimeter').magnitude:.12e} {s.TR.to('milliradian').magnitude:.12e} {s.ZR.to('centimeter').magnitude:.12e} {s.PR.to('milliradian').magnitude:.12e} {s.XR.to('centimeter').magnitude:.12e} {s.DR:.12e}
+        {_cm(s.PY):.12e} {_mrad(s.PT):.12e} {_cm(s.PZ):.12e} {_mrad(s.PP):.12e} {_cm(s.PX):.12e} {s.PD:.12e}
+        {_cm(s.YR):.12e} {_mrad(s.TR):.12e} {_cm(s.ZR):.12e} {_mrad(s.PR):.12e} {_cm(s.XR):.12e} {s.DR:.12e}
         """
 
 
@@ -109,14 +110,11 @@ class Objet2(Objet):
     def post_init(self, **kwargs):
         """Post initialization routine."""
         self._PARTICULES = None
+        self._IMAX = 0
 
     @property
     def IMAX(self):
-        """
-
-        Returns:
-
-        """
+        """Number of particles in the objet."""
         return self.PARTICULES.shape[0]
 
     @property
@@ -130,44 +128,66 @@ class Objet2(Objet):
 
     @property
     def PARTICULES(self):
-        """The particles list."""
-        if isinstance(self._PARTICULES, list):
-            self._PARTICULES = _np.array(self._PARTICULES).reshape(1, 7)
-        if self._PARTICULES is None:
-            self._PARTICULES = _np.zeros((1, 7))
-            self._PARTICULES[:, 5] = 1.0  # D = 1
-            self._PARTICULES[:, 6] = 1.0  # IEX
-        return self._PARTICULES
+        """The particles list (a view on the particles buffer).
+
+        A single reference particle is provided if no particle has been added.
+        """
+        if self._PARTICULES is None or self._IMAX == 0:
+            p = _np.zeros((1, 7))
+            p[:, 5] = 1.0  # D = 1
+            p[:, 6] = 1.0  # IEX
+            return p
+        return self._PARTICULES[:self._IMAX]
 
     def clear(self):
         """Reset the object's content, remove all particles."""
         self._PARTICULES = None
+        self._IMAX = 0
+        self._particules_shared = False
         return self
 
+    def clone(self) -> 'Objet2':
+        """Copy-on-write clone of the objet (see `Command.clone`), the particles buffer is shared until either of the
+        objets adds particles."""
+        self.__dict__['_particules_shared'] = True
+        return super().clone()
+
     def __iadd__(self, other):
         self.add(other)
         return self
 
     def add(self, p):
-        """
+        """Add particles to the objet.
+
+        The particles are appended to a growable buffer (its capacity is doubled when needed), so that adding particles
+        one by one has an amortized constant cost.
 
         Args:
-            p:
+            p: the particles, either as an array-like of shape (n, 7) (Y, T, Z, P, X, D, IEX) or as a DataFrame with
+               columns Y, T, Z, P, D (D being the momentum offset).
 
         Returns:
-
+            the objet itself (to allow method chaining).
         """
-        if self._PARTICULES is None:
-            if not hasattr(p, 'columns'):
-                self._PARTICULES = p
-            elif list(p.columns) == ['Y', 'T', 'Z', 'P', 'D']:
-                p = p.copy()
-                p['X'] = 0.0
-                p['IEX'] = 1.0
-                p['D'] += 1.0
-                self._PARTICULES = p[['Y', 'T', 'Z', 'P', 'X', 'D', 'IEX']].values
-        else:
-            self._PARTICULES = _np.append(self._PARTICULES, p, axis=0)
+        if hasattr(p, 'columns') and list(p.columns) == ['Y', 'T', 'Z', 'P', 'D']:
+            p = p.copy()
+            p['X'] = 0.0
+            p['IEX'] = 1.0
+            p['D'] += 1.0
+            p = p[['Y', 'T', 'Z', 'P', 'X', 'D', 'IEX']]
+        p = _np.asarray(p, dtype=float).reshape(-1, 7)
+        if self.__dict__.get('_particules_shared', False):  # Copy-on-write clones must not share the buffer
+            if self._PARTICULES is not None:
+                self._PARTICULES = self._PARTICULES[:self._IMAX].copy()
+            self._particules_shared = False
+        n = self._IMAX + p.shape[0]
+        if self._PARTICULES is None or n > self._PARTICULES.shape[0]:
+            buffer = _np.empty((max(n, 2 * self._IMAX), 7))
+            if self._IMAX > 0:
+                buffer[:self._IMAX] = self._PARTICULES[:self._IMAX]
+            self._PARTICULES = buffer
+        self._PARTICULES[self._IMAX:n] = p
+        self._IMAX = n
         return self
 
     def __str__(s) -> str:
@@ -176,11 +196,9 @@ class Objet2(Objet):
         {s.KOBJ}.0{s.K2}
         {s.IMAX} {s.IDMAX}
         """
-        for p in s.PARTICULES[:, 0:6]:
-            c += f"""
-        {p[0]:.12e} {p[1]:.12e} {p[2]:.12e} {p[3]:.12e} {p[4]:.12e} {p[5]:.12e} A
-        """.lstrip()
-        c += " ".join(map(lambda x: f"{int(x):d}", s.IEX)) + "\n"
+        particules = s.PARTICULES
+        c += ("%.12e %.12e %.12e %.12e %.12e %.12e A\n        " * particules.shape[0]) % tuple(particules[:, 0:6].ravel())
+        c += " ".join(["%d"] * particules.shape[0]) % tuple(particules[:, 6]) + "\n"
         return c
 
 
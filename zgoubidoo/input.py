@@ -9,17 +9,20 @@ to provide a parametric mapping (combinations of the variations of one or more p
 input files.
 """
 from __future__ import annotations
-from typing import Callable, Sequence, Mapping, Union, List, Tuple
+from typing import Any, Callable, Dict, Optional, Sequence, Mapping, Union, List, Tuple
 from dataclasses import dataclass, field
 import itertools
 from functools import partial, reduce
 import tempfile
 import logging
 import os
+import numpy as _np
 import pandas as _pd
 import parse as _parse
+from pint import DimensionalityError as _DimensionalityError
 from . import ureg as _ureg
 from . import _Q
+from .units import conversion_factor as _conversion_factor
 from .commands import *
 from .frame import Frame as _Frame
 import zgoubidoo.commands
@@ -119,6 +122,143 @@ class ParametricMapping:
         return self
 
 
+class InputTable:
+    """Columnar view of the numerical parameters of the commands of an input sequence.
+
+    The table is a snapshot of the (canonical) parameter values of the commands, taken when the table is created. Each
+    numerical parameter is exposed as a column of a `pandas.DataFrame` (one row per command, in the order of the input
+    sequence); commands that do not have a given parameter have a `NaN` value in that column. The values are expressed
+    in the units of the column (see `units`), which are the canonical units of the parameter.
+
+    Assigning a column (or a subset of its rows) converts the values in one vectorized operation and writes them back
+    to the commands in a single pass, bypassing the per-command dimensional analysis.
+
+    Examples:
+        >>> from zgoubidoo.commands import Quadrupole, Drift
+        >>> zi = Input(line=[Quadrupole('Q1', XL=1 * _ureg.m), Quadrupole('Q2', XL=1 * _ureg.m), Drift('D1')])
+        >>> t = zi.table
+        >>> t['B0'] = [1.0, 2.0, 3.0] * _ureg.tesla
+        >>> zi.Q2.B0
+        <Quantity(20.0, 'kilogauss')>
+        >>> t[t.frame['CLASS'] == 'Quadrupole', 'XL'] *= 2
+        >>> zi.Q1.XL
+        <Quantity(200.0, 'centimeter')>
+    """
+
+    def __init__(self, line: List[commands.Command]):
+        """
+        Args:
+            line: the sequence of commands.
+        """
+        self._line: List[commands.Command] = line
+        self._units: Dict[str, _ureg.Unit] = {}
+        self._factors: Dict[str, _np.ndarray] = {}
+        columns: Dict[str, List[float]] = {}
+        class_factors: Dict[Tuple[type, str], float] = {}
+        n = len(line)
+        for i, e in enumerate(line):
+            for k, v in e._attributes.items():
+                if v.__class__ is bool or not isinstance(v, (float, int, _np.number)):
+                    continue
+                if k not in columns:
+                    columns[k] = [_np.nan] * n
+                    self._factors[k] = _np.full(n, _np.nan)
+                    self._units[k] = self._schema_units(e, k)
+                try:
+                    factor = class_factors[(e.__class__, k)]
+                except KeyError:
+                    factor = class_factors[(e.__class__, k)] = self._factor(self._units[k], self._schema_units(e, k))
+                self._factors[k][i] = factor
+                columns[k][i] = v / factor
+        self._frame = _pd.DataFrame(columns, index=_pd.RangeIndex(n))
+        self._frame.insert(0, 'LABEL1', [e.LABEL1 for e in line])
+        self._frame.insert(1, 'CLASS', [e.__class__.__name__ for e in line])
+
+    @staticmethod
+    def _schema_units(command: commands.Command, key: str) -> Optional[_ureg.Unit]:
+        schema = command._SCHEMA.get(key)
+        return schema.units if schema is not None else None
+
+    @staticmethod
+    def _factor(src: Optional[_ureg.Unit], dst: Optional[_ureg.Unit]) -> float:
+        if src is None or dst is None or src == dst:
+            return 1.0
+        return _conversion_factor(src, dst)
+
+    @property
+    def frame(self) -> _pd.DataFrame:
+        """The parameters as a `DataFrame` (magnitudes in the units of each column)."""
+        return self._frame
+
+    @property
+    def units(self) -> Dict[str, Optional[_ureg.Unit]]:
+        """Units of each parameter column (None for parameters without units)."""
+        return self._units
+
+    def __len__(self) -> int:
+        return len(self._frame)
+
+    def __getitem__(self, key: Union[str, Tuple[Any, str]]) -> _pd.Series:
+        """Column access, or access to a subset of the rows of a column (magnitudes in the units of the column)."""
+        if isinstance(key, tuple):
+            return self._frame.loc[key]
+        return self._frame[key]
+
+    def __setitem__(self, key: Union[str, Tuple[Any, str]], value: Any):
+        """Vectorized assignment of a column, or of a subset of the rows of a column.
+
+        Args:
+            key: a column name or a tuple (rows, column) where rows is any row selector accepted by `DataFrame.loc`.
+            value: the new values (scalar or array-like, possibly a Pint quantity).
+
+        Raises:
+            ZgoubiInputException if the column does not exist or the values have invalid dimensions.
+        """
+        rows, column = key if isinstance(key, tuple) else (slice(None), key)
+        if column not in self._units:
+            raise ZgoubiInputException(f"Parameter {column} is not a numerical parameter of the input sequence.")
+        if isinstance(value, _Q):
+            if self._units[column] is None:
+                raise ZgoubiInputException(f"Parameter {column} has no units (got {value.units}).")
+            try:
+                value = value.magnitude * _conversion_factor(value.units, self._units[column])
+            except _DimensionalityError:
+                raise ZgoubiInputException(f"Invalid dimension ({value.dimensionality}) for parameter {column}.")
+        index = self._frame.loc[rows, column].index.values
+        self._frame.loc[rows, column] = value
+        self._frame.loc[_np.isnan(self._factors[column]), column] = _np.nan
+        self._write(column, index)
+
+    def _write(self, column: str, index: _np.ndarray):
+        """Write back the values of a column to the commands (single pass over the selected rows).
+
+        The values are cast back to the type of the parameter default value (integer parameters such as IL or KPOS are
+        stored as integers).
+        """
+        values = self._frame[column].values[index] * self._factors[column][index]
+        for i, v in zip(index, values):
+            if not _np.isnan(v):
+                command = self._line[i]
+                default = command._DEFAULTS.get(column, command._attributes.get(column))
+                if isinstance(default, (int, _np.integer)) and not isinstance(default, bool):
+                    command._writable_attributes()[column] = int(round(v))
+                else:
+                    command._writable_attributes()[column] = float(v)
+
+    def update(self, frame: _pd.DataFrame) -> InputTable:
+        """Bulk update from another `DataFrame` (aligned on the index, in the units of the columns).
+
+        Args:
+            frame: a `DataFrame` with (a subset of) the columns and rows of the table.
+
+        Returns:
+            the table itself (in-place operation).
+        """
+        for column in frame.columns:
+            self[frame.index, column] = frame[column].values
+        return self
+
+
 class Input:
     """Main class interfacing Zgoubi input files data structure.
 
@@ -394,6 +534,58 @@ class Input:
         self._line = list(map(f, self._line))
         return self
 
+    def retain(self,
+               retention: Optional[int] = ...,
+               spill: Optional[Callable[[Mapping[str, Union[_Q, float]], Any], None]] = ...,
+               output_retention: Optional[int] = ...,
+               replace: bool = ...,
+               ) -> Input:
+        """Set the retention policy of the outputs and results of all the commands of the input sequence.
+
+        Only the arguments which are provided are modified (see `Command.retain`).
+
+        Args:
+            retention: the number of results to keep for each command (None for no limit, 0 to keep none).
+            spill: callback called with the mapping and the results evicted from the store of any command (e.g. to save
+                   them in a results store).
+            output_retention: the number of raw outputs to keep for each command (None for no limit).
+            replace: replace the outputs and results of a previous run with the same mapping.
+
+        Returns:
+            the input sequence (in place operation).
+        """
+        for e in self._line:
+            e.retain(retention, spill, output_retention, replace)
+        return self
+
+    def binary_output(self, binary: bool = True) -> Input:
+        """Request the binary (or text) storage format for the beam files written by the input sequence.
+
+        The binary files (e.g. b_zgoubi.fai) are smaller and faster to write than their text counterparts, they are read
+        with `read_binary_fai_file` and provide the same DataFrames as the text files.
+
+        Note:
+            only the beam storage commands (`Faiscnl`, `FaiStore`) are switched: the format of the step-by-step tracks
+            (zgoubi.plt) is not selected from the input data. The tracks are read from b_zgoubi.plt (see
+            `read_binary_plt_file`) whenever Zgoubi writes that file.
+
+        Examples:
+            >>> from zgoubidoo.commands import Faiscnl
+            >>> zi = Input(line=[Faiscnl('STORE')])
+            >>> zi.binary_output().STORE.binary
+            True
+
+        Args:
+            binary: True for binary storage, False for text storage.
+
+        Returns:
+            the input sequence (in place operation).
+        """
+        for e in self._line:
+            if isinstance(e, (commands.Faiscnl, commands.FaiStore)):
+                e.binary = binary
+        return self
+
     def cleanup(self):
         """Cleanup temporary paths.
 
@@ -543,6 +735,16 @@ class Input:
         """
         return self._line
 
+    @property
+    def table(self) -> InputTable:
+        """Columnar view of the numerical parameters of the commands of the input sequence.
+
+        Returns:
+            an `InputTable` built from the current state of the commands; writes to the table are propagated to
+            the commands.
+        """
+        return InputTable(self._line)
+
     @property
     def optical_length(self) -> _Q:
         """
@@ -0,0 +1,495 @@
+"""Linear optics model computed directly from the commands' parameters (without ray-tracing).
+
+The first-order (6x6) transfer matrices of the most common elements are built from their parameters and from the
+kinematics of the reference particle (hard-edge model): drifts, quadrupoles, bends (`Bend`, `Dipole`), the linear part of
+multipoles and `ChangRef` frame transformations. They are composed along the beamline (optionally slicing the elements)
+to provide a step-by-step transfer matrix with the same structure as the one obtained from tracking data (see
+`zgoubidoo.twiss.compute_transfer_matrix`), so that all the functions of `zgoubidoo.twiss` can be used on it.
+
+The model is well suited for fast surrogate evaluations, for example to explore a large number of configurations (see
+`LinearOptics.scan`) before using Zgoubi.
+
+The coordinates are (Y, T, Z, P, D, L), in SI units, D being the relative momentum offset and L the path length
+difference.
+
+Example:
+    >>> import zgoubidoo
+    >>> from zgoubidoo.commands import Drift, Quadrupole
+    >>> _ = zgoubidoo.ureg
+    >>> line = [Quadrupole('QF', XL=20 * _.cm, B0=0.5 * _.kilogauss, R0=10 * _.cm), Drift('D1', XL=1 * _.m),
+    ...         Quadrupole('QD', XL=20 * _.cm, B0=-0.5 * _.kilogauss, R0=10 * _.cm), Drift('D2', XL=1 * _.m)]
+    >>> optics = LinearOptics(line, zgoubidoo.Kinematics(230 * _.MeV, kinetic=True), slices=10)
+    >>> optics.twiss()['BETA11'].max() > 0
+    True
+"""
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Union
+from dataclasses import dataclass, fields
+import logging
+import numpy as _np
+import pandas as _pd
+from . import ureg as _ureg
+from . import _Q
+from . import commands as _commands
+from .kinematics import Kinematics as _Kinematics
+from .input import Input as _Input
+from .input import MappedParametersListType as _MappedParametersListType
+from .twiss import compute_twiss as _compute_twiss
+from .twiss import compute_twiss_batch as _compute_twiss_batch
+from .zgoubi import Zgoubi as _Zgoubi
+
+__all__ = ['ZgoubidooOpticsException', 'LinearElement', 'LINEAR_MODELS', 'LinearOptics', 'match']
+
+_logger = logging.getLogger(__name__)
+
+
+class ZgoubidooOpticsException(Exception):
+    """Exception raised for errors in the linear optics model."""
+
+    def __init__(self, m):
+        self.message = m
+
+
+@dataclass
+class LinearElement:
+    """Hard-edge linear model of an element: a combined-function sector body with edges, possibly rolled.
+
+    The fields are floats (or arrays of floats, one value per mapping, for the vectorized evaluation of parametric
+    scans).
+    """
+    length: float = 0.0
+    """Length of the element along the reference trajectory (m)."""
+
+    h: float = 0.0
+    """Curvature of the reference trajectory (1/m)."""
+
+    kx: float = 0.0
+    """Horizontal focusing strength (1/m^2), including the weak focusing of the bends."""
+
+    ky: float = 0.0
+    """Vertical focusing strength (1/m^2)."""
+
+    e1: float = 0.0
+    """Entrance edge angle (rad)."""
+
+    e2: float = 0.0
+    """Exit edge angle (rad)."""
+
+    roll: float = 0.0
+    """Roll angle of the element around the longitudinal axis (rad)."""
+
+    frame_roll: float = 0.0
+    """Roll angle of the reference frame at the exit of the element (rad)."""
+
+    def matrices(self, slices: int = 1) -> _np.ndarray:
+        """Cumulative transfer matrices of the element at the end of each of its slices.
+
+        Args:
+            slices: the number of slices (a single slice is used for zero-length elements)
+
+        Returns:
+            an array of shape (mapping, slice, 6, 6), with a single mapping if the fields are floats.
+        """
+        p = {f.name: _np.atleast_1d(_np.asarray(getattr(self, f.name), dtype=float)) for f in fields(self)}
+        n_mappings = max(len(v) for v in p.values())
+        p = {k: _np.broadcast_to(v, (n_mappings, ))[:, None] for k, v in p.items()}
+        slices = slices if _np.any(p['length'] > 0) else 1
+        s = p['length'] * _np.arange(1, slices + 1) / slices
+        h, kx, ky = p['h'], p['kx'], p['ky']
+        cx, sx = _principal_trajectories(kx, s)
+        cy, sy = _principal_trajectories(ky, s)
+        dx = _np.where(kx == 0, s ** 2 / 2, (1 - cx) / _np.where(kx == 0, 1, kx))
+        ix = _np.where(kx == 0, s ** 3 / 6, (s - sx) / _np.where(kx == 0, 1, kx))
+        r = _np.zeros(s.shape + (6, 6))
+        r[..., 0, 0] = cx
+        r[..., 0, 1] = sx
+        r[..., 1, 0] = -kx * sx
+        r[..., 1, 1] = cx
+        r[..., 0, 4] = h * dx
+        r[..., 1, 4] = h * sx
+        r[..., 2, 2] = cy
+        r[..., 2, 3] = sy
+        r[..., 3, 2] = -ky * sy
+        r[..., 3, 3] = cy
+        r[..., 4, 4] = 1.0
+        r[..., 5, 5] = 1.0
+        r[..., 5, 0] = h * sx
+        r[..., 5, 1] = h * dx
+        r[..., 5, 4] = h ** 2 * ix
+        r = r @ _edge(h[:, 0], p['e1'][:, 0])[:, None]
+        r[:, -1] = _edge(h[:, 0], p['e2'][:, 0]) @ r[:, -1]
+        rotation = _rotation(p['roll'][:, 0])[:, None]
+        r = _np.swapaxes(rotation, -1, -2) @ r @ rotation
+        return _rotation(p['frame_roll'][:, 0])[:, None] @ r
+
+
+def _principal_trajectories(k: _np.ndarray, s: _np.ndarray):
+    """Cosine-like and sine-like principal trajectories for a focusing strength k (focusing or defocusing)."""
+    sqrt_k = _np.sqrt(k.astype(complex))
+    c = _np.cos(sqrt_k * s).real
+    sn = _np.where(k == 0, s, (_np.sin(sqrt_k * s) / _np.where(k == 0, 1, sqrt_k)).real)
+    return c, sn
+
+
+def _edge(h: _np.ndarray, angle: _np.ndarray) -> _np.ndarray:
+    """Hard-edge focusing of a bend's face (thin lens), for arrays of curvatures and edge angles."""
+    r = _np.tile(_np.identity(6), (len(h), 1, 1))
+    r[:, 1, 0] = h * _np.tan(angle)
+    r[:, 3, 2] = -h * _np.tan(angle)
+    return r
+
+
+def _rotation(angle: _np.ndarray) -> _np.ndarray:
+    """Rotation of the transverse coordinates around the longitudinal axis, for an array of angles."""
+    c, s = _np.cos(angle), _np.sin(angle)
+    r = _np.tile(_np.identity(6), (len(angle), 1, 1))
+    r[:, 0, 0] = r[:, 1, 1] = r[:, 2, 2] = r[:, 3, 3] = c
+    r[:, 0, 2] = r[:, 1, 3] = s
+    r[:, 2, 0] = r[:, 3, 1] = -s
+    return r
+
+
+def _drift(e: _commands.Command, brho: float) -> LinearElement:
+    return LinearElement(length=e.length.to('m').magnitude)
+
+
+def _quadrupole(e: _commands.Command, brho: float) -> LinearElement:
+    k = e.B0.to('tesla').magnitude / e.R0.to('m').magnitude / brho if e.R0.magnitude != 0 else 0.0
+    return LinearElement(length=e.XL.to('m').magnitude, kx=k, ky=-k)
+
+
+def _multipole(e: _commands.Command, brho: float) -> LinearElement:
+    k = e.B2.to('tesla').magnitude / e.R0.to('m').magnitude / brho if e.R0.magnitude != 0 else 0.0
+    return LinearElement(length=e.XL.to('m').magnitude, kx=k, ky=-k, roll=e.R2.to('radian').magnitude)
+
+
+def _bend(e: _commands.Command, brho: float) -> LinearElement:
+    length = e.XL.to('m').magnitude
+    h = e.B1.to('tesla').magnitude / brho
+    return LinearElement(length=length, h=h, kx=h ** 2,
+                         e1=h * length / 2 + e.W_E.to('radian').magnitude,
+                         e2=h * length / 2 + e.W_S.to('radian').magnitude,
+                         roll=e.SK.to('radian').magnitude,
+                         )
+
+
+def _dipole(e: _commands.Command, brho: float) -> LinearElement:
+    h = e.B0.to('tesla').magnitude / brho
+    k = e.N * h / e.RM.to('m').magnitude if e.RM.magnitude != 0 else 0.0
+    return LinearElement(length=(e.OMEGA_E - e.OMEGA_S).to('radian').magnitude * e.RM.to('m').magnitude,
+                         h=h, kx=h ** 2 + k, ky=-k,
+                         e1=e.THETA_E.to('radian').magnitude,
+                         e2=e.THETA_S.to('radian').magnitude,
+                         )
+
+
+def _changref(e: _commands.Command, brho: float) -> LinearElement:
+    length, roll = 0.0, 0.0
+    for t in e.TRANSFORMATIONS:
+        if t[0] == 'XS':
+            length += t[1].to('m').magnitude
+        elif t[0] == 'XR':
+            roll += t[1].to('radian').magnitude
+    return LinearElement(length=length, frame_roll=roll)
+
+
+LINEAR_MODELS: Dict[type, Callable[[_commands.Command, float], LinearElement]] = {
+    _commands.Drift: _drift,
+    _commands.Quadrupole: _quadrupole,
+    _commands.Multipole: _multipole,
+    _commands.Bend: _bend,
+    _commands.Dipole: _dipole,
+    _commands.ChangRef: _changref,
+}
+"""Linear models of the commands (functions of the command and of the reference magnetic rigidity in T.m), the model
+of the closest parent class is used. Magnets without model are treated as drifts, the other commands as identities."""
+
+
+def linear_element(e: _commands.Command, brho: float) -> LinearElement:
+    """Linear model of a command (see `LINEAR_MODELS`).
+
+    Args:
+        e: the command
+        brho: the magnetic rigidity of the reference particle (T.m)
+
+    Returns:
+        the linear model of the command.
+    """
+    for cls in type(e).__mro__:
+        if cls in LINEAR_MODELS:
+            return LINEAR_MODELS[cls](e, brho)
+    if isinstance(e, (_commands.Magnet, _commands.Patchable)) and e.length.magnitude != 0:
+        _logger.warning(f"No linear model for {e.__class__.__name__} ({e.LABEL1}), treated as a drift.")
+        return LinearElement(length=e.length.to('m').magnitude)
+    return LinearElement()
+
+
+class LinearOptics:
+    """Linear optics model of a beamline.
+
+    The models of the elements are built once; the transfer matrices of the elements modified by parametric mappings
+    are evaluated for all the mappings at once (see `matrices`).
+    """
+    def __init__(self,
+                 beamline: Union[_Input, List[_commands.Command]],
+                 kinematics: Optional[_Kinematics] = None,
+                 slices: int = 1,
+                 ):
+        """
+        Args:
+            beamline: the beamline, either as an `Input`, as a `Sequence` or as a list of commands
+            kinematics: the kinematics of the reference particle (the kinematics of the `Sequence` by default)
+            slices: the number of slices (steps) of the elements with a non-zero length
+        """
+        self._line: List[_commands.Command] = list(getattr(beamline, 'line', None)
+                                                   or getattr(beamline, 'sequence', None)
+                                                   or beamline)
+        self._kinematics: _Kinematics = kinematics or getattr(beamline, 'kinematics', None)
+        if self._kinematics is None:
+            raise ZgoubidooOpticsException("The kinematics of the reference particle are required.")
+        self._brho: float = self._kinematics.brho.to('tesla * meter').magnitude
+        self._slices: int = slices
+        self._models: List[LinearElement] = [linear_element(e, self._brho) for e in self._line]
+        self._matrices: List[_np.ndarray] = [m.matrices(slices) for m in self._models]
+        steps = [m.shape[1] for m in self._matrices]
+        lengths = _np.repeat([m.length for m in self._models], steps)
+        fractions = _np.concatenate([_np.arange(1, n + 1) / n for n in steps])
+        element_starts = _np.repeat(_np.cumsum([0] + [m.length for m in self._models])[:-1], steps)
+        self._ends: _np.ndarray = _np.cumsum(steps) - 1
+        self._steps: _pd.DataFrame = _pd.DataFrame({
+            'index': _np.concatenate([_np.arange(n) for n in steps]),
+            'S': element_starts + lengths * fractions,
+            'LABEL1': _np.repeat([e.LABEL1 for e in self._line], steps),
+        })
+
+    @property
+    def line(self) -> List[_commands.Command]:
+        """The commands of the beamline."""
+        return self._line
+
+    @property
+    def kinematics(self) -> _Kinematics:
+        """The kinematics of the reference particle."""
+        return self._kinematics
+
+    @property
+    def models(self) -> List[LinearElement]:
+        """The linear models of the elements."""
+        return self._models
+
+    @property
+    def ends(self) -> _np.ndarray:
+        """Indices of the steps at the end of each element (see `matrices`)."""
+        return self._ends
+
+    def matrices(self, mappings: Optional[_MappedParametersListType] = None) -> _np.ndarray:
+        """Step-by-step transfer matrices, for a list of parametric mappings.
+
+        The mappings follow the usual convention ('LABEL1.PARAMETER' keys, see `Input`); the commands are not modified
+        (copy-on-write clones are used).
+
+        Args:
+            mappings: the list of parametric mappings (a single mapping, the nominal beamline, if None)
+
+        Returns:
+            an array of shape (mapping, step, 6, 6) (see `zgoubidoo.twiss.compute_twiss_batch`).
+        """
+        mappings = mappings or [{}]
+        matrices = list(self._matrices)
+        mapped = {}
+        for k in dict.fromkeys(k for m in mappings for k in m):
+            label, parameter = k.split('.')
+            for i, e in enumerate(self._line):
+                if e.LABEL1 == label:
+                    mapped.setdefault(i, []).append((k, parameter))
+        for i, parameters in mapped.items():
+            models = []
+            for m in mappings:
+                e = self._line[i].clone()
+                for k, parameter in parameters:
+                    if k in m:
+                        setattr(e, parameter, m[k])
+                models.append(linear_element(e, self._brho))
+            model = LinearElement(**{f.name: _np.array([getattr(_, f.name) for _ in models]) for f in fields(models[0])})
+            matrices[i] = model.matrices(self._slices)
+        r = _np.empty((len(mappings), len(self._steps), 6, 6))
+        current = _np.broadcast_to(_np.identity(6), (len(mappings), 6, 6))
+        start = 0
+        for m in matrices:
+            cumulative = m @ current[:, None]
+            r[:, start:start + m.shape[1]] = cumulative
+            current = cumulative[:, -1]
+            start += m.shape[1]
+        return r
+
+    def transfer_matrix(self) -> _pd.DataFrame:
+        """Step-by-step transfer matrix of the beamline.
+
+        Returns:
+            a DataFrame with the R{i}{j} columns, the step number within each element ('index'), the position ('S' and
+            'X') and the label of the element ('LABEL1'), as `zgoubidoo.twiss.compute_transfer_matrix`.
+        """
+        r = self.matrices()[0]
+        return _pd.DataFrame({
+            'index': self._steps['index'].values,
+            **{f"R{i + 1}{j + 1}": r[:, i, j] for j in range(6) for i in range(6)},
+            'X': self._steps['S'].values,
+            'S': self._steps['S'].values,
+            'LABEL1': self._steps['LABEL1'].values,
+        })
+
+    def twiss(self, twiss_init: Optional[_pd.Series] = None) -> _pd.DataFrame:
+        """Twiss parameters along the beamline (see `zgoubidoo.twiss.compute_twiss`).
+
+        Args:
+            twiss_init: the initial values of the Twiss parameters (periodic conditions if None)
+
+        Returns:
+            the step-by-step transfer matrix with the Twiss parameters.
+        """
+        return _compute_twiss(self.transfer_matrix(), twiss_init)
+
+    def scan(self,
+             mappings: _MappedParametersListType,
+             twiss_init: Optional[Union[_pd.Series, _pd.DataFrame]] = None,
+             ) -> _pd.DataFrame:
+        """Twiss parameters along the beamline for a list of parametric mappings, evaluated at once (see
+        `zgoubidoo.twiss.compute_twiss_batch`).
+
+        Args:
+            mappings: the list of parametric mappings
+            twiss_init: the initial values of the Twiss parameters (periodic conditions for each mapping if None)
+
+        Returns:
+            a tidy DataFrame with the mapping keys, the steps and the Twiss parameters.
+        """
+        twiss = _compute_twiss_batch(self.matrices(mappings), twiss_init, mappings)
+        twiss['S'] = _np.tile(self._steps['S'].values, len(mappings))
+        twiss['LABEL1'] = _np.tile(self._steps['LABEL1'].values, len(mappings))
+        return twiss
+
+
+_ZGOUBI_COORDINATES: List[int] = [0, 1, 2, 3, 5, 4]
+"""Indices in the linear model of the coordinates in the Zgoubi numbering (Y, T, Z, P, S, D)."""
+
+
+def _zgoubi_units(value) -> Optional[_ureg.Unit]:
+    """Units of a parameter in the Zgoubi input data (None for a pure number)."""
+    if not isinstance(value, _Q):
+        return None
+    if value.dimensionality == _ureg.kilogauss.dimensionality:
+        return _ureg.kilogauss
+    if value.dimensionality == _ureg.centimeter.dimensionality:
+        return _ureg.centimeter
+    return value.units
+
+
+def _parameter_name(command: _commands.Command, index: int) -> str:
+    """Name of the parameter of a command from its Zgoubi index (see `Fit.Parameter`)."""
+    for k, v in command.__class__.PARAMETERS.items():
+        if isinstance(v, tuple) and len(v) > 2 and v[2] == index:
+            return k
+    raise ZgoubidooOpticsException(f"No parameter with index {index} for {command.__class__.__name__} "
+                                   f"({command.LABEL1}).")
+
+
+def match(zgoubi_input: _Input,
+          fit: _commands.Fit,
+          kinematics: Optional[_Kinematics] = None,
+          zgoubi: Optional[_Zgoubi] = None,
+          slices: int = 1,
+          refinement: float = 0.05,
+          iterations: int = 200,
+          ) -> _commands.Fit:
+    """Hybrid matching: the fit is solved on the linear optics model first, then refined with Zgoubi.
+
+    The parameters and the constraints of the fit are solved on the linear optics model of the input (see
+    `LinearOptics`), within the ranges of the parameters, at the cost of a few vectorized evaluations of the model. The
+    input is then updated with the solution and a copy of the fit is seeded with tight ranges around it and a reduced
+    number of iterations, so that Zgoubi only has to refine the solution (fringe fields, non-linearities, etc.).
+
+    Only the constraints on the first-order transfer matrix coefficients
+    (`Fit.FirstOrderTransportCoefficientsConstraint`) can be evaluated with the linear model.
+
+    Args:
+        zgoubi_input: the input, updated in place with the solution of the matching
+        fit: the fit command, with the parameters and the constraints (not modified)
+        kinematics: the kinematics of the reference particle
+        zgoubi: the Zgoubi instance used to run the refinement (the seeded fit is returned without being run if None)
+        slices: the number of slices of the elements of the linear model
+        refinement: the relative half-width of the ranges of the parameters for the refinement
+        iterations: the maximum number of iterations of the refinement
+
+    Returns:
+        the seeded fit, with the results of the refinement attached (if it has been run).
+
+    Raises:
+        ZgoubidooOpticsException if a constraint is not supported by the linear model.
+    """
+    from scipy.optimize import least_squares
+
+    parameters = [p for p in fit.PARAMS if p is not None]
+    constraints = [c for c in fit.CONSTRAINTS if c is not None]
+    for c in constraints:
+        if c['IC'] != 1:
+            raise ZgoubidooOpticsException(f"Constraints of type IC={c['IC']} are not supported by the linear model.")
+    elements = [zgoubi_input[p['IR'] - 1] for p in parameters]
+    indices = [p['IP'][2] if isinstance(p['IP'], (list, tuple)) else p['IP'] for p in parameters]
+    names = [_parameter_name(e, i) for e, i in zip(elements, indices)]
+    units = [_zgoubi_units(getattr(e, n)) for e, n in zip(elements, names)]
+    keys = [f"{e.LABEL1}.{n}" for e, n in zip(elements, names)]
+    x0 = _np.array([getattr(e, n) if u is None else getattr(e, n).m_as(u) for e, n, u in zip(elements, names, units)],
+                   dtype=float)
+    bounds = _np.array([p['DV'] if isinstance(p['DV'], (list, tuple)) else [-_np.inf, _np.inf] for p in parameters],
+                       dtype=float).T
+
+    optics = LinearOptics(zgoubi_input, kinematics, slices)
+    steps = optics.ends[[c['IR'] - 1 for c in constraints]]
+    rows = [_ZGOUBI_COORDINATES[c['I'] - 1] for c in constraints]
+    columns = [_ZGOUBI_COORDINATES[c['J'] - 1] for c in constraints]
+    targets = _np.array([c['V'] for c in constraints], dtype=float)
+    weights = _np.array([c['WV'] for c in constraints], dtype=float)
+
+    def residuals(values: _np.ndarray) -> _np.ndarray:
+        """Weighted residuals of the constraints, for a set of values of the parameters (one per row)."""
+        mappings = [{k: v if u is None else v * u for k, v, u in zip(keys, x, units)} for x in values]
+        return (optics.matrices(mappings)[:, steps, rows, columns] - targets) / weights
+
+    def jacobian(x: _np.ndarray) -> _np.ndarray:
+        """Finite-differences jacobian, evaluated for all the parameters at once."""
+        h = 1e-7 * _np.maximum(_np.abs(x), 1.0)
+        r = residuals(_np.vstack([x, x + _np.diag(h)]))
+        return ((r[1:] - r[0]) / h[:, None]).T
+
+    solution = least_squares(lambda x: residuals(x[None])[0], _np.clip(x0, *bounds), jac=jacobian, bounds=bounds)
+    _logger.info(f"Linear pre-fit: {solution.message} (cost {solution.cost:.3e}, {solution.nfev} evaluations).")
+
+    seeded_parameters = []
+    for e, n, u, i, v, lower, upper in zip(elements, names, units, indices, solution.x, *bounds):
+        setattr(e, n, v if u is None else v * u)
+        half_width = refinement * abs(v) if v != 0 else refinement
+        seeded_parameters.append(_commands.Fit.Parameter(line=zgoubi_input,
+                                                         place=e,
+                                                         parameter=i,
+                                                         range=[max(v - half_width, lower), min(v + half_width, upper)],
+                                                         ))
+    seeded = fit.clone()
+    seeded.PARAMS = seeded_parameters
+    seeded.ITERATIONS = iterations
+    if zgoubi is None:
+        return seeded
+
+    def attach_output_to_fit(f):
+        """Helper callback function to attach a run's output to the fit."""
+        seeded.attach_output(outputs=_Zgoubi.find_labeled_output(f.result()['result'], seeded.LABEL1),
+                             zgoubi_input=zgoubi_input,
+                             parameters={},
+                             )
+    zgoubi_input += seeded
+    zgoubi(zgoubi_input=zgoubi_input, cb=attach_output_to_fit)
+    zgoubi.wait()
+    zgoubi_input -= seeded
+    zgoubi_input.cleanup()
+    for _, r in seeded.results:
+        zgoubi_input.update(r)
+    return seeded
@@ -1,31 +1,1008 @@
-"""Module for handling of affine geometry transformations (rotations and translations).
+"""Readers for the Zgoubi output files.
 
-This module provides support for affine geometry transformations, mainly through the `Frame` class.
+All the text output files (.plt, .fai, MATRIX and SRLOSS files) are read by a single reader engine (`read_output_file`)
+driven by a registry of schemas (`OUTPUT_SCHEMAS`): the schema of each file type defines the location of the header (or
+the fixed column names), the explicit column types, the string columns to be cleaned and the unit conversions, which are
+applied in a single vectorized operation.
 
-Example:
-    example
-
-    >>> 1 + 1 # TODO
-    2
+The binary output files written by Zgoubi (b_zgoubi.plt, b_zgoubi.fai) are Fortran unformatted sequential files: their
+records are mapped directly (memory-mapped, without any parsing) onto NumPy structured types following the record layout
+of the schema (`read_binary_output_file`).
 
+Example:
+    >>> sorted(OUTPUT_SCHEMAS.keys())
+    ['fai', 'matrix', 'plt', 'srloss']
 
 """
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from dataclasses import dataclass, field
+import gzip
+import itertools
+import io
 import os
+import shutil
+import numpy as np
 import pandas as pd
 
+__all__ = [
+    'ZgoubidooOutputException',
+    'OutputSchema',
+    'OUTPUT_SCHEMAS',
+    'OutputIndex',
+    'iter_output_file',
+    'read_output_file',
+    'concat',
+    'COMPRESSIONS',
+    'available_compression',
+    'compress_file',
+    'locate_output_file',
+    'read_binary_output_file',
+    'read_fai_file',
+    'read_binary_fai_file',
+    'read_plt_file',
+    'read_binary_plt_file',
+    'read_srloss_file',
+    'read_matrix_file',
+]
+
+COMPRESSIONS: Dict[str, str] = {
+    'zstd': '.zst',
+    'gzip': '.gz',
+}
+"""Compression methods supported for the output files and the extensions of the compressed files."""
+
+_FORTRAN_MARKER = np.dtype('<i4')
+"""Type of the record length markers of the Fortran unformatted sequential files."""
+
+
+class ZgoubidooOutputException(Exception):
+    """Exception raised for errors when reading Zgoubi output files."""
+
+    def __init__(self, m):
+        self.message = m
+
+
+@dataclass(frozen=True)
+class OutputSchema:
+    """Schema of a Zgoubi text output file."""
+    skiprows: int
+    """Number of lines preceding the data."""
+
+    header_line: Optional[int] = None
+    """Index of the (comma separated) header line, None if the file uses fixed headers."""
+
+    headers: Optional[List[str]] = None
+    """Fixed column names (for files without header line)."""
+
+    dtypes: Dict[str, Any] = field(default_factory=dict)
+    """Explicit types of the columns (only applied to the columns present in the file)."""
+
+    compact_dtypes: Dict[str, Any] = field(default_factory=dict)
+    """Compact types of the columns (categoricals for the labels, small integers for the flags and counters), used
+    instead of `dtypes` for a compact representation."""
+
+    strings: Tuple[str, ...] = ()
+    """String columns to be stripped from their padding."""
+
+    units: Dict[str, float] = field(default_factory=dict)
+    """Multiplicative factors converting the columns from the Zgoubi units to SI units."""
+
+    renames: Dict[str, str] = field(default_factory=dict)
+    """Columns to be renamed."""
+
+    postprocess: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None
+    """Additional processing of the resulting DataFrame."""
+
+    records: Optional[Tuple[Tuple[str, str], ...]] = None
+    """Layout of the data records of the binary files (name and NumPy type of each field, the labels having their length
+    determined from the record length), None if the file type has no binary format."""
+
+    def sniff_headers(self, filename: str, compression: Optional[str] = None) -> List[str]:
+        """Provides the column names, reading only the first lines of the file if needed.
+
+        Args:
+            filename: the name of the file (including its path).
+            compression: the compression method of the file (see `COMPRESSIONS`).
+
+        Returns:
+            the list of column names.
+
+        Raises:
+            a FileNotFoundError in case the file is not found.
+        """
+        if self.header_line is None:
+            return list(self.headers)
+        with _open(filename, compression, 'rt') as file:
+            line = next(itertools.islice(file, self.header_line, None), '')
+        return [h.strip() for h in line.split(',')]
+
+    def column_dtypes(self, compact: bool = False, single_precision: bool = False) -> Dict[str, Any]:
+        """Types of the columns.
+
+        Args:
+            compact: use the compact types (see `compact_dtypes`)
+            single_precision: use single precision floating point numbers instead of double precision
+
+        Returns:
+            a dictionary of column types.
+        """
+        dtypes = {**self.dtypes, **(self.compact_dtypes if compact else {})}
+        if single_precision:
+            dtypes = {k: np.float32 if v is np.float64 else v for k, v in dtypes.items()}
+        return dtypes
+
+    def record_dtype(self, length: int) -> np.dtype:
+        """Structured NumPy type of a binary data record (including the Fortran record markers).
+
+        Args:
+            length: the length of the data records (in bytes), used to determine the length of the labels.
+
+        Returns:
+            the structured type of the records.
+
+        Raises:
+            a ZgoubidooOutputException if the file type has no binary format or if the record length is inconsistent
+            with the record layout.
+        """
+        if self.records is None:
+            raise ZgoubidooOutputException("No binary record layout for this type of output file.")
+        labels = [n for n, t in self.records if t == 'label']
+        fixed = sum(np.dtype(t).itemsize for n, t in self.records if t != 'label')
+        if len(labels) > 0 and (length - fixed) % len(labels) == 0 and length > fixed:
+            size = (length - fixed) // len(labels)
+        elif len(labels) == 0 and length == fixed:
+            size = 0
+        else:
+            raise ZgoubidooOutputException(f"Record length {length} inconsistent with the binary record layout.")
+        return np.dtype(
+            [('_HEAD', _FORTRAN_MARKER)]
+            + [(n, f'S{size}' if t == 'label' else t) for n, t in self.records]
+            + [('_TAIL', _FORTRAN_MARKER)]
+        )
+
+
+def _add_twiss_columns(df: pd.DataFrame) -> pd.DataFrame:
+    df['ALPHA11'] = df['ALFY']
+    df['BETA11'] = df['BETY']
+    df['GAMMA11'] = (1 + df['ALPHA11']**2) / df['BETA11']
+    df['ALPHA22'] = df['ALFZ']
+    df['BETA22'] = df['BETZ']
+    df['GAMMA22'] = (1 + df['ALPHA22']**2) / df['BETA22']
+    return df
+
+
+_TRACKS_DTYPES: Dict[str, Any] = {
+    **{k: np.float64 for k in ('Do-1', 'Yo', 'To', 'Zo', 'Po', 'So', 'to', 'D-1', 'Y-DY', 'T', 'Z', 'P', 'S', 'time',
+                               'beta', 'DS', 'X', 'BX', 'BY', 'BZ', 'SX', 'SY', 'SZ', 'EX', 'EY', 'EZ', 'BORO')},
+    **{k: np.int64 for k in ('# KEX', 'KART', 'IT', 'IREP', 'IPASS', 'NOEL')},
+    **{k: str for k in ('KLEY', 'LABEL1', 'LABEL2', 'LET')},
+}
+
+_TRACKS_COMPACT_DTYPES: Dict[str, Any] = {
+    **{k: np.int8 for k in ('# KEX', 'KART')},
+    **{k: np.int32 for k in ('IT', 'IREP', 'IPASS', 'NOEL')},
+    **{k: 'category' for k in ('KLEY', 'LABEL1', 'LABEL2', 'LET')},
+}
+
+_TRACKS_STRINGS: Tuple[str, ...] = ('KLEY', 'LABEL1', 'LABEL2', 'LET')
+"""String columns of the tracks files, stripped from their padding (as the labels decoded from the binary files)."""
+
+_PLT_RECORDS: Tuple[Tuple[str, str], ...] = (
+    ('# KEX', '<i4'),
+    *((k, '<f8') for k in ('Do-1', 'Yo', 'To', 'Zo', 'Po', 'So', 'to', 'D-1', 'Y-DY', 'T', 'Z', 'P', 'S', 'time',
+                           'beta', 'DS')),
+    ('KART', '<i4'),
+    ('IT', '<i4'),
+    ('IREP', '<i4'),
+    *((k, '<f8') for k in ('SORT', 'X', 'BX', 'BY', 'BZ', 'RET', 'DPR', 'PS', 'SX', 'SY', 'SZ', 'SS', 'EX', 'EY', 'EZ',
+                           'BORO')),
+    ('IPASS', '<i4'),
+    ('NOEL', '<i4'),
+    ('KLEY', 'S10'),
+    ('LABEL1', 'label'),
+    ('LABEL2', 'label'),
+    ('LET', 'S1'),
+)
+
+_FAI_RECORDS: Tuple[Tuple[str, str], ...] = (
+    ('# KEX', '<i4'),
+    *((k, '<f8') for k in ('Do-1', 'Yo', 'To', 'Zo', 'Po', 'So', 'to', 'D-1', 'Y-DY', 'T', 'Z', 'P', 'S', 'time',
+                           'ENEKI', 'ENERG')),
+    ('IT', '<i4'),
+    ('IREP', '<i4'),
+    *((k, '<f8') for k in ('SORT', 'M', 'Q', 'G', 'tau', 'unused', 'RET', 'DPR', 'PS', 'SX', 'SY', 'SZ', 'SS', 'BORO')),
+    ('IPASS', '<i4'),
+    ('NOEL', '<i4'),
+    ('KLEY', 'S10'),
+    ('LABEL1', 'label'),
+    ('LABEL2', 'label'),
+    ('LET', 'S1'),
+)
+
+OUTPUT_SCHEMAS: Dict[str, OutputSchema] = {
+    'fai': OutputSchema(
+        skiprows=4,
+        header_line=2,
+        dtypes=_TRACKS_DTYPES,
+        compact_dtypes=_TRACKS_COMPACT_DTYPES,
+        strings=_TRACKS_STRINGS,
+        renames={'# KEX': 'KEX'},
+        records=_FAI_RECORDS,
+    ),
+    'plt': OutputSchema(
+        skiprows=4,
+        header_line=2,
+        dtypes=_TRACKS_DTYPES,
+        compact_dtypes=_TRACKS_COMPACT_DTYPES,
+        strings=_TRACKS_STRINGS,
+        units={
+            'X': 1e-2, 'S': 1e-2, 'Y-DY': 1e-2, 'T': 1e-3, 'Z': 1e-2, 'P': 1e-3,
+            'Yo': 1e-2, 'To': 1e-3, 'Zo': 1e-2, 'Po': 1e-3,
+        },
+        renames={'# KEX': 'KEX'},
+        records=_PLT_RECORDS,
+    ),
+    'srloss': OutputSchema(
+        skiprows=4,
+        headers=[
+            'KLE',
+            'LABEL1',
+            'LABEL2',
+            'NOEL',
+            'IPASS',
+            'BORO',
+            'DPREF',
+            'AM',
+            'Q',
+            'G',
+            'IMAX',
+            'PI*EMIT(1)',
+            'ALP(1)',
+            'BET(1)',
+            'XM(1)',
+            'XPM(1)',
+            'NLIV(1)',
+            'NINL(1)',
+            'RATIN(1)',
+            'PI*EMIT(2)',
+            'ALP(2)',
+            'BET(2)',
+            'XM(2)',
+            'XPM(2)',
+            'NLIV(2)',
+            'NINL(2)',
+            'RATIN(2)',
+            'PI*EMIT(3)',
+            'ALP(3)',
+            'BET(3)',
+            'XM(3)',
+            'XPM(3)',
+            'NLIV(3)',
+            'NINL(3)',
+            'RATIN(3)',
+            'DE_LOCAL',
+            'SIGE_LOCAL',
+            'DE_AVG_THEO',
+            'E_AVG_PHOTON',
+            'E_RMS_PHOTON',
+        ],
+        dtypes={'KLE': str, 'LABEL1': str, 'LABEL2': str},
+    ),
+    'matrix': OutputSchema(
+        skiprows=2,
+        headers=[
+            'R11', 'R12', 'R13', 'R14', 'R15', 'R16',
+            'R21', 'R22', 'R23', 'R24', 'R25', 'R26',
+            'R31', 'R32', 'R33', 'R34', 'R35', 'R36',
+            'R41', 'R42', 'R43', 'R44', 'R45', 'R46',
+            'R51', 'R52', 'R53', 'R54', 'R55', 'R56',
+            'R61', 'R62', 'R63', 'R64', 'R65', 'R66',
+            'ALFY', 'BETY',
+            'ALFZ', 'BETZ',
+            'DY', 'DYP',
+            'DZ', 'DZP',
+            'PHIY', 'PHIZ',
+            'F(1IREF)', 'F(2IREF)', 'F(3IREF)', 'F(4IREF)', 'F(5IREF)', 'F(6IREF)', 'F(7IREF)',
+            'CMUY',
+            'CMUZ',
+            'QY',
+            'QZ',
+            'XCE',
+            'YCE',
+            'ALE'
+        ],
+        postprocess=_add_twiss_columns,
+    ),
+}
+"""Registry of the schemas of the Zgoubi text output files, indexed by file type."""
+
+
+def iter_output_file(filename: str,
+                     path: str = '.',
+                     schema: Optional[OutputSchema] = None,
+                     kind: str = '',
+                     columns: Optional[Sequence[str]] = None,
+                     labels: Optional[Union[str, Sequence[str]]] = None,
+                     kex: Optional[Union[int, Sequence[int]]] = None,
+                     ipass: Optional[Union[int, Sequence[int]]] = None,
+                     particles: Optional[Union[int, Sequence[int]]] = None,
+                     step: int = 1,
+                     chunksize: Optional[int] = None,
+                     binary: Optional[bool] = None,
+                     compact: bool = False,
+                     single_precision: bool = False,
+                     index: bool = False,
+                     ) -> Iterator[pd.DataFrame]:
+    """Iterate over the content of a Zgoubi output file (text or binary), by chunks of lines (records).
+
+    Only the requested columns (and the ones needed for the selection) are parsed; the selection (on the labels, the
+    KEX flags, the pass numbers, the particle numbers and the decimation of the steps) is applied to each chunk before
+    any other processing, so that the memory footprint is bounded by the chunk size and the size of the selection.
+
+    Compressed files (see `compress_file`) are found and decompressed transparently, the text files being decompressed
+    while they are parsed.
+
+    Args:
+        filename: the name of the file
+        path: the path to the file
+        schema: the schema of the file
+        kind: the type of file (key in `OUTPUT_SCHEMAS`), used if no schema is given
+        columns: the columns to be read (all columns if None)
+        labels: select only the lines with the given LABEL1 (or list of LABEL1)
+        kex: select only the lines with the given KEX flag(s)
+        ipass: select only the lines with the given pass number(s)
+        particles: select only the lines of the given particle number(s) ('IT')
+        step: keep only every `step` step of each particle (decimation)
+        chunksize: the number of lines (records) per chunk, the whole file is read at once if None
+        binary: True for a binary file (see `read_binary_output_file`), if None the files whose name starts with 'b_'
+            (Zgoubi's convention) are read as binary files
+        compact: compact representation of the columns: categoricals for the labels, small integers for the flags and
+            counters (see `OutputSchema.compact_dtypes`)
+        single_precision: single precision (float32) representation of the floating point columns
+        index: use the byte-offset index of the file (see `OutputIndex`, built and saved next to the file if needed) to
+            read only the segments matching the selection on the labels, pass numbers and particle numbers (not
+            available for compressed text files, which are always scanned)
+
+    Returns:
+        an iterator over Pandas DataFrames with the (selected) file content.
+
+    Raises:
+        a FileNotFoundError in case the file is not found.
+        a ZgoubidooOutputException in case a requested column is not in the file.
+    """
+    schema = schema or OUTPUT_SCHEMAS[kind]
+    filename, compression = _resolve(os.path.join(path, filename))
+    if binary is None:
+        binary = os.path.basename(filename).lower().startswith('b_')
+    if binary:
+        data = _map_binary_file(filename, schema, compression)
+        headers = [n for n, _ in schema.records]
+    else:
+        data = None
+        headers = schema.sniff_headers(filename, compression)
+    inverse = {v: k for k, v in schema.renames.items()}
+    predicates = {
+        k: _as_values(v)
+        for k, v in (('LABEL1', labels), (inverse.get('KEX', 'KEX'), kex), ('IPASS', ipass), ('IT', particles))
+        if v is not None
+    }
+    required = set(predicates.keys()) | ({'IT'} if step > 1 else set())
+    if columns is None:
+        output = None
+        used = headers
+    else:
+        output = [inverse.get(c, c) for c in columns]
+        used = [h for h in headers if h in set(output) | required]
+    missing = (set(output or []) | required) - set(headers)
+    if len(missing) > 0:
+        raise ZgoubidooOutputException(f"Columns {sorted(missing)} not available in file {filename}.")
+    counts: Dict[Any, int] = {}
+    dtypes = schema.column_dtypes(compact, single_precision)
+    strings = tuple(n for n, t in (schema.records or ()) if t == 'label' or t.startswith('S'))
+
+    def read_text(source, skiprows: int = 0, size: Optional[int] = None, method: Optional[str] = None):
+        return pd.read_csv(source,
+                           skiprows=skiprows,
+                           names=headers,
+                           usecols=used if columns is not None else None,
+                           sep=' ',
+                           skipinitialspace=True,
+                           index_col=False,
+                           quotechar='\'',
+                           dtype={k: v for k, v in dtypes.items() if k in used},
+                           engine='c',
+                           chunksize=size,
+                           compression=method,
+                           )
+
+    def select(block, mask: np.ndarray) -> pd.DataFrame:
+        if binary:
+            df = pd.DataFrame({
+                n: _decode(block[n][mask], dtypes.get(n) == 'category') if n in strings else block[n][mask]
+                for n in used
+            })
+            return df.astype({k: v for k, v in dtypes.items() if k in df.columns and v not in (str, 'category')})
+        if mask.all():
+            return block
+        return block.loc[mask].reset_index(drop=True)
+
+    def column(block, c: str) -> np.ndarray:
+        if binary:
+            return _decode(block[c]) if c in strings else block[c]
+        return block[c].values
+
+    if index and (binary or compression is None) and set(predicates.keys()) & set(OutputIndex.KEYS):
+        output_index = OutputIndex.get(filename, schema, binary)
+        segments = output_index.select(**{k: v for k, v in predicates.items() if k in OutputIndex.KEYS})
+        predicates = {k: v for k, v in predicates.items() if k not in OutputIndex.KEYS}
+        required = set(predicates.keys())
+        for batch in output_index.batches(segments, chunksize):
+            ranks = np.concatenate([r + np.arange(n) for r, n in zip(batch['RANK'].values, batch['ROWS'].values)]
+                                   or [np.zeros(0, dtype=int)])
+            if binary:
+                rows = np.concatenate([r + np.arange(n) for r, n in zip(batch['ROW'].values, batch['ROWS'].values)]
+                                      or [np.zeros(0, dtype=int)])
+                block = data[rows] if data is not None else pd.DataFrame(columns=used)
+            else:
+                block = read_text(io.BytesIO(output_index.read_bytes(filename, batch)))
+            mask = _mask(len(block), {c: column(block, c) for c in required}, predicates, step, counts, ranks)
+            yield _process(select(block, mask), schema, () if binary else schema.strings, output)
+    elif binary:
+        size = len(data) if data is not None else 0
+        for start in range(0, size, chunksize or size):
+            block = data[start:start + (chunksize or size)]
+            mask = _mask(len(block), {c: column(block, c) for c in required}, predicates, step, counts)
+            yield _process(select(block, mask), schema, (), output)
+        if size == 0:
+            yield _process(pd.DataFrame(columns=used), schema, (), output)
+    else:
+        chunks = read_text(filename, schema.skiprows, chunksize, compression)
+        for block in (chunks if chunksize is not None else [chunks]):
+            mask = _mask(len(block), {c: column(block, c) for c in required}, predicates, step, counts)
+            yield _process(select(block, mask), schema, schema.strings, output)
+
+
+def read_output_file(filename: str, path: str = '.', schema: Optional[OutputSchema] = None, kind: str = '',
+                     **selection) -> pd.DataFrame:
+    """Read a Zgoubi text output file following its schema.
+
+    The data is parsed with the C engine of Pandas (space separated fields, quoted strings) with explicit types;
+    the unit conversions are then applied to all the relevant columns in a single vectorized operation.
+
+    Args:
+        filename: the name of the file
+        path: the path to the file
+        schema: the schema of the file
+        kind: the type of file (key in `OUTPUT_SCHEMAS`), used if no schema is given
+        selection: selection of the columns and lines to be read (see `iter_output_file`)
+
+    Returns:
+        a Pandas DataFrame with the file content.
+
+    Raises:
+        a FileNotFoundError in case the file is not found.
+    """
+    chunks = list(iter_output_file(filename, path, schema, kind, **selection))
+    return chunks[0] if len(chunks) == 1 else concat(chunks, ignore_index=True)
+
+
+def read_binary_output_file(filename: str, path: str = '.', schema: Optional[OutputSchema] = None, kind: str = '',
+                            **selection) -> pd.DataFrame:
+    """Read a Zgoubi binary output file following its schema.
+
+    The header records are skipped (their number is the number of header lines of the corresponding text file) and the
+    data records are memory-mapped onto the structured type given by the record layout of the schema; the length of the
+    labels is determined from the length of the first data record. The resulting DataFrame has the same columns and
+    units as the one obtained from the text file.
+
+    Args:
+        filename: the name of the file
+        path: the path to the file
+        schema: the schema of the file
+        kind: the type of file (key in `OUTPUT_SCHEMAS`), used if no schema is given
+        selection: selection of the columns and records to be read (see `iter_output_file`)
+
+    Returns:
+        a Pandas DataFrame with the file content.
+
+    Raises:
+        a FileNotFoundError in case the file is not found.
+        a ZgoubidooOutputException in case the records do not follow the layout of the schema.
+    """
+    return read_output_file(filename, path, schema, kind, binary=True, **selection)
+
+
+def concat(frames: List[pd.DataFrame], **kwargs) -> pd.DataFrame:
+    """Concatenate DataFrames preserving their categorical columns.
+
+    The categories of the categorical columns are unified before the concatenation (otherwise Pandas falls back to
+    object columns when the categories differ).
+
+    Examples:
+        >>> a = pd.DataFrame({'LABEL1': pd.Categorical(['Q1', 'Q2'])})
+        >>> b = pd.DataFrame({'LABEL1': pd.Categorical(['Q3'])})
+        >>> concat([a, b])['LABEL1'].dtype.name
+        'category'
+
+    Args:
+        frames: the DataFrames to concatenate
+        kwargs: keyword arguments passed to `pandas.concat`
+
+    Returns:
+        the concatenated DataFrame.
+    """
+    if len(frames) > 1:
+        for c in frames[0].columns:
+            if frames[0][c].dtype.name == 'category' and all(c in f.columns for f in frames):
+                categories = pd.Index(pd.unique(np.concatenate([f[c].cat.categories.values for f in frames])))
+                for f in frames:
+                    f[c] = f[c].cat.set_categories(categories)
+    return pd.concat(frames, **kwargs)
+
+
+class OutputIndex:
+    """Byte-offset index of a Zgoubi output file (.plt or .fai, text or binary).
+
+    The lines (records) of the output files come in contiguous segments of identical element label, pass number and
+    particle number (all the integration steps of a particle through an element). The index holds one entry per segment
+    with its keys, its position in the file (byte range and line range) and the rank of its first line among the steps
+    of its particle (used for the decimation of the steps). Once built, the index is stored next to the file (with the
+    '.idx.npz' suffix) and reused as long as the file is unchanged, so that the lines of a given element, pass or
+    particle are read directly, in a time proportional to the size of the selection.
+
+    Examples:
+        >>> index = OutputIndex.from_keys(labels=['Q1', 'Q1', 'Q2', 'Q2'], ipass=[1, 1, 1, 1], it=[1, 2, 1, 2],
+        ...                               starts=[10, 20, 30, 40, 50])
+        >>> index.select(LABEL1=['Q2'])[['LABEL1', 'IT', 'START', 'STOP', 'RANK']].values.tolist()
+        [['Q2', 1, 30, 40, 1], ['Q2', 2, 40, 50, 1]]
+    """
+    KEYS: Tuple[str, ...] = ('LABEL1', 'IPASS', 'IT')
+    """Keys of the segments."""
+
+    SUFFIX: str = '.idx.npz'
+    """Suffix of the index files."""
+
+    def __init__(self, segments: pd.DataFrame, size: int = 0, mtime: int = 0):
+        """
+        Args:
+            segments: the segments of the file (columns LABEL1, IPASS, IT, ROW, ROWS, START, STOP and RANK)
+            size: the size of the indexed file
+            mtime: the modification time of the indexed file (in nanoseconds)
+        """
+        self._segments: pd.DataFrame = segments
+        self._size: int = size
+        self._mtime: int = mtime
+
+    @property
+    def segments(self) -> pd.DataFrame:
+        """The segments of the file, in the order of the file."""
+        return self._segments
+
+    @classmethod
+    def from_keys(cls,
+                  labels: Sequence[str],
+                  ipass: Sequence[int],
+                  it: Sequence[int],
+                  starts: Sequence[int],
+                  size: int = 0,
+                  mtime: int = 0,
+                  ) -> OutputIndex:
+        """Build the index from the keys of all the lines of a file.
+
+        Args:
+            labels: the element labels of the lines
+            ipass: the pass numbers of the lines
+            it: the particle numbers of the lines
+            starts: the byte offsets of the beginning of each line, followed by the offset of the end of the last line
+            size: the size of the indexed file
+            mtime: the modification time of the indexed file (in nanoseconds)
 
-def read_fai_file(filename: str = 'zgoubi.fai', path: str = '.') -> pd.DataFrame:
+        Returns:
+            the index.
+        """
+        labels = pd.Categorical(labels)
+        ipass = np.asarray(ipass)
+        it = np.asarray(it)
+        starts = np.asarray(starts, dtype=np.int64)
+        return cls(cls._segment(labels.codes, labels.categories, ipass, it, starts), size, mtime)
+
+    @staticmethod
+    def _segment(codes: np.ndarray,
+                 categories: Sequence[str],
+                 ipass: np.ndarray,
+                 it: np.ndarray,
+                 starts: np.ndarray,
+                 ) -> pd.DataFrame:
+        n = len(codes)
+        change = np.ones(n, dtype=bool)
+        if n > 1:
+            change[1:] = (codes[1:] != codes[:-1]) | (ipass[1:] != ipass[:-1]) | (it[1:] != it[:-1])
+        first = np.flatnonzero(change)
+        rows = np.diff(np.append(first, n))
+        segments = pd.DataFrame({
+            'LABEL1': pd.Categorical.from_codes(codes[first], categories=categories),
+            'IPASS': ipass[first],
+            'IT': it[first],
+            'ROW': first,
+            'ROWS': rows,
+            'START': starts[first],
+            'STOP': starts[first + rows],
+        })
+        segments['RANK'] = segments.groupby('IT')['ROWS'].cumsum() - segments['ROWS']
+        return segments
+
+    @classmethod
+    def build(cls, filename: str, schema: OutputSchema, binary: bool = False, chunksize: int = 1000000) -> OutputIndex:
+        """Build the index of a file, reading only the keys of the lines.
+
+        Args:
+            filename: the name of the file (including its path)
+            schema: the schema of the file
+            binary: True for a binary file
+            chunksize: the number of lines read at once
+
+        Returns:
+            the index.
+        """
+        stat = os.stat(filename)
+        categories: Dict[str, int] = {}
+        codes, ipass, it = [], [], []
+        for chunk in iter_output_file(filename, '', schema, columns=list(cls.KEYS), chunksize=chunksize, binary=binary,
+                                      compact=True):
+            labels = chunk['LABEL1'].astype('category').cat
+            mapping = np.array([categories.setdefault(c, len(categories)) for c in labels.categories], dtype=np.int32)
+            codes.append(mapping[labels.codes] if len(mapping) > 0 else np.zeros(0, dtype=np.int32))
+            ipass.append(chunk['IPASS'].values)
+            it.append(chunk['IT'].values)
+        codes, ipass, it = (np.concatenate(_) if len(_) > 0 else np.zeros(0, dtype=int) for _ in (codes, ipass, it))
+        if binary:
+            data = _map_binary_file(filename, schema, _resolve(filename)[1])
+            itemsize = data.dtype.itemsize if data is not None else 0
+            starts = (stat.st_size - len(codes) * itemsize) + itemsize * np.arange(len(codes) + 1, dtype=np.int64)
+        else:
+            starts = _line_offsets(filename, schema.skiprows + np.arange(len(codes) + 1))
+        return cls(cls._segment(codes, list(categories.keys()), ipass, it, starts), stat.st_size, stat.st_mtime_ns)
+
+    @classmethod
+    def load(cls, filename: str) -> Optional[OutputIndex]:
+        """Load the index of a file (if it exists and is up to date).
+
+        Args:
+            filename: the name of the indexed file (including its path)
+
+        Returns:
+            the index or None if there is no valid index for the file.
+        """
+        try:
+            with np.load(filename + cls.SUFFIX, allow_pickle=False) as archive:
+                size, mtime = (int(_) for _ in archive['FILE'])
+                stat = os.stat(filename)
+                if size != stat.st_size or mtime != stat.st_mtime_ns:
+                    return None
+                segments = pd.DataFrame({k: archive[k] for k in archive.files if k not in ('FILE', 'CATEGORIES')})
+                segments['LABEL1'] = pd.Categorical.from_codes(segments['LABEL1'].values,
+                                                               categories=archive['CATEGORIES'].tolist())
+        except (OSError, KeyError, ValueError):
+            return None
+        return cls(segments, size, mtime)
+
+    def save(self, filename: str):
+        """Save the index next to the indexed file (silently skipped if the location is not writable).
+
+        Args:
+            filename: the name of the indexed file (including its path)
+        """
+        try:
+            with open(filename + self.SUFFIX, 'wb') as file:
+                np.savez(file,
+                         FILE=np.array([self._size, self._mtime], dtype=np.int64),
+                         CATEGORIES=np.array(self._segments['LABEL1'].cat.categories.values, dtype=str),
+                         **{k: (v.cat.codes.values if k == 'LABEL1' else v.values) for k, v in self._segments.items()},
+                         )
+        except OSError:
+            pass
+
+    @classmethod
+    def get(cls, filename: str, schema: OutputSchema, binary: bool = False) -> OutputIndex:
+        """Provide the index of a file, loading it if it is up to date, building (and saving) it otherwise.
+
+        Args:
+            filename: the name of the file (including its path)
+            schema: the schema of the file
+            binary: True for a binary file
+
+        Returns:
+            the index.
+        """
+        index = cls.load(filename)
+        if index is None:
+            index = cls.build(filename, schema, binary)
+            index.save(filename)
+        return index
+
+    def select(self, **keys) -> pd.DataFrame:
+        """Select the segments matching the given keys.
+
+        Args:
+            keys: lists of values for the keys of the segments (LABEL1, IPASS or IT)
+
+        Returns:
+            the selected segments, in the order of the file.
+        """
+        mask = np.ones(len(self._segments), dtype=bool)
+        for k, v in keys.items():
+            mask &= self._segments[k].isin(_as_values(v)).values
+        return self._segments[mask]
+
+    @staticmethod
+    def batches(segments: pd.DataFrame, chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """Group the segments in batches of (about) `chunksize` lines.
+
+        Args:
+            segments: the segments
+            chunksize: the number of lines per batch (a single batch if None)
+
+        Returns:
+            an iterator over the batches (at least one, possibly empty, batch).
+        """
+        if chunksize is None or len(segments) == 0:
+            yield segments
+            return
+        groups = (segments['ROWS'].cumsum().values - 1) // chunksize
+        for _, batch in segments.groupby(groups, sort=False):
+            yield batch
+
+    @staticmethod
+    def read_bytes(filename: str, segments: pd.DataFrame) -> bytes:
+        """Read the byte ranges of the given segments (contiguous segments are read at once).
+
+        Args:
+            filename: the name of the file (including its path)
+            segments: the segments
+
+        Returns:
+            the content of the segments.
+        """
+        starts, stops = segments['START'].values, segments['STOP'].values
+        if len(starts) == 0:
+            return b''
+        breaks = np.flatnonzero(starts[1:] != stops[:-1]) + 1
+        chunks = []
+        with open(filename, 'rb') as file:
+            for start, stop in zip(starts[np.append(0, breaks)], stops[np.append(breaks - 1, len(stops) - 1)]):
+                file.seek(start)
+                chunks.append(file.read(stop - start))
+        return b''.join(chunks)
+
+
+def _line_offsets(filename: str, lines: np.ndarray, blocksize: int = 1 << 26) -> np.ndarray:
+    """Byte offsets of the beginning of the given (sorted) lines, the file being scanned by blocks."""
+    offsets = np.full(len(lines), os.path.getsize(filename), dtype=np.int64)
+    j = np.searchsorted(lines, 0, side='right')
+    offsets[:j] = 0
+    line, position = 0, 0
+    with open(filename, 'rb') as file:
+        while j < len(lines):
+            block = file.read(blocksize)
+            if not block:
+                break
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+            k = np.searchsorted(lines, line + len(newlines), side='right')
+            offsets[j:k] = position + newlines[lines[j:k] - line - 1] + 1
+            j, line, position = k, line + len(newlines), position + len(block)
+    return offsets
+
+
+def _map_binary_file(filename: str, schema: OutputSchema, compression: Optional[str] = None) -> Optional[np.ndarray]:
+    """Memory-map the data records of a binary file (None if the file has no data record); compressed files are
+    decompressed in memory."""
+    if compression is not None:
+        with _open(filename, compression) as file:
+            raw = np.frombuffer(file.read(), dtype=np.uint8)
+    elif os.path.getsize(filename) > 0:
+        raw = np.memmap(filename, dtype=np.uint8, mode='r')
+    else:
+        raw = np.zeros(0, dtype=np.uint8)
+    marker = _FORTRAN_MARKER.itemsize
+    offset = 0
+    for _ in range(schema.skiprows):
+        if offset + marker > len(raw):
+            raise ZgoubidooOutputException(f"Incomplete header in binary file {filename}.")
+        offset += 2 * marker + int(raw[offset:offset + marker].view(_FORTRAN_MARKER)[0])
+    if offset + marker > len(raw):
+        return None
+    dtype = schema.record_dtype(int(raw[offset:offset + marker].view(_FORTRAN_MARKER)[0]))
+    if (len(raw) - offset) % dtype.itemsize != 0:
+        raise ZgoubidooOutputException(f"Truncated record in binary file {filename}.")
+    data = raw[offset:].view(dtype)
+    if not (np.all(data['_HEAD'] == data['_HEAD'][0]) and np.all(data['_TAIL'] == data['_HEAD'][0])):
+        raise ZgoubidooOutputException(f"Inconsistent record markers in binary file {filename}.")
+    return data
+
+
+def locate_output_file(filename: str, path: str = '.') -> Optional[str]:
+    """Locate an output file, possibly compressed (see `compress_file`).
+
+    Args:
+        filename: the name of the file (without the extension of the compression method)
+        path: the path to the file
+
+    Returns:
+        the name of the file (including its path and the extension of the compression method) or None if the file
+        is not found.
+    """
+    filename = os.path.join(path, filename)
+    for extension in ('', *COMPRESSIONS.values()):
+        if os.path.isfile(filename + extension):
+            return filename + extension
+    return None
+
+
+def _resolve(filename: str) -> Tuple[str, Optional[str]]:
+    """Actual name and compression method of a (possibly compressed) file."""
+    filename = locate_output_file(filename) or filename
+    for method, extension in COMPRESSIONS.items():
+        if filename.endswith(extension):
+            return filename, method
+    return filename, None
+
+
+def _open(filename: str, compression: Optional[str] = None, mode: str = 'rb', level: Optional[int] = None):
+    """Open a file with the given compression method (streaming)."""
+    if compression is None:
+        return open(filename, mode)
+    if compression == 'gzip':
+        return gzip.open(filename, mode, compresslevel=level or 1)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ModuleNotFoundError:
+            raise ZgoubidooOutputException("The 'zstandard' package is required for the zstd compression.")
+        file = open(filename, mode.replace('t', 'b'))
+        if 'w' in mode:
+            stream = zstandard.ZstdCompressor(level=level or 3).stream_writer(file, closefd=True)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(file, closefd=True)
+        return io.TextIOWrapper(stream) if 't' in mode else stream
+    raise ZgoubidooOutputException(f"Unsupported compression method '{compression}'.")
+
+
+def available_compression() -> str:
+    """Provide the preferred compression method available (zstd if the 'zstandard' package is installed, gzip
+    otherwise).
+
+    Returns:
+        the name of the compression method.
+    """
+    try:
+        import zstandard
+    except ModuleNotFoundError:
+        return 'gzip'
+    return 'zstd'
+
+
+def compress_file(filename: str, path: str = '.', method: Optional[str] = None, level: Optional[int] = None) -> str:
+    """Compress an output file (streaming) and remove the original file.
+
+    The compressed files are read transparently by all the readers of this module.
+
+    Examples:
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as d:
+        ...     _ = open(os.path.join(d, 'zgoubi.plt'), 'w').write('data')
+        ...     os.path.basename(compress_file('zgoubi.plt', d, method='gzip'))
+        ...     os.path.basename(locate_output_file('zgoubi.plt', d))
+        'zgoubi.plt.gz'
+        'zgoubi.plt.gz'
+
+    Args:
+        filename: the name of the file
+        path: the path to the file
+        method: the compression method (key of `COMPRESSIONS`), the preferred available method if None
+        level: the compression level (default of the method if None)
+
+    Returns:
+        the name of the compressed file (including its path).
+    """
+    method = method or available_compression()
+    source = os.path.join(path, filename)
+    target = source + COMPRESSIONS[method]
+    with open(source, 'rb') as src, _open(target, method, 'wb', level) as dst:
+        shutil.copyfileobj(src, dst, 1 << 24)
+    os.remove(source)
+    return target
+
+
+def _as_values(values: Any) -> List[Any]:
+    if isinstance(values, (str, bytes, int, np.integer)):
+        return [values]
+    return list(values)
+
+
+def _mask(n: int,
+          columns: Dict[str, np.ndarray],
+          predicates: Dict[str, List[Any]],
+          step: int,
+          counts: Dict[Any, int],
+          ranks: Optional[np.ndarray] = None,
+          ) -> np.ndarray:
+    """Selection mask of a chunk; the step counters of the particles are carried over from chunk to chunk (unless the
+    ranks of the steps are given)."""
+    mask = np.ones(n, dtype=bool)
+    if ranks is not None:
+        mask &= ranks % step == 0
+    elif step > 1:
+        it = pd.Series(columns['IT'])
+        rank = it.groupby(it).cumcount().values + it.map(counts).fillna(0).values.astype(int)
+        for k, v in it.value_counts().items():
+            counts[k] = counts.get(k, 0) + v
+        mask &= rank % step == 0
+    for c, values in predicates.items():
+        v = columns[c]
+        if isinstance(v, pd.Categorical):
+            selected = pd.Index(v.categories).astype(str).str.strip().isin(values)
+            mask &= (v.codes >= 0) & selected[v.codes]
+            continue
+        if v.dtype == object:
+            v = pd.Series(v).str.strip().values
+        mask &= pd.Series(v).isin(values).values
+    return mask
+
+
+def _decode(labels: np.ndarray, categorical: bool = False) -> Union[np.ndarray, pd.Categorical]:
+    """Decode (and strip) fixed length byte strings, working on the (few) distinct values only."""
+    values, indices = np.unique(labels, return_inverse=True)
+    values = pd.Index([v.decode('ascii').strip() for v in values], dtype=object)
+    if categorical and values.is_unique:
+        return pd.Categorical.from_codes(indices, categories=values)
+    return values.values[indices]
+
+
+def _strip(column: pd.Series) -> pd.Series:
+    """Strip the padding of a string column (on the categories only for categorical columns)."""
+    if column.dtype.name == 'category':
+        categories = column.cat.categories.str.strip()
+        if categories.is_unique:
+            return column.cat.rename_categories(categories)
+        return column.astype(str).str.strip().astype('category')
+    return column.str.strip()
+
+
+def _process(df: pd.DataFrame, schema: OutputSchema, strings: Tuple[str, ...], output: Optional[List[str]] = None) \
+        -> pd.DataFrame:
+    if output is not None:
+        df = df.drop(columns=[c for c in df.columns if c not in output])
+    for c in strings:
+        if c in df.columns:
+            df[c] = _strip(df[c])
+    columns = [c for c in schema.units.keys() if c in df.columns]
+    if len(columns) > 0:
+        values = df[columns].values
+        df[columns] = values * np.array([schema.units[c] for c in columns], dtype=values.dtype)
+    if schema.renames:
+        df = df.rename(columns=schema.renames)
+    if schema.postprocess is not None:
+        df = schema.postprocess(df)
+    return df
+
+
+def read_fai_file(filename: str = 'zgoubi.fai', path: str = '.', **selection) -> pd.DataFrame:
     """Function to read Zgoubi .fai files.
 
     Reads the content of a Zgoubi .fai file ('faisceau', 'beam' file) and formats it as a valid Pandas DataFrame with
     headers.
 
+    Note:
+        the '# KEX' column of the file is renamed 'KEX' (as for the .plt files).
+
     Example:
         >>> read_fai_file()
 
     Args:
         filename: the name of the file
         path: the path to the .fai file
+        selection: selection of the columns and lines to be read (see `iter_output_file`)
 
     Returns:
         a Pandas DataFrame with the .fai file content.
@@ -33,19 +1010,30 @@ def read_fai_file(filename: str = 'zgoubi.fai', path: str = '.') -> pd.DataFrame
     Raises:
         a FileNotFoundError in case the file is not found.
     """
-    # Header line from the Zgoubi .fai file
-    with open(os.path.join(path, filename)) as file:
-        headers = list(map(lambda s: s.strip(' '), file.read().split('\n')[2].split(',')))
-    return pd.read_csv(os.path.join(path, filename),
-                       skiprows=4,
-                       names=headers,
-                       sep=r'\s+',
-                       skipinitialspace=True,
-                       quotechar='\''
-                       )
-
-
-def read_plt_file(filename: str = 'zgoubi.plt', path: str = '.') -> pd.DataFrame:
+    return read_output_file(filename, path, kind='fai', **selection)
+
+
+def read_binary_fai_file(filename: str = 'b_zgoubi.fai', path: str = '.', **selection) -> pd.DataFrame:
+    """Function to read Zgoubi binary .fai files.
+
+    Reads the content of a Zgoubi binary .fai file (as written with `Faiscnl` or `FaiStore` in binary mode) and formats
+    it as the Pandas DataFrame obtained from the text .fai file.
+
+    Args:
+        filename: the name of the file
+        path: the path to the .fai file
+        selection: selection of the columns and lines to be read (see `iter_output_file`)
+
+    Returns:
+        a Pandas DataFrame with the .fai file content.
+
+    Raises:
+        a FileNotFoundError in case the file is not found.
+    """
+    return read_binary_output_file(filename, path, kind='fai', **selection)
+
+
+def read_plt_file(filename: str = 'zgoubi.plt', path: str = '.', **selection) -> pd.DataFrame:
     """Function to read Zgoubi .plt files.
 
     Reads the content of a Zgoubi .plt file ('plot' file) and formats it as a valid Pandas DataFrame with headers.
@@ -60,6 +1048,7 @@ def read_plt_file(filename: str = 'zgoubi.plt', path: str = '.') -> pd.DataFrame
     Args:
         filename: the name of the file
         path: the path to the .plt file
+        selection: selection of the columns and lines to be read (see `iter_output_file`)
 
     Returns:
         a Pandas DataFrame with the .plt file content.
@@ -67,31 +1056,27 @@ def read_plt_file(filename: str = 'zgoubi.plt', path: str = '.') -> pd.DataFrame
     Raises:
         a FileNotFoundError in case the file is not found.
     """
-    # Header line from the Zgoubi .plt file
-    with open(os.path.join(path, filename)) as file:
-        headers = list(map(lambda s: s.strip(' '), file.read().split('\n')[2].split(',')))
-    df = pd.read_csv(os.path.join(path, filename),
-                     skiprows=4,
-                     names=headers,
-                     sep=r'\s+',
-                     skipinitialspace=True,
-                     quotechar='\''
-                     )
-    df['LABEL1'] = df['LABEL1'].map(lambda x: x.strip())
-    df['X'] *= 1e-2
-    df['S'] *= 1e-2
-    df['Y-DY'] *= 1e-2
-    df['T'] *= 1e-3
-    df['Z'] *= 1e-2
-    df['P'] *= 1e-3
-    df['Yo'] *= 1e-2
-    df['To'] *= 1e-3
-    df['Zo'] *= 1e-2
-    df['Po'] *= 1e-3
-    df['KEX'] = df['# KEX']
-    del df['# KEX']
+    return read_output_file(filename, path, kind='plt', **selection)
 
-    return df
+
+def read_binary_plt_file(filename: str = 'b_zgoubi.plt', path: str = '.', **selection) -> pd.DataFrame:
+    """Function to read Zgoubi binary .plt files.
+
+    Reads the content of a Zgoubi binary .plt file and formats it as the Pandas DataFrame obtained from the text .plt
+    file (see `read_plt_file`).
+
+    Args:
+        filename: the name of the file
+        path: the path to the .plt file
+        selection: selection of the columns and lines to be read (see `iter_output_file`)
+
+    Returns:
+        a Pandas DataFrame with the .plt file content.
+
+    Raises:
+        a FileNotFoundError in case the file is not found.
+    """
+    return read_binary_output_file(filename, path, kind='plt', **selection)
 
 
 def read_srloss_file(filename: str = 'zgoubi.SRLOSS.out', path: str = '.') -> pd.DataFrame:
@@ -113,58 +1098,7 @@ def read_srloss_file(filename: str = 'zgoubi.SRLOSS.out', path: str = '.') -> pd
     Raises:
         a FileNotFoundException in case the file is not found.
     """
-    headers = [
-        'KLE',
-        'LABEL1',
-        'LABEL2',
-        'NOEL',
-        'IPASS',
-        'BORO',
-        'DPREF',
-        'AM',
-        'Q',
-        'G',
-        'IMAX',
-        'PI*EMIT(1)',
-        'ALP(1)',
-        'BET(1)',
-        'XM(1)',
-        'XPM(1)',
-        'NLIV(1)',
-        'NINL(1)',
-        'RATIN(1)',
-        'PI*EMIT(2)',
-        'ALP(2)',
-        'BET(2)',
-        'XM(2)',
-        'XPM(2)',
-        'NLIV(2)',
-        'NINL(2)',
-        'RATIN(2)',
-        'PI*EMIT(3)',
-        'ALP(3)',
-        'BET(3)',
-        'XM(3)',
-        'XPM(3)',
-        'NLIV(3)',
-        'NINL(3)',
-        'RATIN(3)',
-        'DE_LOCAL',
-        'SIGE_LOCAL',
-        'DE_AVG_THEO',
-        'E_AVG_PHOTON',
-        'E_RMS_PHOTON',
-    ]
-
-    df = pd.read_csv(os.path.join(path, filename),
-                     skiprows=4,
-                     names=headers,
-                     sep=r'\s+',
-                     skipinitialspace=True,
-                     quotechar='\''
-                     )
-
-    return df
+    return read_output_file(filename, path, kind='srloss')
 
 
 def read_matrix_file(filename: str = 'zgoubi.MATRIX.out', path: str = '.') -> pd.DataFrame:
@@ -189,42 +1123,4 @@ def read_matrix_file(filename: str = 'zgoubi.MATRIX.out', path: str = '.') -> pd
     Raises:
         a FileNotFoundError in case the file is not found.
     """
-    # Cleaned up header lines
-    headers = [
-        'R11', 'R12', 'R13', 'R14', 'R15', 'R16',
-        'R21', 'R22', 'R23', 'R24', 'R25', 'R26',
-        'R31', 'R32', 'R33', 'R34', 'R35', 'R36',
-        'R41', 'R42', 'R43', 'R44', 'R45', 'R46',
-        'R51', 'R52', 'R53', 'R54', 'R55', 'R56',
-        'R61', 'R62', 'R63', 'R64', 'R65', 'R66',
-        'ALFY', 'BETY',
-        'ALFZ', 'BETZ',
-        'DY', 'DYP',
-        'DZ', 'DZP',
-        'PHIY', 'PHIZ',
-        'F(1IREF)', 'F(2IREF)', 'F(3IREF)', 'F(4IREF)', 'F(5IREF)', 'F(6IREF)', 'F(7IREF)',
-        'CMUY',
-        'CMUZ',
-        'QY',
-        'QZ',
-        'XCE',
-        'YCE',
-        'ALE'
-    ]
-
-    df = pd.read_csv(os.path.join(path, filename),
-                     skiprows=2,
-                     names=headers,
-                     sep=r'\s+',
-                     skipinitialspace=True,
-                     quotechar='\''
-                     )
-
-    df['ALPHA11'] = df['ALFY']
-    df['BETA11'] = df['BETY']
-    df['GAMMA11'] = (1 + df['ALPHA11']**2) / df['BETA11']
-    df['ALPHA22'] = df['ALFZ']
-    df['BETA22'] = df['BETZ']
-    df['GAMMA22'] = (1 + df['ALPHA22']**2) / df['BETA22']
-
-    return df
+    return read_output_file(filename, path, kind='matrix')
@@ -3,3 +3,5 @@
 The high-level API adds a level of abstraction on top of low-level API (using `Input` and `Command`).
 """
 from .srloss import srloss
+from .orbit import find_closed_orbits, track_closed_orbits
+from .chromaticity import chromaticity
@@ -0,0 +1,151 @@
+"""Chromatic analysis of a periodic sequence: tunes, periodic optics and path length versus the momentum offset.
+
+The one-turn transfer matrix is computed for a set of momentum offsets from `Objet5` runs (one Zgoubi run per momentum
+offset, all executed concurrently). The tunes, the periodic Twiss parameters and dispersion and the path length are
+then fitted against the momentum offset with a polynomial regression (all the quantities at once), providing the
+chromaticities and the momentum compaction factor.
+
+Example:
+    >>> import zgoubidoo
+    >>> from zgoubidoo.physics import chromaticity
+    >>> sequence = zgoubidoo.sequence.Sequence(...)  # doctest: +SKIP
+    >>> chromaticity(sequence).chromaticity  # doctest: +SKIP
+"""
+from typing import Iterable, Optional
+from dataclasses import dataclass
+import numpy as _np
+import pandas as _pd
+from ..commands.commands import Marker as _Marker
+from ..commands.objet import Objet5 as _Objet5
+from ..sequence import Sequence as _Sequence
+from ..input import Input as _Input
+from .orbit import find_closed_orbits as _find_closed_orbits
+from .results import PhysicsResults as _PhysicsResults
+
+_COORDINATES: list = ['Y-DY', 'T', 'Z', 'P', 'D-1', 'Yo', 'To', 'Zo', 'Po', 'Do-1']
+"""Coordinates of the tracks used for the computation of the transfer matrix (in this order)."""
+
+_PARTICLES: list = ['O', 'A', 'C', 'E', 'G', 'I', 'B', 'D', 'F', 'H', 'J']
+"""Identifiers of the `Objet5` particles (in this order: reference, positive and negative offsets)."""
+
+_QUANTITIES: list = ['Q1', 'Q2', 'BETA11', 'ALPHA11', 'BETA22', 'ALPHA22', 'DY', 'DYP', 'DZ', 'DZP', 'LENGTH']
+"""Quantities fitted against the momentum offset."""
+
+
+@dataclass
+class ChromaticOptics(_PhysicsResults):
+    """Results of a chromatic analysis (see `chromaticity`)."""
+    table: _pd.DataFrame
+    """One row per momentum offset ('DPP'), with the closed orbit, the one-turn matrix and the fitted quantities."""
+
+    coefficients: _pd.DataFrame
+    """Coefficients of the polynomial fits of the quantities (columns) against the momentum offset (index: order)."""
+
+    zi: _Input
+
+    @property
+    def tunes(self) -> _pd.Series:
+        """The (fractional) tunes of the on-momentum particle."""
+        return self.coefficients.loc[0, ['Q1', 'Q2']]
+
+    @property
+    def chromaticity(self) -> _pd.Series:
+        """The (natural, not normalized) chromaticities dQ/dp."""
+        return self.coefficients.loc[1, ['Q1', 'Q2']]
+
+    @property
+    def momentum_compaction(self) -> float:
+        """The momentum compaction factor (dL/dp) / L."""
+        return self.coefficients.at[1, 'LENGTH'] / self.coefficients.at[0, 'LENGTH']
+
+
+def chromaticity(sequence: _Sequence,
+                 dpp: Optional[Iterable[float]] = None,
+                 order: int = 2,
+                 closed_orbits: bool = True,
+                 debug: bool = False,
+                 ) -> ChromaticOptics:
+    """Chromatic analysis of a periodic sequence.
+
+    An `Objet5` run is performed for each momentum offset (concurrently, using the parametric mappings of the
+    reference momentum); the particles are centered on the off-momentum closed orbits (see
+    `zgoubidoo.physics.orbit.find_closed_orbits`) unless `closed_orbits` is False. The one-turn matrices are computed
+    from the coordinates of the particles at the end of the sequence and parametrized for all the momentum offsets at
+    once.
+
+    Args:
+        sequence: the (periodic) sequence
+        dpp: the momentum offsets (11 values between -0.5% and 0.5% by default)
+        order: the order of the polynomial fits against the momentum offset
+        closed_orbits: center the particles on the off-momentum closed orbits
+        debug: verbose output on the results of the Zgoubi runs
+
+    Returns:
+        the results of the chromatic analysis.
+    """
+    dpp = _np.linspace(-5e-3, 5e-3, 11) if dpp is None else _np.asarray(list(dpp), dtype=float)
+    if closed_orbits:
+        orbits = _find_closed_orbits(sequence, dpp)[['Y', 'T', 'Z', 'P']].values
+    else:
+        orbits = _np.zeros((len(dpp), 4))
+    objet = _Objet5('BUNCH', BORO=sequence.kinematics.brho)
+    zi = _Input(
+        name=f'CHROMATICITY_FOR_{sequence.name}',
+        line=[
+                 objet,
+                 sequence.particle,
+             ] + sequence.sequence + [
+            _Marker('__END__'),
+             ]
+    )
+    mappings = [
+        {
+            'BUNCH.YR': 100 * o[0], 'BUNCH.TR': 1000 * o[1], 'BUNCH.ZR': 100 * o[2], 'BUNCH.PR': 1000 * o[3],
+            'BUNCH.DR': 1.0 + d,
+        }
+        for d, o in zip(dpp, orbits) if not _np.isnan(o).any()
+    ]
+    results = sequence.zgoubi(zi, mappings=mappings).collect()
+    if debug:
+        results.print()
+
+    data = _np.full((len(dpp), len(_PARTICLES), len(_COORDINATES)), _np.nan)
+    length = _np.full(len(dpp), _np.nan)
+    for m in results.mappings:
+        i = int(_np.argmin(_np.abs(dpp - (m['BUNCH.DR'] - 1.0))))
+        tracks = results.get_tracks(parameters=[m], labels='__END__', columns=_COORDINATES + ['S', 'LET', 'KEX'])
+        tracks = tracks[tracks['KEX'] > 0].groupby('LET', observed=True).last()
+        if not set(_PARTICLES).issubset(tracks.index):
+            continue
+        data[i] = tracks.loc[_PARTICLES, _COORDINATES].values
+        length[i] = tracks.at['O', 'S']
+    zi.cleanup()
+
+    # One-turn matrices (O(3) finite differences, see `zgoubidoo.twiss.compute_transfer_matrix`)
+    normalization = 2 * (_np.diagonal(data[:, 1:6, 5:], axis1=1, axis2=2) - data[:, 0, 5:])
+    r = (_np.swapaxes(data[:, 1:6, :5] - data[:, 6:, :5], 1, 2)) / normalization[:, None, :]
+
+    table = _pd.DataFrame({
+        'DPP': dpp,
+        **{c: orbits[:, i] for i, c in enumerate(['Y', 'T', 'Z', 'P'])},
+        **{f"R{i + 1}{j + 1}": r[:, i, j] for j in range(5) for i in range(5)},
+    })
+    for plane, p, d in ((1, 0, 'Y'), (2, 2, 'Z')):
+        m = r[:, p:p + 2, p:p + 2]
+        cos_mu = (m[:, 0, 0] + m[:, 1, 1]) / 2.0
+        mu = _np.arccos(cos_mu)
+        mu = _np.where(m[:, 0, 1] < 0, 2 * _np.pi - mu, mu)
+        table[f"Q{plane}"] = mu / (2 * _np.pi)
+        table[f"BETA{plane}{plane}"] = m[:, 0, 1] / _np.sin(mu)
+        table[f"ALPHA{plane}{plane}"] = (m[:, 0, 0] - m[:, 1, 1]) / 2.0 / _np.sin(mu)
+        dispersion = _np.linalg.solve(_np.identity(2) - m, r[:, p:p + 2, 4:5])[:, :, 0]
+        table[f"D{d}"] = dispersion[:, 0]
+        table[f"D{d}P"] = dispersion[:, 1]
+    table['LENGTH'] = length
+
+    valid = table[_QUANTITIES].notna().all(axis=1).values
+    coefficients = _np.polynomial.polynomial.polyfit(dpp[valid], table.loc[valid, _QUANTITIES].values, order)
+    return ChromaticOptics(table=table,
+                           coefficients=_pd.DataFrame(coefficients, columns=_QUANTITIES),
+                           zi=zi,
+                           )
@@ -1,12 +1,39 @@
-"""
+"""Closed orbits search with Newton iterations on the one-turn map.
+
+The one-turn map and its jacobian are evaluated by finite differences: for each momentum offset, the current guess and
+the perturbed rays (one per coordinate of the search) are tracked through the sequence. The rays of all the momenta are
+grouped in a single `Beam` which is sharded in slices (Zgoubi runs) executed concurrently, so that each Newton iteration
+costs a single parallel Zgoubi execution, whatever the number of momenta.
 
+Example:
+    >>> import numpy as np
+    >>> import zgoubidoo
+    >>> from zgoubidoo.physics.orbit import find_closed_orbits
+    >>> sequence = zgoubidoo.sequence.Sequence(...)  # doctest: +SKIP
+    >>> orbits = find_closed_orbits(sequence, dpp=np.linspace(-0.1, 0.1, 21))  # doctest: +SKIP
 """
-from ..commands.commands import Fit as _Fit
-from ..commands.commands import FitType as _FitType
+from typing import Iterable, List, Optional, Union
+import logging
+import multiprocessing
+import numpy as _np
+import pandas as _pd
+from ..commands.beam import Beam as _Beam
 from ..commands.commands import Marker as _Marker
-from ..commands.objet import Objet2 as _Objet2
-from input import Input
-from commands import *
+from ..input import Input as _Input
+from ..sequence import Sequence as _Sequence
+
+__all__ = ['PlaneType', 'HorizontalPlane', 'VerticalPlane', 'BothPlanes', 'find_closed_orbits', 'track_closed_orbits']
+
+_logger = logging.getLogger(__name__)
+
+_COORDINATES: List[str] = ['Y', 'T', 'Z', 'P']
+"""Transverse coordinates of the closed orbits (SI units)."""
+
+_TRACKS_COORDINATES: List[str] = ['Y-DY', 'T', 'Z', 'P']
+"""Columns of the tracks corresponding to the transverse coordinates."""
+
+_ZGOUBI_UNITS: _np.ndarray = _np.array([1e2, 1e3, 1e2, 1e3])
+"""Conversion factors of the transverse coordinates to the Zgoubi units (cm and mrad)."""
 
 
 class PlaneType(type):
@@ -28,95 +55,148 @@ class BothPlanes(HorizontalPlane, VerticalPlane):
     """A type to represent both planes, horizontal and vertical.
 
     Examples:
-        >>> issubclass(Sequence.BothPlanes, Sequence.HorizontalPlane)
+        >>> issubclass(BothPlanes, HorizontalPlane)
         True
-        >>> issubclass(Sequence.BothPlanes, Sequence.VerticalPlane)
+        >>> issubclass(BothPlanes, VerticalPlane)
         True
-        >>> issubclass(Sequence.HorizontalPlane, Sequence.HorizontalPlane)
+        >>> issubclass(HorizontalPlane, VerticalPlane)
+        False
     """
     pass
 
-def find_closed_orbit(self,
-                      brho: _Q,
-                      dpp: float = 0.0,
-                      guess: Coordinates = Coordinates(),
-                      tolerance: float = 1e-10,
-                      fit_method: _FitType = _Fit,
-                      plane: PlaneType = HorizontalPlane,
-                      ):
+
+def _track_rays(sequence: _Sequence, rays: _np.ndarray, dpp: _np.ndarray, slices: Optional[int] = None) -> _np.ndarray:
+    """Track rays through the sequence in concurrent Zgoubi runs and return their final coordinates.
+
+    Args:
+        sequence: the sequence
+        rays: the initial transverse coordinates of the rays (SI units), shape (n, 4)
+        dpp: the momentum offsets of the rays, shape (n, )
+        slices: the number of concurrent Zgoubi runs (one per CPU, within the number of rays, by default)
+
+    Returns:
+        the final transverse coordinates of the rays (SI units), NaN for the lost rays.
     """
+    distribution = _pd.DataFrame(rays * _ZGOUBI_UNITS, columns=_COORDINATES)
+    distribution['D'] = dpp
+    beam = _Beam('CO_BUNCH',
+                 distribution=distribution,
+                 kinematics=sequence.kinematics,
+                 slices=slices or min(len(rays), multiprocessing.cpu_count()),
+                 )
+    zi = _Input(name=f'CLOSED_ORBITS_FOR_{sequence.name}',
+                line=[beam, sequence.particle] + sequence.sequence + [_Marker('__END__')],
+                )
+    tracks = sequence.zgoubi(zi).collect().get_tracks(labels='__END__', columns=_TRACKS_COORDINATES + ['KEX'])
+    zi.cleanup()
+    final = _np.full(rays.shape, _np.nan)
+    if len(tracks) > 0:
+        tracks = tracks[tracks['KEX'] > 0].groupby('ID').last()
+        final[tracks.index.values - 1] = tracks[_TRACKS_COORDINATES].values
+    return final
+
+
+def find_closed_orbits(sequence: _Sequence,
+                       dpp: Union[float, Iterable[float]] = 0.0,
+                       guess: Optional[_np.ndarray] = None,
+                       plane: PlaneType = BothPlanes,
+                       tolerance: float = 1e-9,
+                       epsilon: float = 1e-6,
+                       max_iterations: int = 20,
+                       slices: Optional[int] = None,
+                       ) -> _pd.DataFrame:
+    """Closed orbits search for a series of momentum offsets, with Newton iterations.
+
+    At each iteration, the one-turn map M and its jacobian J (forward finite differences) are evaluated at the current
+    guesses of all the momenta which have not converged yet, in a single parallel Zgoubi execution. The guesses are
+    then updated with a Newton step, x <- x - (J - I)^-1 (M(x) - x).
+
+    Args:
+        sequence: the (periodic) sequence
+        dpp: the momentum offset(s)
+        guess: the initial guess(es) (Y, T, Z, P) in SI units, either common to all momenta or one row per momentum
+        plane: the plane(s) for which the search is performed (the other coordinates are kept at their guess)
+        tolerance: the tolerance on the norm of M(x) - x (SI units) for the termination of the iterations
+        epsilon: the amplitude of the perturbations for the finite differences (SI units)
+        max_iterations: the maximum number of Newton iterations
+        slices: the number of concurrent Zgoubi runs per iteration (see `Beam`)
+
+    Returns:
+        a DataFrame with one row per momentum offset ('DPP'), with the closed orbit ('Y', 'T', 'Z', 'P'), the one-turn
+        matrix of the searched plane(s) at the last iteration ('R11', 'R12', ...), the number of iterations, the norm of
+        the residual and a convergence flag ('CONVERGED', false as well if the orbit is lost).
+    """
+    dpp = _np.atleast_1d(_np.asarray(dpp, dtype=float))
+    orbits = _np.zeros((len(dpp), 4))
+    if guess is not None:
+        orbits[:] = guess
+    indices = ([0, 1] if issubclass(plane, HorizontalPlane) else []) \
+        + ([2, 3] if issubclass(plane, VerticalPlane) else [])
+    n = len(indices)
+    perturbations = _np.zeros((n + 1, 4))
+    perturbations[_np.arange(1, n + 1), indices] = epsilon
+    matrices = _np.full((len(dpp), n, n), _np.nan)
+    residuals = _np.full(len(dpp), _np.nan)
+    iterations = _np.zeros(len(dpp), dtype=int)
+    active = _np.ones(len(dpp), dtype=bool)
+    for iteration in range(max_iterations + 1):
+        k = _np.flatnonzero(active)
+        if len(k) == 0:
+            break
+        rays = orbits[k, None, :] + perturbations[None]
+        final = _track_rays(sequence, rays.reshape(-1, 4), _np.repeat(dpp[k], n + 1), slices).reshape(rays.shape)
+        lost = _np.isnan(final).any(axis=(1, 2))
+        if lost.any():
+            _logger.warning(f"Closed orbit search: orbits lost for DPP = {dpp[k[lost]]}.")
+            active[k[lost]] = False
+            orbits[k[lost]] = _np.nan
+            k, rays, final = k[~lost], rays[~lost], final[~lost]
+        delta = final[:, 0, indices] - rays[:, 0, indices]
+        residuals[k] = _np.linalg.norm(delta, axis=1)
+        matrices[k] = _np.swapaxes((final[:, 1:, indices] - final[:, :1, indices]) / epsilon, 1, 2)
+        converged = residuals[k] < tolerance
+        active[k[converged]] = False
+        if iteration == max_iterations:
+            break
+        k, delta = k[~converged], delta[~converged]
+        step = _np.linalg.solve(matrices[k] - _np.identity(n), delta[:, :, None])[:, :, 0]
+        orbits[k[:, None], indices] -= step
+        iterations[k] += 1
+    converged = residuals < tolerance
+    if not converged.all():
+        _logger.warning(f"Closed orbit search: no convergence for DPP = {dpp[~converged]}.")
+    names = [_COORDINATES[i] for i in indices]
+    return _pd.DataFrame({
+        'DPP': dpp,
+        **{c: orbits[:, i] for i, c in enumerate(_COORDINATES)},
+        **{f"R{_COORDINATES.index(a) + 1}{_COORDINATES.index(b) + 1}": matrices[:, i, j]
+           for i, a in enumerate(names) for j, b in enumerate(names)},
+        'ITERATIONS': iterations,
+        'RESIDUAL': residuals,
+        'CONVERGED': converged,
+    })
+
+
+def track_closed_orbits(sequence: _Sequence, orbits: _pd.DataFrame, slices: Optional[int] = None) -> _pd.DataFrame:
+    """Track closed orbits (e.g. from `find_closed_orbits`) through the sequence, in concurrent Zgoubi runs.
 
     Args:
-        brho: nominal magnetic rigidity of the sequence
-        dpp: momentum offset for off-momentum closed orbit computation
-        guess: initial closed orbit guess
-        tolerance: tolerance for the termination of the fit method
-        fit_method: a Zgoubi Fit command
-        plane: the plane(s) for which the search has to be performed
+        sequence: the sequence
+        orbits: the closed orbits, with the 'DPP', 'Y', 'T', 'Z' and 'P' columns (SI units)
+        slices: the number of concurrent Zgoubi runs (see `Beam`)
 
     Returns:
-        the closed orbit
+        the tracks of the closed orbits (the global particle identifier 'ID' is the row number of the orbit plus one).
     """
-    guess.d += dpp
-    zi = _Input(
-        name='CLOSED_ORBIT_FINDER',
-        line=[
-                 self._particle,
-                 _Objet2('BUNCH', BORO=brho).add(guess.list)
-             ] + self._sequence + [_Marker('__END__')]
-    )
-    fit = fit_method(
-        'FIT_CO',
-        PENALTY=tolerance,
-        PARAMS=[
-            fit_method.Parameter(line=zi, place='BUNCH', parameter=_Objet2.Y_, range=(-100, 500))
-            if issubclass(plane, Sequence.HorizontalPlane) else None,
-            fit_method.Parameter(line=zi, place='BUNCH', parameter=_Objet2.T_, range=(-100, 500))
-            if issubclass(plane, Sequence.HorizontalPlane) else None,
-            fit_method.Parameter(line=zi, place='BUNCH', parameter=_Objet2.Z_, range=(-100, 500))
-            if issubclass(plane, Sequence.VerticalPlane) else None,
-            fit_method.Parameter(line=zi, place='BUNCH', parameter=_Objet2.P_, range=(-100, 500))
-            if issubclass(plane, Sequence.VerticalPlane) else None,
-        ],
-        CONSTRAINTS=[
-            fit_method.DifferenceEqualityConstraint(zi, '__END__', fit_method.FitCoordinates.Y)
-            if issubclass(plane, HorizontalPlane) else None,
-            fit_method.DifferenceEqualityConstraint(zi, '__END__', fit_method.FitCoordinates.T)
-            if issubclass(plane, HorizontalPlane) else None,
-            fit_method.DifferenceEqualityConstraint(zi, '__END__', fit_method.FitCoordinates.Z)
-            if issubclass(plane, VerticalPlane) else None,
-            fit_method.DifferenceEqualityConstraint(zi, '__END__', fit_method.FitCoordinates.P)
-            if issubclass(plane, VerticalPlane) else None,
-        ]
-    )
-    zi.line.append(fit)
-    zi.IL = 0
-    self._last_run = self._z(zi())
-    co = self._last_run.tracks.query("LABEL1 == '__END__'").iloc[-1][['Yo', 'To', 'Zo', 'Po', 'Do-1']].values
-    co1 = self._last_run.tracks.query("LABEL1 == '__END__'").iloc[-1][['Y-DY', 'T', 'Z', 'P', 'D-1']].values
-    assert _np.linalg.norm(co - co1) ** 2 < tolerance, f"Inconsistency detected during closed orbit search {co} {co1}."
-    self._closed_orbit = co
-    return self._closed_orbit
-
-def track_closed_orbit(self, brho: _Q) -> _pd.DataFrame:
-        """Track closed orbit.
-
-        Args:
-            brho: nominal magnetic rigidity of the physics
-        """
-        zi = zgoubidoo.Input(
-            name=self.name,
-            line=[
-                     self._particle,
-                     _Objet2('BUNCH', BORO=brho).add([[100 * self._closed_orbit[0],
-                                                      1000 * self._closed_orbit[1],
-                                                      100 * self._closed_orbit[2],
-                                                      1000 * self._closed_orbit[3],
-                                                      0.0,
-                                                      self._closed_orbit[4] + 1,
-                                                      0.0]])
-                 ] + self._sequence
-        )
-        zi.IL = 2
-        self._last_run = self._z(zi())
-        return self._last_run.tracks
\ No newline at end of file
+    distribution = _pd.DataFrame(orbits[_COORDINATES].values * _ZGOUBI_UNITS, columns=_COORDINATES)
+    distribution['D'] = orbits['DPP'].values
+    beam = _Beam('CO_BUNCH',
+                 distribution=distribution,
+                 kinematics=sequence.kinematics,
+                 slices=slices or min(len(orbits), multiprocessing.cpu_count()),
+                 )
+    zi = _Input(name=f'CLOSED_ORBITS_FOR_{sequence.name}', line=[beam, sequence.particle] + sequence.sequence)
+    zi.IL = 2
+    tracks = sequence.zgoubi(zi).collect().tracks
+    zi.cleanup()
+    return tracks
@@ -135,10 +135,13 @@ class Sequence:
         """
         Repeat the physics, assuming a periodic physics.
 
+        The repeated elements are copy-on-write clones of the elements of the sequence (see `Command.clone`): they share
+        their parameters and serialization until modified.
+
         Args:
             periods: the number of periodic repetitions of the physics
         """
-        self._sequence = [copy.copy(e) for e in periods * self.sequence]
+        self._sequence = [e.clone() for e in periods * self.sequence]
 
     def reverse(self):
         """
@@ -17,11 +17,20 @@ Example:
     _ = zgoubidoo.ureg
 
 """
-from typing import Tuple, Optional
+from typing import List, Mapping, Sequence, Tuple, Optional, Union
 import numpy as np
 import pandas as pd
-from .commands import Patchable, PolarMagnet
-from .input import Input
+from .commands import Patchable, PolarMagnet, Objet2
+from .input import Input, MappedParametersType
+
+_COORDINATES: list = ['Y-DY', 'T', 'Z', 'P', 'D-1', 'Yo', 'To', 'Zo', 'Po', 'Do-1']
+"""Coordinates of the aligned tracks (in this order)."""
+
+_PARTICLES: list = ['O', 'A', 'C', 'E', 'G', 'I', 'B', 'D', 'F', 'H', 'J']
+"""Identifiers of the `Objet5` particles (in this order: reference, positive and negative offsets)."""
+
+_SECOND_ORDER_PAIRS: list = [(j, k) for j in range(5) for k in range(j + 1, 5)]
+"""Pairs of coordinates (Y, T, Z, P, D) with a mixed second-order term."""
 
 
 def compute_alpha_from_matrix(m: pd.DataFrame, twiss: pd.Series, plane: int = 1) -> pd.Series:
@@ -258,10 +267,358 @@ def compute_twiss(matrix: pd.DataFrame, twiss_init: Optional[pd.Series] = None)
     return matrix
 
 
+def stack_transfer_matrices(matrices: Sequence[pd.DataFrame]) -> np.ndarray:
+    """
+    Stack step-by-step transfer matrices (e.g. from `compute_transfer_matrix` for a series of mappings) in a single
+    (mapping, step, 6, 6) array. The missing `R` columns are completed with the identity matrix.
+
+    Args:
+        matrices: the step-by-step transfer matrices (with the same number of steps)
+
+    Returns:
+        a Numpy array of shape (mapping, step, 6, 6).
+
+    Example:
+        >>> m = pd.DataFrame({'R11': [1.0, 2.0], 'R12': [0.5, 1.0]})
+        >>> stack_transfer_matrices([m, m]).shape
+        (2, 2, 6, 6)
+    """
+    r = np.zeros((len(matrices), len(matrices[0]) if len(matrices) else 0, 6, 6))
+    r[:, :] = np.identity(6)
+    for k, matrix in enumerate(matrices):
+        for c in matrix.columns:
+            if len(c) == 3 and c[0] == 'R' and c[1:].isdigit() and 0 < int(c[1]) <= 6 and 0 < int(c[2]) <= 6:
+                r[k, :, int(c[1]) - 1, int(c[2]) - 1] = matrix[c].values
+    return r
+
+
+def compute_periodic_twiss_batch(matrices: np.ndarray,
+                                 mappings: Optional[List[MappedParametersType]] = None) -> pd.DataFrame:
+    """
+    Compute the periodic Twiss parameters for a stack of transfer matrices (see `compute_periodic_twiss`); the last
+    step of each mapping is assumed to be the periodic transfer matrix.
+
+    Args:
+        matrices: a (mapping, step, 6, 6) stack of step-by-step transfer matrices (or a (mapping, 6, 6) stack of
+            one-turn matrices)
+        mappings: the parametric mappings corresponding to the matrices (added as columns)
+
+    Returns:
+        a DataFrame with one row per mapping and the periodic Twiss parameters as columns.
+    """
+    m = matrices[:, -1] if matrices.ndim == 4 else matrices
+    twiss = _mapping_columns(mappings, len(m), 1)
+    twiss['CMU1'] = (m[:, 0, 0] + m[:, 1, 1]) / 2.0
+    twiss['CMU2'] = (m[:, 2, 2] + m[:, 3, 3]) / 2.0
+    twiss['MU1'] = np.arccos(twiss['CMU1'])
+    twiss['MU2'] = np.arccos(twiss['CMU2'])
+    twiss['BETA11'] = m[:, 0, 1] / np.sin(twiss['MU1'])
+    twiss['BETA22'] = m[:, 2, 3] / np.sin(twiss['MU2'])
+    twiss['ALPHA11'] = (m[:, 0, 0] - m[:, 1, 1]) / 2.0 / np.sin(twiss['MU1'])
+    twiss['ALPHA22'] = (m[:, 2, 2] - m[:, 3, 3]) / 2.0 / np.sin(twiss['MU2'])
+    twiss['GAMMA11'] = -m[:, 1, 0] / np.sin(twiss['MU1'])
+    twiss['GAMMA22'] = -m[:, 3, 2] / np.sin(twiss['MU2'])
+    twiss['DY'] = m[:, 0, 4]
+    twiss['DYP'] = m[:, 1, 4]
+    twiss['DZ'] = m[:, 2, 4]
+    twiss['DZP'] = m[:, 3, 4]
+    return pd.DataFrame(twiss)
+
+
+def compute_twiss_batch(matrices: np.ndarray,
+                        twiss_init: Optional[Union[pd.Series, pd.DataFrame]] = None,
+                        mappings: Optional[List[MappedParametersType]] = None) -> pd.DataFrame:
+    """
+    Uses a stack of step-by-step transfer matrices (e.g. for a parametric scan) to compute the Twiss parameters
+    (uncoupled) of all the mappings at once (see `compute_twiss`).
+
+    Args:
+        matrices: a (mapping, step, 6, 6) stack of step-by-step transfer matrices (see `stack_transfer_matrices`)
+        twiss_init: the initial values for the Twiss computation, either common to all mappings (Series) or one row
+            per mapping (DataFrame, e.g. from `compute_periodic_twiss_batch`); if None, periodic conditions are assumed
+            for each mapping
+        mappings: the parametric mappings corresponding to the matrices (added as columns)
+
+    Returns:
+        a tidy DataFrame with one row per mapping and per step, with the mapping keys (or the mapping number 'MAPPING'),
+        the step number 'STEP' and the computed quantities as columns.
+
+    Example:
+        >>> r = np.tile(np.identity(6), (3, 4, 1, 1))
+        >>> r[:, :, 0, 1] = r[:, :, 2, 3] = np.arange(1, 4)[:, None]
+        >>> init = pd.Series({'ALPHA11': 0, 'BETA11': 1, 'GAMMA11': 1, 'ALPHA22': 0, 'BETA22': 1, 'GAMMA22': 1,
+        ...                   'DY': 0, 'DYP': 0, 'DZ': 0, 'DZP': 0})
+        >>> compute_twiss_batch(r, init, mappings=[{'Q1.K': k} for k in (1, 2, 3)]).groupby('Q1.K')['BETA11'].max()
+        Q1.K
+        1     2.0
+        2     5.0
+        3    10.0
+        Name: BETA11, dtype: float64
+    """
+    n_mappings, n_steps = matrices.shape[:2]
+    if twiss_init is None:
+        twiss_init = compute_periodic_twiss_batch(matrices)
+    if isinstance(twiss_init, pd.DataFrame):
+        def init(k):
+            return twiss_init[k].values[:, None]
+    else:
+        def init(k):
+            return twiss_init[k]
+
+    twiss = _mapping_columns(mappings, n_mappings, n_steps)
+    twiss['STEP'] = np.tile(np.arange(n_steps), n_mappings)
+    for plane, p, v in ((1, 0, 1), (2, 2, 2)):
+        r11, r12 = matrices[:, :, p, p], matrices[:, :, p, p + 1]
+        r21, r22 = matrices[:, :, p + 1, p], matrices[:, :, p + 1, p + 1]
+        alpha, beta, gamma = init(f"ALPHA{v}{v}"), init(f"BETA{v}{v}"), init(f"GAMMA{v}{v}")
+        twiss[f"BETA{v}{v}"] = np.square(r11) * beta - 2.0 * r11 * r12 * alpha + np.square(r12) * gamma
+        twiss[f"ALPHA{v}{v}"] = -r11 * r21 * beta + (r11 * r22 + r12 * r21) * alpha - r12 * r22 * gamma
+        twiss[f"GAMMA{v}{v}"] = np.square(r21) * beta - 2.0 * r21 * r22 * alpha + np.square(r22) * gamma
+        twiss[f"MU{plane}"] = np.arccos(np.power(beta / twiss[f"BETA{v}{v}"], 0.5) * r11
+                                        - alpha * r12 / np.power(twiss[f"BETA{v}{v}"] * beta, 0.5))
+        twiss[f"DET{plane}"] = r11 * r22 - r12 * r21
+        d0, dp0 = (init('DY'), init('DYP')) if plane == 1 else (init('DZ'), init('DZP'))
+        twiss[f"DISP{2 * plane - 1}"] = d0 * r11 + dp0 * r12 + matrices[:, :, p, 4]
+        twiss[f"DISP{2 * plane}"] = d0 * r21 + dp0 * r22 + matrices[:, :, p + 1, 4]
+    columns = ['BETA11', 'BETA22', 'ALPHA11', 'ALPHA22', 'GAMMA11', 'GAMMA22', 'MU1', 'MU2', 'DET1', 'DET2',
+               'DISP1', 'DISP2', 'DISP3', 'DISP4']
+    return pd.DataFrame({
+        **{k: v for k, v in twiss.items() if k not in columns},
+        **{k: np.ravel(twiss[k]) for k in columns},
+    })
+
+
+def compute_teng_twiss(matrix: pd.DataFrame) -> pd.DataFrame:
+    """
+    Uses a step-by-step transfer matrix to compute the Edwards-Teng parametrization of the (transverse) coupled
+    optics, assuming periodic conditions (the last step is the one-turn matrix).
+
+    The one-turn matrix T at each step is decomposed as T = V U V^-1, with U block-diagonal (the normal modes) and
+    V = [[g I, C], [-C^+, g I]], C^+ being the symplectic conjugate of the coupling matrix C and g^2 + det C = 1. The
+    decomposition is done in closed form for all the steps at once; the normal modes are then parametrized with the
+    usual Twiss parameters and their phase advances are obtained from the decoupled transfer matrices. The branch of the
+    decomposition (which normal mode is the first one) is determined at the first step and kept along the line, so
+    that the modes are not swapped where the one-turn matrix has tr A - tr D close to zero.
+
+    Args:
+        matrix: the input step-by-step transfer matrix (4x4 or 6x6, the transverse part is used)
+
+    Returns:
+        the same DataFrame as the input, but with added columns for the computed quantities ('TENG_BETA1',
+        'TENG_ALPHA1', 'TENG_GAMMA1', 'TENG_MU1', the same for the second mode, the coupling coefficient 'TENG_G' and
+        the elements of the coupling matrix 'TENG_C11', 'TENG_C12', 'TENG_C21' and 'TENG_C22').
+    """
+    r = stack_transfer_matrices([matrix])[0, :, :4, :4]
+    t = r[-1]
+    turns = np.concatenate([t[None], r @ t @ np.linalg.inv(r)])
+    a, b, c, d = turns[:, :2, :2], turns[:, :2, 2:], turns[:, 2:, :2], turns[:, 2:, 2:]
+    h = c + _symplectic_conjugate(b)
+    tr = np.trace(a, axis1=1, axis2=2) - np.trace(d, axis1=1, axis2=2)
+    delta = np.square(tr) + 4 * np.linalg.det(h)
+    branch = np.sign(tr[0]) or 1.0
+    g = np.sqrt(0.5 + 0.5 * branch * tr / np.sqrt(delta))
+    coupling = -_symplectic_conjugate(h) * (branch / (g * np.sqrt(delta)))[:, None, None]
+    identity = g[:, None, None] * np.identity(2)
+    v = np.block([[identity, coupling], [-_symplectic_conjugate(coupling), identity]])
+    v_inv = np.block([[identity, -coupling], [_symplectic_conjugate(coupling), identity]])
+    u = v_inv @ turns @ v
+    w = v_inv[1:] @ r @ v[0]
+    for mode, p in ((1, 0), (2, 2)):
+        beta, alpha, gamma = _periodic_twiss_parameters(u[:, p:p + 2, p:p + 2])
+        matrix[f"TENG_BETA{mode}"] = beta[1:]
+        matrix[f"TENG_ALPHA{mode}"] = alpha[1:]
+        matrix[f"TENG_GAMMA{mode}"] = gamma[1:]
+        matrix[f"TENG_MU{mode}"] = _phase_advance(w[:, p, p], w[:, p, p + 1], beta[0], alpha[0])
+    matrix['TENG_G'] = g[1:]
+    for i in range(2):
+        for j in range(2):
+            matrix[f"TENG_C{i + 1}{j + 1}"] = coupling[1:, i, j]
+    return matrix
+
+
+def compute_ripken_twiss(matrix: pd.DataFrame) -> pd.DataFrame:
+    """
+    Uses a step-by-step transfer matrix to compute the Mais-Ripken parametrization of the (transverse) coupled optics,
+    assuming periodic conditions (the last step is the one-turn matrix).
+
+    The eigenvectors of the one-turn matrix are computed once, normalized (v^H S v = 2i, S being the symplectic form)
+    and propagated along the line with the step-by-step transfer matrix. The Mais-Ripken functions of mode k in plane
+    j follow from their components: beta_kj = |v_j|^2, alpha_kj = -Re(v_j* v_j'), gamma_kj = |v_j'|^2, and the phase
+    advance of each mode is the change of phase of its dominant component.
+
+    Args:
+        matrix: the input step-by-step transfer matrix (4x4 or 6x6, the transverse part is used)
+
+    Returns:
+        the same DataFrame as the input, but with added columns for the computed quantities ('RIPKEN_BETA1X',
+        'RIPKEN_BETA1Y', 'RIPKEN_BETA2X', 'RIPKEN_BETA2Y', the same for alpha and gamma, and 'RIPKEN_MU1' and
+        'RIPKEN_MU2').
+    """
+    r = stack_transfer_matrices([matrix])[0, :, :4, :4]
+    _, eigenvectors = np.linalg.eig(r[-1])
+    s = np.kron(np.identity(2), np.array([[0.0, 1.0], [-1.0, 0.0]]))
+    norm = np.einsum('ik,ij,jk->k', eigenvectors.conj(), s, eigenvectors).imag
+    modes = np.argsort(norm)[-2:]
+    e = eigenvectors[:, modes] * np.sqrt(2 / norm[modes])
+    horizontal = np.sum(np.square(np.abs(e[:2])), axis=0) / np.sum(np.square(np.abs(e)), axis=0)
+    e = e[:, np.argsort(-horizontal)]
+    v = r @ e
+    for mode in (1, 2):
+        for plane, p in (('X', 0), ('Y', 2)):
+            matrix[f"RIPKEN_BETA{mode}{plane}"] = np.square(np.abs(v[:, p, mode - 1]))
+            matrix[f"RIPKEN_ALPHA{mode}{plane}"] = -np.real(v[:, p, mode - 1].conj() * v[:, p + 1, mode - 1])
+            matrix[f"RIPKEN_GAMMA{mode}{plane}"] = np.square(np.abs(v[:, p + 1, mode - 1]))
+        p = 0 if mode == 1 else 2
+        phase = np.unwrap(np.concatenate([np.angle(e[p:p + 1, mode - 1]), np.angle(v[:, p, mode - 1])]))
+        matrix[f"RIPKEN_MU{mode}"] = phase[1:] - phase[0]
+    return matrix
+
+
+def propagate_sigma_matrix(matrices: np.ndarray, sigma: np.ndarray) -> np.ndarray:
+    """
+    Propagates a sigma matrix (second moments of the beam distribution) with a stack of transfer matrices,
+    Σ = R Σ0 R^T, for all the steps (and mappings) at once.
+
+    Args:
+        matrices: a stack of transfer matrices of shape (..., n, n), e.g. (step, 6, 6) or (mapping, step, 6, 6)
+        sigma: the initial sigma matrix, of shape (n, n) or broadcastable with the stack of matrices (e.g.
+            (mapping, 1, n, n) for one sigma matrix per mapping); a smaller matrix (e.g. 5x5 for Y, T, Z, P, D) is
+            completed with zeros
+
+    Returns:
+        the stack of propagated sigma matrices.
+
+    Example:
+        >>> r = np.tile(np.identity(2), (3, 1, 1))
+        >>> r[:, 0, 1] = [0.0, 1.0, 2.0]
+        >>> propagate_sigma_matrix(r, np.identity(2))[:, 0, 0]
+        array([1., 2., 5.])
+    """
+    n = matrices.shape[-1]
+    sigma = np.asarray(sigma, dtype=float)
+    if sigma.shape[-1] < n:
+        padded = np.zeros(sigma.shape[:-2] + (n, n))
+        padded[..., :sigma.shape[-2], :sigma.shape[-1]] = sigma
+        sigma = padded
+    return matrices @ sigma @ np.swapaxes(matrices, -1, -2)
+
+
+def compute_sigma_matrix(matrix: pd.DataFrame, sigma_init: Union[np.ndarray, Mapping[str, float]]) -> pd.DataFrame:
+    """
+    Uses a step-by-step transfer matrix to propagate an initial sigma matrix along the line (see
+    `propagate_sigma_matrix`) and to compute the rms beam sizes and emittances at each step, without tracking a bunch.
+
+    The emittances are the projected rms emittances (square roots of the determinants of the 2x2 diagonal blocks of the
+    sigma matrix); they include the contribution of the momentum spread where the dispersion does not vanish.
+
+    Args:
+        matrix: the input step-by-step transfer matrix (e.g. from `compute_transfer_matrix`)
+        sigma_init: the initial 5x5 sigma matrix (Y, T, Z, P, D), either as an array or as the 's11', 's12', ..., 's45'
+            and 'dpprms' parameters of `Beam.generate_from_5d_sigma_matrix` (the missing entries are zero)
+
+    Returns:
+        the same DataFrame as the input, but with added columns for the coefficients of the sigma matrix ('S11', 'S12',
+        ..., 'S55', upper triangle), the rms beam sizes ('SIGMA_Y', 'SIGMA_T', 'SIGMA_Z', 'SIGMA_P', 'SIGMA_D') and the
+        projected rms emittances ('EMIT1', 'EMIT2').
+
+    Example:
+        >>> m = pd.DataFrame({'R11': [1.0, 1.0], 'R12': [0.0, 2.0], 'R22': [1.0, 1.0]})
+        >>> compute_sigma_matrix(m, {'s11': 1e-6, 's22': 1e-6})[['SIGMA_Y', 'EMIT1']]
+            SIGMA_Y     EMIT1
+        0  0.001000  0.000001
+        1  0.002236  0.000001
+    """
+    if not isinstance(sigma_init, np.ndarray):
+        s = np.zeros((5, 5))
+        for k, v in sigma_init.items():
+            if k == 'dpprms':
+                s[4, 4] = v ** 2
+            else:
+                s[int(k[1]) - 1, int(k[2]) - 1] = s[int(k[2]) - 1, int(k[1]) - 1] = v
+        sigma_init = s
+    sigma = propagate_sigma_matrix(stack_transfer_matrices([matrix])[0, :, :5, :5], sigma_init)
+    for i in range(5):
+        for j in range(i, 5):
+            matrix[f"S{i + 1}{j + 1}"] = sigma[:, i, j]
+    for i, c in enumerate(('Y', 'T', 'Z', 'P', 'D')):
+        matrix[f"SIGMA_{c}"] = np.sqrt(sigma[:, i, i])
+    matrix['EMIT1'] = np.sqrt(np.linalg.det(sigma[:, 0:2, 0:2]))
+    matrix['EMIT2'] = np.sqrt(np.linalg.det(sigma[:, 2:4, 2:4]))
+    return matrix
+
+
+def _symplectic_conjugate(m: np.ndarray) -> np.ndarray:
+    """
+    Symplectic conjugate of a stack of 2x2 matrices ([[a, b], [c, d]] -> [[d, -b], [-c, a]]).
+
+    Args:
+        m: a stack of 2x2 matrices
+
+    Returns:
+        the stack of the symplectic conjugates.
+    """
+    return np.stack([np.stack([m[..., 1, 1], -m[..., 0, 1]], axis=-1),
+                     np.stack([-m[..., 1, 0], m[..., 0, 0]], axis=-1)], axis=-2)
+
+
+def _periodic_twiss_parameters(m: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Twiss parameters of a stack of periodic (one-turn) 2x2 matrices, with the sign of sin(mu) chosen so that beta is
+    positive.
+
+    Args:
+        m: a stack of 2x2 periodic matrices
+
+    Returns:
+        a tuple with the beta, alpha and gamma values.
+    """
+    cos_mu = (m[:, 0, 0] + m[:, 1, 1]) / 2.0
+    sin_mu = np.sign(m[:, 0, 1]) * np.sqrt(1 - np.square(cos_mu))
+    return m[:, 0, 1] / sin_mu, (m[:, 0, 0] - m[:, 1, 1]) / 2.0 / sin_mu, -m[:, 1, 0] / sin_mu
+
+
+def _phase_advance(r11: np.ndarray, r12: np.ndarray, beta0: float, alpha0: float) -> np.ndarray:
+    """
+    Phase advances (unwrapped) from the 2x2 step-by-step transfer matrix elements and the initial Twiss parameters.
+
+    Args:
+        r11: the step-by-step R11 elements
+        r12: the step-by-step R12 elements
+        beta0: the initial beta value
+        alpha0: the initial alpha value
+
+    Returns:
+        the phase advances at all steps.
+    """
+    return np.unwrap(np.arctan2(r12, beta0 * r11 - alpha0 * r12))
+
+
+def _mapping_columns(mappings: Optional[List[MappedParametersType]], n_mappings: int, n_steps: int) -> dict:
+    """
+    Columns identifying the mappings in the batched results (the mapping number if no mapping is provided).
+
+    Args:
+        mappings: the parametric mappings
+        n_mappings: the number of mappings
+        n_steps: the number of steps per mapping
+
+    Returns:
+        a dictionary with the columns.
+    """
+    if mappings is None:
+        return {'MAPPING': np.repeat(np.arange(n_mappings), n_steps)}
+    return {
+        k: pd.Series([m.get(k) for m in mappings]).repeat(n_steps).values
+        for k in dict.fromkeys(k for m in mappings for k in m)
+    }
+
+
 def align_tracks(tracks: pd.DataFrame,
                  align_on: str = 'X',
                  identifier: str = 'LET',
-                 reference_track: str = 'O') -> Tuple[np.array, pd.DataFrame]:
+                 reference_track: str = 'O',
+                 jit: bool = True,
+                 ) -> Tuple[np.array, pd.DataFrame]:
     """
     Align the tracks to obtain a homegenous array with all coordinates given at the same location.
 
@@ -273,36 +630,250 @@ def align_tracks(tracks: pd.DataFrame,
         align_on: coordinates on which the tracks are aligned (typically 'X' or 'S')
         identifier: identifier of the column used for the particles indexing
         reference_track:
+        jit: use the compiled interpolation kernel (requires `numba`, falls back on NumPy otherwise)
 
     Returns:
         aligned data and reference data
     """
-    coordinates: list = ['Y-DY', 'T', 'Z', 'P', 'D-1', 'Yo', 'To', 'Zo', 'Po', 'Do-1']  # Keep it in this order
-    particules: list = ['O', 'A', 'C', 'E', 'G', 'I', 'B', 'D', 'F', 'H', 'J']  # Keep it in this order
-    assert set(particules) == set(tracks[identifier].unique()), "Required particles not found (are you using Objet5?)."
-    ref: pd.DataFrame = tracks.query(f"{identifier} == '{reference_track}'")[coordinates + [align_on, 'LABEL1']]
-    alignment_values = ref[align_on].values
-    assert np.all(np.diff(alignment_values) >= 0), "The reference alignment values are not monotonously increasing"
-    data = np.zeros((len(particules), alignment_values.shape[0], len(coordinates)))
-    data[0, :, :] = ref[coordinates].values
-    for i, p in enumerate(particules[1:]):
-        particule = tracks.query(f"{identifier} == '{p}'")
-        for j, c in enumerate(coordinates):
-            try:
-                assert np.all(np.diff(particule[align_on].values) >= 0), \
-                    "The alignment values are not monotonously increasing"
-                data[i+1, :, j] = np.interp(alignment_values, particule[align_on].values, particule[c].values)
-            except ValueError:
-                pass
-    assert data.ndim == 3, "The aligned tracks do not form a homogenous array."
+    ref: pd.DataFrame = tracks[tracks[identifier] == reference_track][_COORDINATES + [align_on, 'LABEL1']]
+    group = np.zeros(len(tracks), dtype=int)
+    x, group, coordinates, starts, counts = _sort_tracks(tracks, group, 1, align_on, identifier, reference_track)
+    reference = np.arange(starts[0, 0], starts[0, 0] + counts[0, 0])
+    data = _interpolate_tracks(x, group, coordinates, starts, counts, reference, group[reference], jit)
     return data, ref
 
 
+def align_tracks_by_element(tracks: pd.DataFrame,
+                            labels: Sequence[str],
+                            align_on: str = 'X',
+                            identifier: str = 'LET',
+                            reference_track: str = 'O',
+                            particles: Optional[Sequence] = None,
+                            jit: bool = True,
+                            ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Align the tracks of a series of elements at once (see `align_tracks`).
+
+    The tracks of all the particles are interpolated (linear interpolation) at the locations of the integration steps
+    of the reference particle, for all the elements simultaneously.
+
+    Args:
+        tracks: tracking data
+        labels: the labels of the elements (in the order in which the aligned steps are to be provided, an element can
+            appear more than once)
+        align_on: coordinates on which the tracks are aligned (typically 'X' or 'S')
+        identifier: identifier of the column used for the particles indexing
+        reference_track: identifier of the reference particle
+        particles: identifiers of the particles (the `Objet5` particles by default), in the order of the aligned data
+        jit: use the compiled interpolation kernel (requires `numba`, falls back on NumPy otherwise)
+
+    Returns:
+        a tuple with the aligned data (particles, steps, coordinates), the alignment values of the reference particle,
+        the index of the element (in `labels`) of each step and the index of each step within its element.
+    """
+    unique_labels = list(dict.fromkeys(labels))
+    tracks = tracks[tracks['LABEL1'].isin(unique_labels)]
+    element = pd.Categorical(np.asarray(tracks['LABEL1'], dtype=object), categories=unique_labels).codes.astype(int)
+    x, element, coordinates, starts, counts = _sort_tracks(tracks, element, len(unique_labels),
+                                                           align_on, identifier, reference_track, particles)
+
+    # Steps of the reference particle for all the occurrences of the elements
+    occurrences = np.array([unique_labels.index(label) for label in labels], dtype=int)
+    lengths = counts[0, occurrences]
+    first = np.cumsum(lengths) - lengths
+    step = np.arange(lengths.sum()) - np.repeat(first, lengths)
+    reference = np.repeat(starts[0, occurrences], lengths) + step
+    data = _interpolate_tracks(x, element, coordinates, starts, counts, reference,
+                               np.repeat(occurrences, lengths), jit)
+    return data, x[reference], np.repeat(np.arange(len(labels)), lengths), step
+
+
+def _sort_tracks(tracks: pd.DataFrame,
+                 group: np.ndarray,
+                 n_groups: int,
+                 align_on: str,
+                 identifier: str,
+                 reference_track: str,
+                 particles: Optional[Sequence] = None,
+                 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sort the tracks by particle (reference particle first), by group (element) and by step and validate them.
+
+    Args:
+        tracks: tracking data
+        group: the index of the group (element) of each step
+        n_groups: the number of groups
+        align_on: coordinates on which the tracks are aligned
+        identifier: identifier of the column used for the particles indexing
+        reference_track: identifier of the reference particle
+        particles: identifiers of the particles (the `Objet5` particles by default)
+
+    Returns:
+        a tuple with the sorted alignment values, groups and coordinates, and the start and the number of steps of each
+        (particle, group) segment.
+    """
+    particles = [reference_track] + [p for p in (_PARTICLES if particles is None else particles)
+                                     if p != reference_track]
+    n_particles = len(particles)
+    particle = pd.Categorical(np.asarray(tracks[identifier], dtype=object), categories=particles).codes.astype(int)
+    present = np.zeros((n_groups, n_particles), dtype=bool)
+    present[group[particle >= 0], particle[particle >= 0]] = True
+    assert present.all() and (particle >= 0).all(), "Required particles not found (are you using Objet5?)."
+
+    order = np.lexsort((np.arange(len(group)), group, particle))
+    particle, group = particle[order], group[order]
+    x = tracks[align_on].values[order].astype(float)
+    coordinates = np.ascontiguousarray(tracks[_COORDINATES].values[order], dtype=float)
+    same = (particle[1:] == particle[:-1]) & (group[1:] == group[:-1])
+    decreasing = np.diff(x) < 0
+    assert not np.any(decreasing & same & (particle[1:] == 0)), \
+        "The reference alignment values are not monotonously increasing"
+    assert not np.any(decreasing & same), "The alignment values are not monotonously increasing"
+    counts = np.bincount(particle * n_groups + group, minlength=n_particles * n_groups)
+    starts = (np.cumsum(counts) - counts).reshape(n_particles, n_groups)
+    return x, group, coordinates, starts, counts.reshape(n_particles, n_groups)
+
+
+def _interpolate_tracks_kernel(x: np.ndarray,
+                               coordinates: np.ndarray,
+                               starts: np.ndarray,
+                               counts: np.ndarray,
+                               alignment_values: np.ndarray,
+                               steps_group: np.ndarray,
+                               data: np.ndarray):
+    """
+    Interpolation kernel (compiled with `numba`), see `_interpolate_tracks`.
+    """
+    for p in range(1, starts.shape[0]):
+        for q in range(alignment_values.shape[0]):
+            s = starts[p, steps_group[q]]
+            last = s + counts[p, steps_group[q]] - 1
+            xq = min(max(alignment_values[q], x[s]), x[last])
+            j = s + np.searchsorted(x[s:last + 1], xq, side='right') - 1
+            j1 = min(j + 1, last)
+            dx = x[j1] - x[j]
+            for c in range(coordinates.shape[1]):
+                if dx > 0:
+                    data[p, q, c] = (coordinates[j1, c] - coordinates[j, c]) / dx * (xq - x[j]) + coordinates[j, c]
+                else:
+                    data[p, q, c] = coordinates[j, c]
+
+
+_compiled_interpolate_tracks_kernel = None
+
+
+def _interpolate_tracks(x: np.ndarray,
+                        group: np.ndarray,
+                        coordinates: np.ndarray,
+                        starts: np.ndarray,
+                        counts: np.ndarray,
+                        reference: np.ndarray,
+                        steps_group: np.ndarray,
+                        jit: bool = True,
+                        ) -> np.ndarray:
+    """
+    Interpolate the coordinates of all the particles at the alignment values of the reference steps.
+
+    The interpolation is linear and clamped at the ends of each (particle, group) segment, as with `np.interp`. The
+    compiled kernel is used if `numba` is available; otherwise the interpolation intervals of all the steps are found
+    with a single sorting operation per particle.
+
+    Args:
+        x: the sorted alignment values (see `_sort_tracks`)
+        group: the sorted groups
+        coordinates: the sorted coordinates
+        starts: the start of each (particle, group) segment
+        counts: the number of steps of each (particle, group) segment
+        reference: the indices of the reference steps
+        steps_group: the group of each reference step
+        jit: use the compiled kernel (if available)
+
+    Returns:
+        the aligned data (particles, steps, coordinates).
+    """
+    global _compiled_interpolate_tracks_kernel
+    alignment_values = x[reference]
+    data = np.zeros((starts.shape[0], len(reference), coordinates.shape[1]))
+    data[0] = coordinates[reference]
+    if jit and _compiled_interpolate_tracks_kernel is None:
+        try:
+            import numba
+            _compiled_interpolate_tracks_kernel = numba.njit(nogil=True)(_interpolate_tracks_kernel)
+        except ModuleNotFoundError:
+            _compiled_interpolate_tracks_kernel = False
+    if jit and _compiled_interpolate_tracks_kernel:
+        _compiled_interpolate_tracks_kernel(x, coordinates, starts, counts, alignment_values, steps_group, data)
+        return data
+    for p in range(1, starts.shape[0]):
+        s = starts[p, steps_group]
+        e = s + counts[p, steps_group] - 1
+        xq = np.clip(alignment_values, x[s], x[e])
+        block = slice(starts[p, 0], starts[p, -1] + counts[p, -1])
+        xd, gd = x[block], group[block]
+        keys = np.lexsort((np.concatenate([np.zeros(len(xd)), np.ones(len(xq))]),
+                           np.concatenate([xd, xq]),
+                           np.concatenate([gd, steps_group])))
+        below = np.cumsum(keys < len(xd))
+        j = np.empty(len(xq), dtype=int)
+        j[keys[keys >= len(xd)] - len(xd)] = below[keys >= len(xd)] - 1 + block.start
+        j = np.clip(j, s, e)
+        j1 = np.minimum(j + 1, e)
+        dx = x[j1] - x[j]
+        slope = np.divide(coordinates[j1] - coordinates[j], dx[:, None],
+                          out=np.zeros((len(xq), coordinates.shape[1])), where=dx[:, None] > 0)
+        data[p] = slope * (xq - x[j])[:, None] + coordinates[j]
+    return data
+
+
+def _element_positions(beamline: Input,
+                       tracks: pd.DataFrame,
+                       align_on: str = 'X',
+                       identifier: str = 'LET',
+                       reference_track: str = 'O',
+                       ) -> Tuple[list, list, list]:
+    """
+    Positions of the elements of the beamline present in the tracks, used to compute the global 'X' and 'S' coordinates
+    from the aligned tracks (the offsets of the elements are accumulated along the beamline).
+
+    Args:
+        beamline: the Zgoubidoo Input beamline
+        tracks: tracking data
+        align_on: coordinates on which the tracks are aligned (typically 'X' or 'S')
+        identifier: identifier of the column used for the particles indexing
+        reference_track: identifier of the reference particle
+
+    Returns:
+        a tuple with the labels of the elements present in the tracks (in the order of the beamline), their offsets and
+        the scaling factors of their alignment values.
+    """
+    elements = set(tracks.LABEL1.unique())
+    reference_max = tracks[tracks[identifier] == reference_track].groupby('LABEL1', observed=True)[align_on].max()
+    offset: float = 0
+    labels, offsets, scales = [], [], []
+    for e in beamline.line:
+        if e.LABEL1 not in elements:
+            if isinstance(e, Patchable):
+                offset += (e.exit.x - e.entry.x).to('m').magnitude if align_on != 'S' else 0.0
+            continue
+        labels.append(e.LABEL1)
+        offsets.append(offset)
+        if isinstance(e, PolarMagnet):
+            scales.append(100 * e.radius.to('m').magnitude)
+            offset += e.length.to('m').magnitude if align_on != 'S' else 0.0
+        else:
+            scales.append(1.0)
+            offset += reference_max[e.LABEL1] if align_on != 'S' else 0.0
+    return labels, offsets, scales
+
+
 def compute_transfer_matrix(beamline: Input, tracks: pd.DataFrame, align_on: str = 'X') -> pd.DataFrame:
     """
     Constructs the step-by-step transfer matrix from tracking data (finite differences). The approximation
     uses the O(3) formula (not just the O(1) formula) and therefore makes use of all the particles.
 
+    The tracks of all the elements are aligned at once (see `align_tracks_by_element`) and the transfer matrix is
+    computed for all the steps in a single array operation.
+
     Args:
         beamline: the Zgoubidoo Input beamline
         tracks: tracking data
@@ -318,39 +889,113 @@ def compute_transfer_matrix(beamline: Input, tracks: pd.DataFrame, align_on: str
         >>> zi = zgoubidoo.Input()
         >>> matrix = zgoubidoo.twiss.compute_transfer_matrix(zi, tracks, align_on='X')
     """
-    elements = tracks.LABEL1.unique()
-    offset: float = 0
-    matrix = pd.DataFrame()
-    for e in beamline.line:
-        if e.LABEL1 not in elements:
-            if isinstance(e, Patchable):
-                offset += (e.exit.x - e.entry.x).to('m').magnitude if align_on != 'S' else 0.0
-            continue
-        t = tracks[tracks.LABEL1 == e.LABEL1]
-        data, ref = align_tracks(t, align_on=align_on)
-        n_dimensions: int = 5
-        normalization = [2 * (data[i + 1, :, i + n_dimensions] - data[0, :, i + n_dimensions])
-                         for i in range(0, n_dimensions)
-                         ]
-        m = pd.DataFrame(
-            {
-                f"R{j + 1}{i + 1}": pd.Series(
-                    (data[i + 1, :, j] - data[i + 1 + n_dimensions, :, j]) / normalization[i]
-                )
-                for i in range(0, n_dimensions)
-                for j in range(0, n_dimensions)
-            }
-        )
-        if isinstance(e, PolarMagnet):
-            m['X'] = ref[align_on].values * 100 * e.radius.to('m').magnitude + offset
-            m['S'] = ref[align_on].values * 100 * e.radius.to('m').magnitude + offset
-        else:
-            m['X'] = ref[align_on].values + offset
-            m['S'] = ref[align_on].values + offset
-        m['LABEL1'] = e.LABEL1
-        matrix = matrix.append(m)
-        if isinstance(e, PolarMagnet):
-            offset += e.length.to('m').magnitude if align_on != 'S' else 0.0
-        else:
-            offset += ref[align_on].max() if align_on != 'S' else 0.0
-    return matrix.reset_index()
+    labels, offsets, scales = _element_positions(beamline, tracks, align_on)
+    if len(labels) == 0:
+        return pd.DataFrame()
+    data, alignment_values, occurrence, step = align_tracks_by_element(tracks, labels, align_on=align_on)
+    n_dimensions: int = 5
+    normalization = 2 * (np.diagonal(data[1:n_dimensions + 1, :, n_dimensions:], axis1=0, axis2=2)
+                         - data[0, :, n_dimensions:])
+    r = (data[1:n_dimensions + 1, :, :n_dimensions] - data[n_dimensions + 1:, :, :n_dimensions]) \
+        / normalization.T[:, :, None]
+    position = alignment_values * np.array(scales)[occurrence] + np.array(offsets)[occurrence]
+    return pd.DataFrame({
+        'index': step,
+        **{f"R{j + 1}{i + 1}": r[i, :, j] for i in range(0, n_dimensions) for j in range(0, n_dimensions)},
+        'X': position,
+        'S': position,
+        'LABEL1': np.array(labels, dtype=object)[occurrence],
+    })
+
+
+def generate_second_order_objet(label1: str = 'BUNCH',
+                                PY: float = 1e-3,
+                                PT: float = 1e-3,
+                                PZ: float = 1e-3,
+                                PP: float = 1e-3,
+                                PD: float = 1e-3,
+                                **kwargs) -> Objet2:
+    """
+    Generate the set of rays required to compute the second-order transfer map by finite differences (see
+    `compute_second_order_transfer_matrix`), as a single `Objet2`.
+
+    The 51 rays are, in this order (particle numbers 'IT' 1 to 51): the reference ray, the rays offset by +/- the step
+    size in each of the coordinates (Y, T, Z, P, D) and, for each pair of coordinates, the four rays offset by the
+    combinations of +/- the step sizes in both coordinates.
+
+    Args:
+        label1: the label of the objet
+        PY: step size in Y (cm)
+        PT: step size in T (mrad)
+        PZ: step size in Z (cm)
+        PP: step size in P (mrad)
+        PD: step size in D (relative momentum offset)
+        **kwargs: other parameters of the objet (e.g. BORO)
+
+    Returns:
+        an `Objet2` with the 51 rays.
+
+    Example:
+        >>> generate_second_order_objet().IMAX
+        51
+    """
+    steps = np.array([PY, PT, PZ, PP, PD])
+    offsets = [np.zeros(5)]
+    for j in range(5):
+        offsets += [np.identity(5)[j], -np.identity(5)[j]]
+    for j, k in _SECOND_ORDER_PAIRS:
+        for sj, sk in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+            offsets.append(sj * np.identity(5)[j] + sk * np.identity(5)[k])
+    offsets = np.array(offsets) * steps
+    rays = np.zeros((len(offsets), 7))
+    rays[:, [0, 1, 2, 3]] = offsets[:, :4]
+    rays[:, 5] = 1.0 + offsets[:, 4]
+    rays[:, 6] = 1.0
+    return Objet2(label1, **kwargs).add(rays)
+
+
+def compute_second_order_transfer_matrix(beamline: Input, tracks: pd.DataFrame, align_on: str = 'X') -> pd.DataFrame:
+    """
+    Constructs the step-by-step first and second-order transfer maps from the tracks of the rays generated with
+    `generate_second_order_objet` (finite differences, a single tracking run is needed).
+
+    The second-order coefficients follow the TRANSPORT convention, x_i = sum_j R_ij x_j + sum_(j <= k) T_ijk x_j x_k;
+    the step sizes are taken from the initial coordinates of the tracks. The tracks of all the elements are aligned at
+    once and all the coefficients are computed for all the steps with array operations.
+
+    Args:
+        beamline: the Zgoubidoo Input beamline
+        tracks: tracking data (of the rays generated with `generate_second_order_objet`)
+        align_on: coordinates on which the tracks are aligned (typically 'X' or 'S')
+
+    Returns:
+        a Panda DataFrame with the step-by-step R{i}{j} and T{i}{j}{k} (j <= k) coefficients.
+    """
+    n_rays: int = 1 + 2 * 5 + 4 * len(_SECOND_ORDER_PAIRS)
+    labels, offsets, scales = _element_positions(beamline, tracks, align_on, identifier='IT', reference_track=1)
+    if len(labels) == 0:
+        return pd.DataFrame()
+    data, alignment_values, occurrence, step = align_tracks_by_element(tracks, labels, align_on=align_on,
+                                                                       identifier='IT', reference_track=1,
+                                                                       particles=range(1, n_rays + 1))
+    n_dimensions: int = 5
+    f = data[:, :, :n_dimensions]
+    plus, minus, dimensions = 1 + 2 * np.arange(n_dimensions), 2 + 2 * np.arange(n_dimensions), np.arange(n_dimensions)
+    h = (data[plus, :, n_dimensions + dimensions] - data[minus, :, n_dimensions + dimensions]) / 2
+    r = (f[plus] - f[minus]) / (2 * h[:, :, None])
+    t_diagonal = (f[plus] + f[minus] - 2 * f[0]) / (2 * np.square(h)[:, :, None])
+    j, k = np.array(_SECOND_ORDER_PAIRS).T
+    q = 1 + 2 * n_dimensions + 4 * np.arange(len(_SECOND_ORDER_PAIRS))
+    t_mixed = (f[q] - f[q + 1] - f[q + 2] + f[q + 3]) / (4 * h[j] * h[k])[:, :, None]
+    t = {(jj, jj): t_diagonal[jj] for jj in range(n_dimensions)}
+    t.update({pair: t_mixed[n] for n, pair in enumerate(_SECOND_ORDER_PAIRS)})
+    position = alignment_values * np.array(scales)[occurrence] + np.array(offsets)[occurrence]
+    return pd.DataFrame({
+        'index': step,
+        **{f"R{i + 1}{jj + 1}": r[jj, :, i] for jj in range(0, n_dimensions) for i in range(0, n_dimensions)},
+        **{f"T{i + 1}{jj + 1}{kk + 1}": t[(jj, kk)][:, i]
+           for i in range(0, n_dimensions) for jj in range(0, n_dimensions) for kk in range(jj, n_dimensions)},
+        'X': position,
+        'S': position,
+        'LABEL1': np.array(labels, dtype=object)[occurrence],
+    })
@@ -1,4 +1,5 @@
 from typing import Union, Callable
+from functools import lru_cache as _lru_cache
 from . import ureg as _ureg
 from . import _Q
 
@@ -13,6 +14,30 @@ def parse_quantity(f: Callable):
     return parse_arg
 
 
+@_lru_cache(maxsize=None)
+def conversion_factor(src: Union[str, _ureg.Unit], dst: Union[str, _ureg.Unit]) -> float:
+    """
+    Multiplicative factor converting a magnitude expressed in units `src` into units `dst`.
+
+    The factor is computed once by Pint for each pair of units and then cached, so that repeated conversions (e.g.
+    during the serialization of large inputs) reduce to a floating point multiplication.
+
+    >>> conversion_factor(_ureg.m, 'cm')
+    100.0
+
+    :param src: the units of the magnitude
+    :param dst: the target units
+    :return: the conversion factor.
+    :raises: a Pint DimensionalityError if the units are not compatible.
+    """
+    return float(_Q(1.0, src).to(dst).magnitude)
+
+
+def _to(q: _Q, units: str) -> float:
+    """Convert a quantity to a float magnitude in the given units using the cached conversion factors."""
+    return float(q.magnitude * conversion_factor(q.units, units))
+
+
 @parse_quantity
 def _m(q: Union[str, _Q]) -> float:
     """
@@ -24,7 +49,7 @@ def _m(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in meters.
     """
-    return float(q.to('m').magnitude)
+    return _to(q, 'm')
 
 
 @parse_quantity
@@ -38,7 +63,7 @@ def _cm(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in centimeters.
     """
-    return float(q.to('cm').magnitude)
+    return _to(q, 'cm')
 
 
 @parse_quantity
@@ -52,7 +77,7 @@ def _mm(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in millimeters.
     """
-    return float(q.to('mm').magnitude)
+    return _to(q, 'mm')
 
 
 @parse_quantity
@@ -68,7 +93,7 @@ def _degree(q: Union[str, _Q]) -> float:
     :param q: the quantity
     :return: the magnitude in degrees.
     """
-    return float(q.to('degree').magnitude)
+    return _to(q, 'degree')
 
 
 @parse_quantity
@@ -82,7 +107,7 @@ def _radian(q: Union[str, _Q]) -> float:
     :param q: the quantity
     :return: the magnitude in degrees.
     """
-    return float(q.to('radian').magnitude)
+    return _to(q, 'radian')
 
 
 @parse_quantity
@@ -96,7 +121,7 @@ def _tesla(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in meters.
     """
-    return float(q.to('tesla').magnitude)
+    return _to(q, 'tesla')
 
 
 @parse_quantity
@@ -110,7 +135,7 @@ def _gauss(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in meters.
     """
-    return float(q.to('gauss').magnitude)
+    return _to(q, 'gauss')
 
 
 @parse_quantity
@@ -124,7 +149,7 @@ def _kilogauss(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [LENGTH]
     :return: the magnitude in meters.
     """
-    return float(q.to('kilogauss').magnitude)
+    return _to(q, 'kilogauss')
 
 
 @parse_quantity
@@ -138,7 +163,7 @@ def _mev(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [length]**2 * [mass] * [time]**-2.0
     :return: the magnitude in MeV.
     """
-    return float(q.to('MeV').magnitude)
+    return _to(q, 'MeV')
 
 
 @parse_quantity
@@ -152,7 +177,7 @@ def _gev(q: Union[str, _Q]) -> float:
     :param q: the quantity of dimension [length]**2 * [mass] * [time]**-2.0
     :return: the magnitude in MeV.
     """
-    return float(q.to('GeV').magnitude)
+    return _to(q, 'GeV')
 
 
 @parse_quantity
@@ -169,7 +194,7 @@ def _mev_c(q: _Q) -> float:
     Returns:
         the magnitude in meters.
     """
-    return float(q.to('MeV_c').magnitude)
+    return _to(q, 'MeV_c')
 
 
 @parse_quantity
@@ -186,4 +211,32 @@ def _gev_c(q: _Q) -> float:
     Returns:
         the magnitude in meters.
     """
-    return float(q.to('GeV_c').magnitude)
+    return _to(q, 'GeV_c')
+
+
+@parse_quantity
+def _mrad(q: Union[str, _Q]) -> float:
+    """
+    Convert a quantity to milliradians.
+
+    >>> _mrad(1 * _ureg.radian)
+    1000.0
+
+    :param q: the quantity
+    :return: the magnitude in milliradians.
+    """
+    return _to(q, 'milliradian')
+
+
+@parse_quantity
+def _kilogauss_cm(q: Union[str, _Q]) -> float:
+    """
+    Convert a quantity of dimension [MAGNETIC RIGIDITY] to kilogauss * centimeter.
+
+    >>> _kilogauss_cm(1 * _ureg.tesla * _ureg.m)
+    1000.0
+
+    :param q: the quantity of dimension [MAGNETIC RIGIDITY]
+    :return: the magnitude in kilogauss * centimeter.
+    """
+    return _to(q, 'kilogauss * cm')
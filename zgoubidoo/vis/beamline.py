@@ -24,7 +24,8 @@ def beamline(line: zgoubidoo.Input,
     Args:
         line: the beamline to be rendered
         artist: the artist for the rendering
-        tracks: the tracks dataset
+        tracks: the tracks dataset, or the results of the Zgoubi runs (the tracks of each element are then read
+            directly from the tracking output files, see `Command.get_tracks`)
         tracks_color: color for the rendering of the tracks
         with_elements: plot the beamline elements
         with_tracks: plot the beam tracks
@@ -36,7 +37,10 @@ def beamline(line: zgoubidoo.Input,
         if with_elements:
             e.plot(artist=artist)
         if tracks is not None and with_tracks:
-            e.plot_tracks(artist=artist, tracks=tracks.query(f"LABEL1 == '{e.LABEL1}'"))
+            if isinstance(tracks, zgoubidoo.ZgoubiResults):
+                e.plot_tracks(artist=artist, tracks=e.get_tracks(tracks))
+            else:
+                e.plot_tracks(artist=artist, tracks=tracks[tracks['LABEL1'] == e.LABEL1])
 
 
 def cartouche(line: zgoubidoo.Input,
@@ -8,7 +8,7 @@
 
 """
 from __future__ import annotations
-from typing import Dict, List, Mapping, Iterable, Optional, Tuple, Callable, Union
+from typing import Dict, List, Mapping, Iterable, Iterator, Optional, Sequence, Tuple, Callable, Union
 import logging
 import shutil
 import tempfile
@@ -19,13 +19,16 @@ import multiprocessing
 from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
 from concurrent.futures import Future as _Future
 import subprocess as sub
+import numpy as _np
 import pandas as _pd
 from .input import Input
 from .input import MappedParametersType as _MappedParametersType
 from .input import MappedParametersListType as _MappedParametersListType
 from .input import PathsListType as _PathListType
 from .input import ZGOUBI_INPUT_FILENAME as _ZGOUBI_INPUT_FILENAME
-from .output import read_plt_file, read_matrix_file, read_srloss_file
+from .output import iter_output_file, read_matrix_file, read_srloss_file, compress_file, available_compression, \
+    locate_output_file
+from .output import concat as _concat
 
 __all__ = ['ZgoubiException', 'ZgoubiResults', 'Zgoubi']
 _logger = logging.getLogger(__name__)
@@ -84,45 +87,128 @@ class ZgoubiResults:
         """Retrieve results from the list using a numeric index."""
         return self._results[item]
 
-    def get_tracks(self,
-                   parameters: Optional[_MappedParametersListType] = None,
-                   force_reload: bool = False
-                   ) -> _pd.DataFrame:
+    def iter_tracks(self,
+                    parameters: Optional[_MappedParametersListType] = None,
+                    chunksize: Optional[int] = 1000000,
+                    columns: Optional[Sequence[str]] = None,
+                    labels: Optional[Union[str, Sequence[str]]] = None,
+                    kex: Optional[Union[int, Sequence[int]]] = None,
+                    ipass: Optional[Union[int, Sequence[int]]] = None,
+                    particles: Optional[Union[int, Sequence[int]]] = None,
+                    step: int = 1,
+                    compact: bool = False,
+                    single_precision: bool = False,
+                    index: bool = False,
+                    ) -> Iterator[_pd.DataFrame]:
         """
-        Collects all tracks from the different Zgoubi instances matching the given parameters list
-        in the results and concatenate them.
+        Iterate over the tracks from the different Zgoubi instances matching the given parameters list, by chunks.
+
+        The selection of the columns and of the lines (labels, KEX flags, pass numbers, particles and decimation of the
+        steps) is applied while reading the .plt files (see `zgoubidoo.output.iter_output_file`), so that arbitrarily
+        large tracking outputs can be processed with a bounded memory footprint. The particles are selected with their
+        global identifier ('ID', see `get_tracks`); the runs that do not contain any of the selected particles are not
+        read at all.
+
+        The tracks can have a compact representation (see `compact`): the labels and the (scalar) values of the mapping
+        keys are then categoricals and the flags and counters are small integers; the coordinates can be stored in
+        single precision.
+
+        The tracks are read from the binary .plt file (b_zgoubi.plt) if it is present, from the text .plt file
+        otherwise.
 
         Args:
-            parameters:
-            force_reload:
+            parameters: the list of mappings for which the tracks are collected (all mappings if None)
+            chunksize: the number of lines per chunk (each file is read at once if None)
+            columns: the columns to be read (all columns if None)
+            labels: select only the tracks at the given LABEL1 (or list of LABEL1)
+            kex: select only the lines with the given KEX flag(s)
+            ipass: select only the lines with the given pass number(s)
+            particles: select only the tracks of the given particle(s) (global identifiers 'ID')
+            step: keep only every `step` step of each particle (decimation)
+            compact: compact representation of the columns (categoricals and small integers)
+            single_precision: single precision (float32) representation of the coordinates
+            index: use the byte-offset index of the files (see `zgoubidoo.output.OutputIndex`) to read only the lines
+                matching the selection on the labels, passes and particles; efficient for repeated element-level access
 
         Returns:
-            A concatenated DataFrame with all the tracks in the result matching the parameters list.
+            an iterator over DataFrames with the selected tracks.
         """
-        if self._tracks is not None and parameters is None and force_reload is False:
-            return self._tracks
-        tracks = list()
+        if columns is not None and 'IT' not in columns:
+            columns = list(columns) + ['IT']
+        offsets = sorted({sum(vv for kk, vv in k.items() if kk.endswith('.OFFSET')) for k, _ in self.results})
         for k, r in self.results:
             if parameters is None or k in parameters:
                 try:
-                    try:
-                        p = r['path'].name
-                    except AttributeError:
-                        p = r['path']
-                    tracks.append(read_plt_file(path=p))
-                    for kk, vv in k.items():
-                        tracks[-1][f"{kk}"] = vv
+                    p = r['path'].name
+                except AttributeError:
+                    p = r['path']
+                offset = sum(vv for kk, vv in k.items() if kk.endswith('.OFFSET'))
+                its = None
+                if particles is not None:
+                    size = next((o for o in offsets if o > offset), _np.inf) - offset
+                    its = [i - offset for i in (particles if isinstance(particles, Iterable) else [particles])
+                           if 1 <= i - offset <= size]
+                    if len(its) == 0:
+                        continue
+                filename = 'b_zgoubi.plt' if locate_output_file('b_zgoubi.plt', p) else 'zgoubi.plt'
+                try:
+                    for chunk in iter_output_file(filename, p, kind='plt', columns=columns, labels=labels, kex=kex,
+                                                  ipass=ipass, particles=its, step=step, chunksize=chunksize,
+                                                  compact=compact, single_precision=single_precision, index=index):
+                        for kk, vv in k.items():
+                            if compact and isinstance(vv, (int, float, str)):
+                                chunk[f"{kk}"] = _pd.Categorical.from_codes(_np.zeros(len(chunk), dtype=_np.int8),
+                                                                            categories=[vv])
+                            else:
+                                chunk[f"{kk}"] = vv
+                        if 'IT' in chunk.columns:
+                            chunk['ID'] = chunk['IT'] + offset
+                        yield chunk
                 except FileNotFoundError:
                     _logger.warning(
                         f"Unable to read and load the Zgoubi .plt files required to collect the tracks for path "
                         "{r['path']}."
                     )
                     continue
+
+    def get_tracks(self,
+                   parameters: Optional[_MappedParametersListType] = None,
+                   force_reload: bool = False,
+                   **selection,
+                   ) -> _pd.DataFrame:
+        """
+        Collects all tracks from the different Zgoubi instances matching the given parameters list
+        in the results and concatenate them.
+
+        For beams sharded in multiple slices (see `Beam`), a global particle identifier ('ID') is computed from the
+        particle number in each run ('IT') and the offset of the slice, so that the concatenated tracks are those of a
+        single bunch.
+
+        The tracks are read from the binary .plt file (b_zgoubi.plt) if it is present, from the text .plt file
+        otherwise.
+
+        Examples:
+            >>> zr = ZgoubiResults([])
+            >>> zr.get_tracks(columns=['X', 'Y-DY'], labels=['Q1', 'Q2'], step=10).empty
+            True
+
+        Args:
+            parameters:
+            force_reload:
+            selection: selection of the columns and of the lines of the tracks (see `iter_tracks`), the tracks are not
+                cached if a selection is given
+
+        Returns:
+            A concatenated DataFrame with all the tracks in the result matching the parameters list.
+        """
+        if self._tracks is not None and parameters is None and force_reload is False and len(selection) == 0:
+            return self._tracks
+        tracks = list(self.iter_tracks(parameters, chunksize=None, **selection))
         if len(tracks) > 0:
-            tracks = _pd.concat(tracks)
+            tracks = _concat(tracks)
         else:
             tracks = _pd.DataFrame()
-        if parameters is None:
+        if parameters is None and len(selection) == 0:
             self._tracks = tracks
         return tracks
 
@@ -254,7 +340,15 @@ class Zgoubi:
     ZGOUBI_RES_FILE: str = 'zgoubi.res'
     """Default name of the Zgoubi result '.res' file."""
 
-    def __init__(self, executable: str = ZGOUBI_EXECUTABLE_NAME, path: str = None, n_procs: Optional[int] = None):
+    ZGOUBI_COMPRESSED_FILES: Tuple[str, ...] = ('zgoubi.plt', 'zgoubi.fai', 'b_zgoubi.plt', 'b_zgoubi.fai')
+    """Output files compressed after each run (if the compression is activated)."""
+
+    def __init__(self,
+                 executable: str = ZGOUBI_EXECUTABLE_NAME,
+                 path: str = None,
+                 n_procs: Optional[int] = None,
+                 compression: Optional[str] = None,
+                 ):
         """
         `Zgoubi` is responsible for running the Zgoubi executable within Zgoubidoo. It will run Zgoubi as a subprocess
         and offers a variety of concurency and parallelisation features.
@@ -271,11 +365,15 @@ class Zgoubi:
             - executable: name of the Zgoubi executable
             - path: path to the Zgoubi executable
             - n_procs: maximum number of Zgoubi simulations to be started in parallel
+            - compression: compression method of the output files ('zstd', 'gzip' or 'auto' for the preferred
+              available method), the files (see `ZGOUBI_COMPRESSED_FILES`) are compressed by the workers right after
+              each run and are read transparently; None for no compression
 
         """
         self._executable: str = executable
         self._n_procs: int = n_procs or multiprocessing.cpu_count()
         self._path: Optional[str] = path
+        self._compression: Optional[str] = available_compression() if compression == 'auto' else compression
         self._futures: Dict[str, _Future] = dict()
         self._pool: _ThreadPoolExecutor = _ThreadPoolExecutor(max_workers=self._n_procs)
 
@@ -326,7 +424,16 @@ class Zgoubi:
         mappings = mappings or [{}]
         identifier = identifier or {}
         mappings = [{**m, **identifier} for m in mappings]
-        for m, path in zgoubi_input(mappings=mappings, filename=filename, path=path).paths:
+        beam = zgoubi_input.beam
+        balance = beam is not None and beam.workers is None
+        if balance:  # The slices of the beam are balanced against the pool of workers
+            beam.workers = self._n_procs
+        try:
+            paths = zgoubi_input(mappings=mappings, filename=filename, path=path).paths
+        finally:
+            if balance:
+                beam.workers = None
+        for m, path in paths:
             print(f"Calling execute Zgoubi for mapping {m}")
             _logger.info(f"Starting Zgoubi in {path}.")
             future = self._pool.submit(
@@ -413,6 +520,12 @@ class Zgoubi:
                             parameters=mapping,
                             )
 
+        # Compress the output files
+        if self._compression is not None:
+            for f in Zgoubi.ZGOUBI_COMPRESSED_FILES:
+                if os.path.isfile(os.path.join(p, f)):
+                    compress_file(f, p, method=self._compression)
+
         # Extract CPU time
         cputime = -1.0
         if stderr is None: